@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connect the receivers that bump the conditional GET version stamps
+        # and drop cached search results.
+        from . import signals  # noqa: F401
@@ -0,0 +1,89 @@
+"""
+Helpers for conditional GET (ETag / Last-Modified) on read-mostly endpoints.
+
+Endpoints backed by small lookup tables (taxonomy, developers, download link)
+are validated with a version stamp kept in the database (recipes/versions.py):
+a counter plus the time it last moved. api/signals.py bumps the stamp in the
+transaction that saves or deletes a row in one of those tables, so once that
+commits every process sees it; an unchanged stamp means the response body is
+unchanged and a 304 can be sent after a single primary-key lookup.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from recipes.versions import bump_version, get_version_stamp
+
+TAXONOMY_TABLES = 'taxonomy'
+DEVELOPER_TABLES = 'developers'
+DOWNLOAD_LINK_TABLE = 'download-link'
+
+
+def _version_name(name):
+    return f'table-version:{name}'
+
+
+def get_table_version(name):
+    """Return (version, last_modified) for a group of tables; last_modified is None until the first change."""
+    return get_version_stamp(_version_name(name))
+
+
+def bump_table_version(name):
+    """Record a change to a group of tables in the current transaction."""
+    bump_version(_version_name(name))
+
+
+def table_etag(name):
+    return str(get_table_version(name)[0])
+
+
+def table_last_modified(name):
+    return get_table_version(name)[1]
+
+
+def table_condition(name):
+    """
+    View decorator answering conditional GETs from the version stamp of a
+    table group, before the view runs. Place it under @api_view so it runs
+    after authentication and permission checks.
+    """
+    def stamp(request):
+        # condition() asks for the ETag and Last-Modified separately; read the row once.
+        stamps = request.__dict__.setdefault('_table_versions', {})
+        if name not in stamps:
+            stamps[name] = get_table_version(name)
+        return stamps[name]
+
+    return condition(
+        etag_func=lambda request, *args, **kwargs: str(stamp(request)[0]),
+        last_modified_func=lambda request, *args, **kwargs: stamp(request)[1],
+    )
+
+
+def make_etag(*parts):
+    """A strong ETag built from the values that determine a response body."""
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def conditional_response(request, etag, last_modified=None):
+    """
+    Return a 304 (or 412) response if the request's validators match, otherwise None.
+    `last_modified` is a datetime or a POSIX timestamp.
+    """
+    if hasattr(last_modified, 'timestamp'):
+        last_modified = int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    if hasattr(last_modified, 'timestamp'):
+        last_modified = int(last_modified.timestamp())
+    response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -1,5 +1,10 @@
 import django_filters
+from django_filters.constants import EMPTY_VALUES
+from rest_framework import filters
+from rest_framework.settings import api_settings
 from recipes.models import Recipe
+from recipes.search import search_recipes
+from recipes.bitmap_index import bitmap_index, FLAG_FIELDS, TAXONOMY_FIELDS
 
 class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
     pass
@@ -10,6 +15,16 @@ class RecipeFilter(django_filters.FilterSet):
     cuisines__name = CharInFilter(field_name='cuisines__name', lookup_expr='in')
     dishTypes__name = CharInFilter(field_name='dishTypes__name', lookup_expr='in')
     occasions__name = CharInFilter(field_name='occasions__name', lookup_expr='in')
+    # Per-serving nutrient ranges, e.g. calories_min=300&calories_max=600 or protein_min=25.
+    # These hit the indexed RecipeNutrition columns (see recipes/nutrition.py).
+    calories = django_filters.RangeFilter(field_name='nutrition_facts__calories')
+    protein = django_filters.RangeFilter(field_name='nutrition_facts__protein')
+    fat = django_filters.RangeFilter(field_name='nutrition_facts__fat')
+    saturated_fat = django_filters.RangeFilter(field_name='nutrition_facts__saturated_fat')
+    carbohydrates = django_filters.RangeFilter(field_name='nutrition_facts__carbohydrates')
+    sugar = django_filters.RangeFilter(field_name='nutrition_facts__sugar')
+    fiber = django_filters.RangeFilter(field_name='nutrition_facts__fiber')
+    sodium = django_filters.RangeFilter(field_name='nutrition_facts__sodium')
 
     class Meta:
         model = Recipe
@@ -29,3 +44,69 @@ class RecipeFilter(django_filters.FilterSet):
             # 'diets__name': ['in'],
             # 'occasions__name': ['in'],
         }
+
+    def indexed_filters(self):
+        """
+        Split the submitted filters into ({flag: bool}, {taxonomy_field: [names]})
+        for the bitmap index, and {name: value} for everything else.
+        """
+        flags, terms, others = {}, {}, {}
+        for name, value in self.form.cleaned_data.items():
+            if value in EMPTY_VALUES:
+                continue
+            if name in FLAG_FIELDS:
+                flags[name] = value
+            elif name.endswith('__name') and name[:-len('__name')] in TAXONOMY_FIELDS:
+                terms[name[:-len('__name')]] = value
+            else:
+                others[name] = value
+        return flags, terms, others
+
+    def filter_others(self, queryset, others):
+        """Apply the non-indexed filters returned by indexed_filters() to a queryset."""
+        for name, value in others.items():
+            queryset = self.filters[name].filter(queryset, value)
+        return queryset
+
+    def candidate_ids(self, others):
+        """
+        Ids of the recipes passing the non-indexed filters (nutrient ranges,
+        ...), for narrowing bitmap index results; None if there are none.
+        """
+        if not others:
+            return None
+        return set(self.filter_others(Recipe.objects.all(), others).values_list('id', flat=True))
+
+    def filter_queryset(self, queryset):
+        """
+        Resolve the flag and taxonomy filters through the in-memory bitmap
+        index (recipes/bitmap_index.py) instead of joining the M2M tables.
+        Any other filter is applied as usual.
+        """
+        flags, terms, others = self.indexed_filters()
+        queryset = self.filter_others(queryset, others)
+        if flags or terms:
+            queryset = bitmap_index.filter_queryset(queryset, flags, terms)
+        return queryset
+
+
+class RecipeSearchFilter(filters.BaseFilterBackend):
+    """
+    Full-text search over recipe title, summary and ingredient names using the
+    index in recipes.search. Takes the same `?search=` parameter as DRF's
+    SearchFilter. Results are ordered by relevance unless `?ordering=` is given,
+    so this backend must run after OrderingFilter.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+    relevance_ordering = ('-search_rank', '-created_at')
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+
+        queryset = search_recipes(queryset, text)
+        if not request.query_params.get(self.ordering_param):
+            queryset = queryset.order_by(*self.relevance_ordering)
+        return queryset
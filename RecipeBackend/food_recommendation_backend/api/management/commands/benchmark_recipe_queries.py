@@ -0,0 +1,165 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.http import HttpRequest
+from django.utils import timezone
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter
+from api.views import (
+    RecipeSearchViewSet, ProfileLikedRecipesView, ProfileSavedRecipesView, ProfileRecentlyVisitedRecipesView
+)
+from recipes.bitmap_index import bitmap_index
+from recipes.models import Recipe, RecipeInteraction, Cuisine, Diet
+
+WORDS = (
+    "chicken tomato garlic onion basil curry rice paneer lentil spinach butter cream "
+    "lemon ginger cumin coriander pepper salt olive oil pasta cheese mushroom potato"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the old JOIN + DISTINCT query shapes of the search and profile list "
+        "endpoints with the current ones: query plans and first-page latency. Seeds a "
+        "synthetic catalog inside a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=50000, help='Synthetic recipes to create (default: 50000).')
+        parser.add_argument('--interactions', type=int, default=2000,
+                            help='Interactions of the benchmark user (default: 2000).')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (default: 20).')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options['recipes'], options['interactions'])
+                bitmap_index.rebuild()
+                try:
+                    for name, old, new in self.cases(user):
+                        self.compare(name, old, new, options['repeat'])
+                finally:
+                    transaction.set_rollback(True)
+        finally:
+            # The index was built from rows that are gone now. Invalidating
+            # writes the version row, so it has to wait for the rollback.
+            bitmap_index.invalidate()
+
+    def seed(self, recipe_count, interaction_count):
+        self.stdout.write(f"Seeding {recipe_count} recipes...")
+        rng = random.Random(42)
+        cuisines = [Cuisine.objects.get_or_create(name=f"bench cuisine {n}")[0] for n in range(12)]
+        diets = [Diet.objects.get_or_create(name=f"bench diet {n}")[0] for n in range(8)]
+        start = (Recipe.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        nutrients = {"nutrients": [{"name": word, "amount": 1.5, "unit": "g"} for word in WORDS]}
+
+        ids = list(range(start, start + recipe_count))
+        for offset in range(0, len(ids), 2000):
+            Recipe.objects.bulk_create([
+                Recipe(
+                    id=pk,
+                    title=' '.join(rng.sample(WORDS, 3)).title(),
+                    description=' '.join(rng.choices(WORDS, k=120)),
+                    nutrition=nutrients,
+                    vegetarian=rng.random() < 0.4,
+                    vegan=rng.random() < 0.15,
+                )
+                for pk in ids[offset:offset + 2000]
+            ])
+        Recipe.cuisines.through.objects.bulk_create([
+            Recipe.cuisines.through(recipe_id=pk, cuisine_id=cuisine.pk)
+            for pk in ids for cuisine in rng.sample(cuisines, rng.randint(1, 2))
+        ], batch_size=5000)
+        Recipe.diets.through.objects.bulk_create([
+            Recipe.diets.through(recipe_id=pk, diet_id=diet.pk)
+            for pk in ids for diet in rng.sample(diets, rng.randint(1, 3))
+        ], batch_size=5000)
+
+        user = get_user_model().objects.create_user(
+            username=f"benchmark-{rng.getrandbits(32)}", email="benchmark@example.com", password=None
+        )
+        now = timezone.now()
+        RecipeInteraction.objects.bulk_create([
+            RecipeInteraction(
+                user=user, recipe_id=pk, liked=rng.random() < 0.5, saved=rng.random() < 0.3,
+                last_viewed=now - timezone.timedelta(minutes=rng.randint(0, 100000)),
+                time_when_liked=now - timezone.timedelta(minutes=rng.randint(0, 100000)),
+            )
+            for pk in rng.sample(ids, min(interaction_count, len(ids)))
+        ], batch_size=2000)
+        return user
+
+    def cases(self, user):
+        request = Request(HttpRequest())
+        request.user = user
+        filters = {'vegetarian': 'true', 'diets__name': 'bench diet 1,bench diet 2', 'cuisines__name': 'bench cuisine 3'}
+
+        old_search = Recipe.objects.filter(
+            vegetarian=True,
+            diets__name__in=['bench diet 1', 'bench diet 2'],
+            cuisines__name__in=['bench cuisine 3'],
+        ).annotate(
+            like_count=Coalesce('stats__like_count', 0),
+            save_count=Coalesce('stats__save_count', 0),
+            view_count=Coalesce('stats__view_count', 0),
+        ).distinct().order_by('-created_at', '-id')
+        new_search = RecipeFilter(
+            filters, queryset=RecipeSearchViewSet().get_queryset()
+        ).qs.order_by('-created_at', '-id')
+        yield 'search (flag + diets + cuisine)', old_search, new_search
+
+        old_liked = Recipe.objects.filter(
+            interactions__user=user, interactions__liked=True
+        ).annotate(
+            liked_at=Coalesce('interactions__time_when_liked', 'interactions__last_viewed')
+        ).order_by('-liked_at', '-id').distinct()
+        yield 'profile liked', old_liked, self.view_queryset(ProfileLikedRecipesView, request, '-liked_at')
+
+        old_saved = Recipe.objects.filter(
+            interactions__user=user, interactions__saved=True
+        ).annotate(
+            saved_at=Coalesce('interactions__time_when_saved', 'interactions__last_viewed')
+        ).order_by('-saved_at', '-id').distinct()
+        yield 'profile saved', old_saved, self.view_queryset(ProfileSavedRecipesView, request, '-saved_at')
+
+        old_visited = Recipe.objects.filter(
+            interactions__user=user
+        ).annotate(
+            visited_at=F('interactions__last_viewed')
+        ).order_by('-visited_at', '-id').distinct()
+        yield 'profile recently visited', old_visited, self.view_queryset(
+            ProfileRecentlyVisitedRecipesView, request, '-visited_at'
+        )
+
+    @staticmethod
+    def view_queryset(view_class, request, ordering):
+        # As set up by APIView.dispatch(), which get_serializer() relies on.
+        view = view_class(request=request, format_kwarg=None, args=(), kwargs={})
+        return view.get_queryset().order_by(ordering, '-id')
+
+    def compare(self, name, old, new, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {name}"))
+        for label, queryset in (('before', old), ('after', new)):
+            page = queryset[:20]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                # .all() clones the queryset so each run hits the database.
+                rows = list(page.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"{label:>6}: {statistics.median(timings):8.2f} ms median, "
+                f"{min(timings):8.2f} ms best ({len(rows)} rows)"
+            )
+            self.stdout.write(self.indent(page.explain()))
+
+    @staticmethod
+    def indent(plan):
+        return '\n'.join(f"        {line}" for line in plan.splitlines())
@@ -0,0 +1,192 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset (cursor) pagination.
+
+    The cursor is an opaque token holding the ordering values of the last row
+    on the page, and the next page is fetched with a `WHERE (keys) > (cursor)`
+    condition instead of an OFFSET, so page 500 costs the same as page 1.
+    The queryset ordering is used as the key, with the primary key appended as
+    a tie-breaker. Ordering fields must be plain model fields or annotations
+    (annotate joined values such as interaction timestamps first); NULLs are
+    always sorted last.
+
+    No total count is returned unless the client asks for it with `?count=true`.
+    Requests that send `?page=` (older app builds) are paginated exactly as
+    before by PageNumberPagination.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    legacy_page_query_param = 'page'
+    legacy_pagination_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.legacy = None
+        if (self.legacy_page_query_param in request.query_params
+                and self.cursor_query_param not in request.query_params):
+            self.legacy = self.legacy_pagination_class()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_keys(queryset)
+        queryset = queryset.order_by(*[
+            F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_last=True)
+            for name, descending in self.keys
+        ])
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count = queryset.count()
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.get_cursor_filter(self.decode_cursor(cursor, queryset)))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.next_cursor = None
+        if len(results) > self.page_size:
+            last = self.page[-1]
+            self.next_cursor = self.encode_cursor([getattr(last, name) for name, _ in self.keys])
+        return self.page
+
+    def restore_page(self, page, request, next_cursor, count=None):
+        """
+        Set up the paginator for a page whose rows were looked up elsewhere
+        (e.g. from cached ids), given the `next_cursor` and `count` recorded
+        when it was first paginated.
+        """
+        self.legacy = None
+        self.base_url = request.build_absolute_uri()
+        self.page = page
+        self.next_cursor = next_cursor
+        self.count = count
+        return self.page
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+
+        response = {}
+        if self.count is not None:
+            response['count'] = self.count
+        response.update({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+        return Response(response)
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_keys(self, queryset):
+        """Return [(field_name, descending)] from the queryset ordering plus the pk."""
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        pk_name = queryset.model._meta.pk.name
+        keys = []
+        for field in ordering:
+            if not isinstance(field, str):
+                raise ImproperlyConfigured(
+                    f"{self.__class__.__name__} only supports orderings by field name, got {field!r}."
+                )
+            name = field.lstrip('-')
+            if '__' in name:
+                raise ImproperlyConfigured(
+                    f"Annotate '{name}' onto the queryset before using it as a keyset ordering."
+                )
+            keys.append((pk_name if name == 'pk' else name, field.startswith('-')))
+
+        if pk_name not in [name for name, _ in keys]:
+            keys.append((pk_name, keys[0][1] if keys else False))
+        return keys
+
+    def get_cursor_filter(self, values):
+        """Rows strictly after `values` in (key1, key2, ...) order, NULLs last."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(self.keys, values):
+            if value is None:
+                # Only other NULLs can follow a NULL, and only on later keys.
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            after = Q(**{f"{name}__{'lt' if descending else 'gt'}": value}) | Q(**{f'{name}__isnull': True})
+            condition |= equal & after
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.next_cursor)
+
+    def encode_cursor(self, values):
+        # Timestamps keep their microseconds (DjangoJSONEncoder would cut them to
+        # milliseconds), otherwise the equality half of the keyset filter misses rows.
+        values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+        payload = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor, queryset):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise ValueError
+            return [
+                None if value is None else self.get_key_field(queryset, name).to_python(value)
+                for (name, _), value in zip(self.keys, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_key_field(self, queryset, name):
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return queryset.query.annotations[name].output_field
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor returned as `next` by the previous page.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,91 @@
+"""
+Per-process LRU cache of /api/search/ result pages.
+
+Most search traffic repeats a handful of filter combinations, so the ids on
+each page are cached under a canonical signature of the request (see
+RecipeSearchViewSet.get_result_cache_key); a hit only has to fetch the card
+fields of those ids. Entries are tagged with a version kept in the database
+(recipes/versions.py), which api/signals.py bumps inside the transaction
+whenever recipes are imported, edited or deleted, so every process drops
+its entries once that commits.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from recipes.versions import bump_version, get_version
+
+VERSION_NAME = 'search-results'
+
+# `ids` of the recipes on the page, in order, plus what the paginator needs to
+# rebuild the response around them.
+ResultPage = namedtuple('ResultPage', 'ids next_cursor count')
+
+
+def canonical_value(value):
+    """A hashable, order-independent form of a cleaned filter value."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(set(value)))
+    if isinstance(value, slice):
+        return (value.start, value.stop)
+    return value
+
+
+class SearchResultCache:
+    """Bounded LRU of result pages. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = None
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'SEARCH_RESULT_CACHE_SIZE', 1000)
+
+    def generation(self):
+        """
+        The current generation. Read it before running the query whose
+        result goes to set(), so a change committed meanwhile isn't cached.
+        """
+        generation = get_version(VERSION_NAME)
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+        return generation
+
+    def get(self, key, generation):
+        with self._lock:
+            if generation != self._generation:
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Drop every cached page, in this process and (through the version) all
+        others. Call it inside the transaction that changes the results.
+        """
+        bump_version(VERSION_NAME)
+        with self._lock:
+            self._entries.clear()
+            self._generation = None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+search_result_cache = SearchResultCache()
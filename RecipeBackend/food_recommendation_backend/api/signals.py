@@ -0,0 +1,49 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from recipes.models import Cuisine, DishType, Diet, Occasion
+from recipes.signals import recipes_changed
+from .conditional import (
+    bump_table_version, TAXONOMY_TABLES, DEVELOPER_TABLES, DOWNLOAD_LINK_TABLE
+)
+from .result_cache import search_result_cache
+from .models import (
+    Developer, DeveloperContribution, DeveloperSkill, DeveloperContact,
+    DeveloperProfile, DownloadLink
+)
+
+# Bump the version stamps behind the ETags in api/conditional.py and drop cached
+# search results (api/result_cache.py).
+
+TAXONOMY_MODELS = (Cuisine, DishType, Diet, Occasion)
+DEVELOPER_MODELS = (Developer, DeveloperContribution, DeveloperSkill, DeveloperContact, DeveloperProfile)
+
+
+def taxonomy_changed(sender, **kwargs):
+    bump_table_version(TAXONOMY_TABLES)
+    # Renamed or deleted terms change what the search filters match.
+    search_result_cache.invalidate()
+
+
+def developers_changed(sender, **kwargs):
+    bump_table_version(DEVELOPER_TABLES)
+
+
+for model in TAXONOMY_MODELS:
+    post_save.connect(taxonomy_changed, sender=model, dispatch_uid=f'taxonomy-version-save-{model.__name__}')
+    post_delete.connect(taxonomy_changed, sender=model, dispatch_uid=f'taxonomy-version-delete-{model.__name__}')
+
+for model in DEVELOPER_MODELS:
+    post_save.connect(developers_changed, sender=model, dispatch_uid=f'developer-version-save-{model.__name__}')
+    post_delete.connect(developers_changed, sender=model, dispatch_uid=f'developer-version-delete-{model.__name__}')
+
+
+@receiver(post_save, sender=DownloadLink)
+@receiver(post_delete, sender=DownloadLink)
+def download_link_changed(sender, **kwargs):
+    bump_table_version(DOWNLOAD_LINK_TABLE)
+
+
+@receiver(recipes_changed)
+def drop_search_results(sender, **kwargs):
+    search_result_cache.invalidate()
@@ -0,0 +1,95 @@
+"""
+Server-Sent Events stream of the current user's new notifications.
+
+GET /api/notifications/stream/ keeps the response open and writes each
+notification (in the /api/notifications/ item shape) as it is created:
+
+    event: notification
+    id: <notification id>
+    data: {...}
+
+A comment line is sent every NOTIFICATION_STREAM_KEEPALIVE seconds so
+proxies keep the connection open. If the client falls too far behind, a
+`resync` event tells it to refetch the list. Authenticate with the usual
+`Authorization: Bearer <access token>` header, or `?token=` for EventSource
+clients that can't set headers.
+
+The view is async and only serves streams under the ASGI application
+(food_recommendation_backend/asgi.py, e.g. `uvicorn
+food_recommendation_backend.asgi:application`): every open stream is a
+suspended coroutine on the event loop, not a worker thread.
+"""
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from recipes.notification_stream import get_broker
+
+# Ask EventSource clients to reconnect after this many milliseconds.
+RECONNECT_DELAY = 5000
+
+
+def stream_user_id(request):
+    """The user id from the request's access token, or None. Never touches the database."""
+    header = request.headers.get('Authorization', '')
+    raw_token = header[len('Bearer '):] if header.startswith('Bearer ') else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        return AccessToken(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except TokenError:
+        return None
+
+
+def format_event(event, name='notification'):
+    lines = [f"event: {name}"]
+    if isinstance(event, dict) and event.get('id'):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(user_id):
+    """
+    The SSE body for one client. Runs until the client disconnects, which
+    cancels it (or closes it), and the subscription is dropped.
+    """
+    keepalive = getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE', 25)
+    broker = get_broker()
+    subscription = broker.subscribe(user_id)
+    try:
+        yield f"retry: {RECONNECT_DELAY}\n: connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield format_event({}, name='resync')
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@require_GET
+async def notification_stream(request):
+    user_id = stream_user_id(request)
+    if user_id is None:
+        return JsonResponse({"detail": "Authentication required."}, status=401)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would buffer the endless body in a worker thread.
+        return JsonResponse({"detail": "Streaming is only served by the ASGI application."}, status=501)
+
+    response = StreamingHttpResponse(event_stream(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
@@ -1,3 +1,1603 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import threading
+from datetime import timedelta
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from exponent_server_sdk import PushMessage
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from recipes import pantry, search, suggest
+from recipes.bitmap_index import bitmap_index
+from recipes.detail_cache import get_detail_snapshot
+from recipes.milestones import crossed_milestones
+from recipes.signals import notify_recipes_changed, recipes_changed
+from recipes.stats import apply_stats_delta, get_recipe_stats
+from recipes.versions import get_version
+from recipes.view_tracking import ViewBuffer, write_views
+from recipes.notification_fanout import FanoutJob, deliver, notification_fanout
+from recipes.notification_stream import get_broker
+from api.streams import event_stream
+from recipes.push import PushResult, push_delivery
+from recipes.utils import send_batch_notifications, send_notification
+from api.result_cache import search_result_cache
+from api.models import Developer, DownloadLink
+from recipes.models import (
+    Cuisine, DishType, Diet, Occasion, Tag, Ingredient,
+    Recipe, RecipeIngredient, RecipeInteraction, RecipeNutrition, Notification,
+    RecipeStats, RecipeMilestone, PendingPushReceipt
+)
+
+User = get_user_model()
+
+
+def make_recipe(recipe_id, ingredient_count=0, **kwargs):
+    recipe = Recipe.objects.create(id=recipe_id, title=f"Recipe {recipe_id}", description="", **kwargs)
+    for n in range(ingredient_count):
+        ingredient, _ = Ingredient.objects.get_or_create(id=n + 1, defaults={'name': f"ingredient {n + 1}"})
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient)
+    recipe.cuisines.add(Cuisine.objects.get_or_create(name="Indian")[0])
+    recipe.dishTypes.add(DishType.objects.get_or_create(name="main course")[0])
+    recipe.diets.add(Diet.objects.get_or_create(name="vegetarian")[0])
+    recipe.occasions.add(Occasion.objects.get_or_create(name="diwali")[0])
+    recipe.tags.add(Tag.objects.get_or_create(name="Easy")[0], Tag.objects.get_or_create(name="Indian")[0])
+    return recipe
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RecipeFullTextSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bread = Recipe.objects.create(id=1, title="Garlic Bread", description="Crusty and buttery.")
+        cls.stir_fry = Recipe.objects.create(id=2, title="Vegetable Stir Fry", description="Quick weeknight dinner.")
+        RecipeIngredient.objects.create(
+            recipe=cls.stir_fry, ingredient=Ingredient.objects.create(id=1, name="garlic", originalName="garlic cloves")
+        )
+        cls.soup = Recipe.objects.create(id=3, title="Tomato Soup", description="<b>Roasted garlic</b> adds depth.")
+        Recipe.objects.create(id=4, title="Pancakes", description="Fluffy.")
+
+    def setUp(self):
+        cache.clear()
+        search_result_cache.invalidate()
+        self.client = APIClient()
+
+    def search_ids(self, query):
+        response = self.client.get(f'/api/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_ranks_title_then_ingredients_then_summary(self):
+        self.assertEqual(self.search_ids('search=garlic'), [self.bread.pk, self.stir_fry.pk, self.soup.pk])
+        # The last term is a prefix; every term must match.
+        self.assertEqual(self.search_ids('search=tomato+ro'), [self.soup.pk])
+        self.assertEqual(self.search_ids('search=garlic+pancakes'), [])
+
+    def test_explicit_ordering_replaces_relevance(self):
+        self.assertEqual(
+            self.search_ids('search=garlic&ordering=title'), [self.bread.pk, self.soup.pk, self.stir_fry.pk]
+        )
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search_ids('search=garlic"+OR+NEAR(*'), [])
+        self.assertEqual(self.search_ids('search=%22garlic%22'), [self.bread.pk, self.stir_fry.pk, self.soup.pk])
+        self.assertEqual(len(self.search_ids('search=+')), 4)
+
+    def test_index_follows_recipe_changes(self):
+        self.bread.title = "Cheese Toast"
+        self.bread.save()
+        RecipeIngredient.objects.create(recipe=Recipe.objects.get(pk=4), ingredient=Ingredient.objects.get(pk=1))
+        self.soup.delete()
+        self.assertCountEqual(self.search_ids('search=garlic'), [self.stir_fry.pk, 4])
+        self.assertEqual(self.search_ids('search=cheese'), [self.bread.pk])
+
+    def test_rebuild_command_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        self.assertEqual(self.search_ids('search=garlic'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn("rebuilt for 4 recipes", out.getvalue())
+        search_result_cache.invalidate()
+        self.assertEqual(self.search_ids('search=garlic'), [self.bread.pk, self.stir_fry.pk, self.soup.pk])
+
+    def test_postgresql_query(self):
+        with mock.patch.object(search, 'connection', mock.Mock(vendor='postgresql')):
+            sql = str(search.search_recipes(Recipe.objects.all(), "Garlic BRE").query)
+        self.assertIn(search.PG_TABLE, sql)
+        self.assertIn("to_tsquery('english', garlic & bre:*)", sql)
+        self.assertIn("ts_rank_cd", sql)
+
+    def test_backends_without_full_text_fall_back_to_substrings(self):
+        with mock.patch.object(search, 'connection', mock.Mock(vendor='mysql')):
+            recipes = search.search_recipes(Recipe.objects.all(), "garlic")
+            self.assertCountEqual(recipes.values_list('id', flat=True), [self.bread.pk, self.stir_fry.pk, self.soup.pk])
+            self.assertEqual(search.update_search_index([self.bread.pk]), None)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        created_at = timezone.now()
+        for n in range(1, 13):
+            # Repeated and missing scores, and one shared creation time, so ties and NULLs occur.
+            Recipe.objects.create(
+                id=n, title=f"Recipe {n}", description="", healthScore=None if n % 3 == 0 else n % 4 * 10
+            )
+        Recipe.objects.update(created_at=created_at)
+
+    def setUp(self):
+        cache.clear()
+        search_result_cache.invalidate()
+        self.client = APIClient()
+
+    def walk(self, query):
+        """Follow `next` links from the first page; return the ids and the pages seen."""
+        ids, pages = [], []
+        url = f'/api/search/?{query}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append(data)
+            ids += [recipe['id'] for recipe in data['results']]
+            url = data['next']
+        return ids, pages
+
+    def expected(self, descending):
+        # NULLs last either way; ties broken by pk in the direction of the first key.
+        recipes = list(Recipe.objects.values_list('id', 'healthScore'))
+        scored = sorted((r for r in recipes if r[1] is not None), key=lambda r: (r[1], r[0]), reverse=descending)
+        unscored = sorted((r for r in recipes if r[1] is None), reverse=descending)
+        return [pk for pk, _ in scored + unscored]
+
+    def test_cursor_round_trip_with_nulls_and_ties(self):
+        for ordering, descending in (('healthScore', False), ('-healthScore', True)):
+            with self.subTest(ordering=ordering):
+                ids, pages = self.walk(f'ordering={ordering}&page_size=5')
+                self.assertEqual(ids, self.expected(descending))
+                self.assertEqual([len(page['results']) for page in pages], [5, 5, 2])
+                self.assertTrue(all(page['previous'] is None and 'count' not in page for page in pages))
+
+    def test_ties_on_every_key_fall_back_to_pk(self):
+        ids, _ = self.walk('page_size=5')
+        self.assertEqual(ids, list(range(12, 0, -1)))
+
+    def test_count_on_request(self):
+        data = self.client.get('/api/search/?page_size=5&count=true').json()
+        self.assertEqual(data['count'], 12)
+        cursor = data['next'].split('cursor=')[1]
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(f'/api/search/?page_size=5&cursor={cursor}').json()
+        self.assertNotIn('count', data)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+
+    def test_tampered_cursor_is_not_found(self):
+        valid = self.client.get('/api/search/?page_size=5').json()['next'].split('cursor=')[1]
+        wrong_length = base64.urlsafe_b64encode(b'["2024-01-01T00:00:00+00:00"]').decode()
+        wrong_type = base64.urlsafe_b64encode(b'["yesterday", 3]').decode()
+        for cursor in ('not-a-cursor!', wrong_length, wrong_type, valid[:-4]):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/search/', {'page_size': 5, 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+    def test_page_number_requests_keep_the_old_format(self):
+        first = self.client.get('/api/search/?page=1').json()
+        second = self.client.get('/api/search/?page=2').json()
+        self.assertEqual(second['count'], 12)
+        self.assertEqual((len(first['results']), len(second['results'])), (10, 2))
+        self.assertIsNotNone(second['previous'])
+        self.assertIsNone(second['next'])
+        ids = [recipe['id'] for recipe in first['results'] + second['results']]
+        self.assertCountEqual(ids, range(1, 13))
+
+
+class RecipeStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = make_recipe(1)
+        cls.other = make_recipe(2)
+        cls.fan = User.objects.create_user(username="fan", email="fan@example.com", password="pw")
+        cls.critic = User.objects.create_user(username="critic", email="critic@example.com", password="pw")
+
+    def counters(self, recipe):
+        stats = RecipeStats.objects.get(recipe=recipe)
+        return stats.like_count, stats.save_count, stats.view_count
+
+    def test_first_delta_creates_the_row(self):
+        before, after = apply_stats_delta(self.recipe.pk, likes=1, views=3)
+        self.assertEqual((before.like_count, before.view_count), (0, 0))
+        self.assertEqual((after.like_count, after.view_count), (1, 3))
+        self.assertEqual(self.counters(self.recipe), (1, 0, 3))
+
+        before, after = apply_stats_delta(self.other.pk, likes=-1, create=False)
+        self.assertEqual((before.like_count, after.like_count), (0, 0))
+        self.assertFalse(RecipeStats.objects.filter(recipe=self.other).exists())
+
+    def test_transitions_are_reported_from_the_stored_values(self):
+        RecipeStats.objects.create(recipe=self.recipe, like_count=9, save_count=1, view_count=2)
+        before, after = apply_stats_delta(self.recipe.pk, likes=1, saves=-1)
+        self.assertEqual((before.like_count, before.save_count), (9, 1))
+        self.assertEqual((after.like_count, after.save_count), (10, 0))
+        self.assertEqual(crossed_milestones(before, after), [('likes', 10)])
+
+    def test_clamped_decrement_reports_the_real_previous_value(self):
+        RecipeStats.objects.create(recipe=self.recipe, like_count=0, save_count=0, view_count=2)
+        before, after = apply_stats_delta(self.recipe.pk, likes=-1, views=-5)
+        self.assertEqual((before.like_count, before.view_count), (0, 2))
+        self.assertEqual((after.like_count, after.view_count), (0, 0))
+        self.assertEqual(self.counters(self.recipe), (0, 0, 0))
+
+    def test_deleted_interactions_come_off_the_counters(self):
+        RecipeInteraction.objects.create(user=self.fan, recipe=self.recipe, liked=True, saved=True, viewed_count=4)
+        apply_stats_delta(self.recipe.pk, likes=1, saves=1, views=4)
+        self.fan.delete()
+        self.assertEqual(self.counters(self.recipe), (0, 0, 0))
+
+    def test_rebuild_command_recounts_from_interactions(self):
+        RecipeInteraction.objects.create(user=self.fan, recipe=self.recipe, liked=True, viewed_count=3)
+        RecipeInteraction.objects.create(user=self.critic, recipe=self.recipe, saved=True, viewed_count=1)
+        RecipeStats.objects.create(recipe=self.recipe, like_count=40, save_count=0, view_count=0)
+        RecipeStats.objects.create(recipe=self.other, like_count=7, save_count=7, view_count=7)
+
+        out = StringIO()
+        call_command('rebuild_recipe_stats', str(self.other.pk), stdout=out)
+        self.assertIn("Rebuilt counters for 0 recipes", out.getvalue())
+        self.assertEqual(self.counters(self.other), (0, 0, 0))
+        self.assertEqual(self.counters(self.recipe), (40, 0, 0))
+
+        call_command('rebuild_recipe_stats', stdout=out)
+        self.assertIn("Rebuilt counters for 1 recipes", out.getvalue())
+        self.assertEqual(self.counters(self.recipe), (1, 1, 4))
+
+
+@override_settings(RECIPE_VIEW_FLUSH_INTERVAL=3600, RECIPE_VIEW_FLUSH_SIZE=500)
+@mock.patch.object(ViewBuffer, '_ensure_worker')
+class RecipeViewBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = make_recipe(1)
+        cls.other = make_recipe(2)
+        cls.reader = User.objects.create_user(username="reader", email="reader@example.com", password="pw")
+        cls.browser = User.objects.create_user(username="browser", email="browser@example.com", password="pw")
+
+    def setUp(self):
+        self.buffer = ViewBuffer()
+        self.now = timezone.now()
+
+    def view_count(self, recipe):
+        return get_recipe_stats(Recipe.objects.get(pk=recipe.pk)).view_count
+
+    def test_repeat_views_are_coalesced(self, ensure_worker):
+        for minutes in (5, 9, 1):
+            self.buffer.record(self.reader.pk, self.recipe.pk, self.now + timedelta(minutes=minutes))
+        self.buffer.record(self.browser.pk, self.recipe.pk, self.now)
+        self.buffer.record(self.reader.pk, self.other.pk, self.now)
+        ensure_worker.assert_called()
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.buffer.flush(), 0)
+        interaction = RecipeInteraction.objects.get(user=self.reader, recipe=self.recipe)
+        self.assertEqual((interaction.viewed_count, interaction.last_viewed), (1, self.now + timedelta(minutes=9)))
+        self.assertEqual((self.view_count(self.recipe), self.view_count(self.other)), (2, 1))
+
+    def test_views_are_counted_once_a_week(self, ensure_worker):
+        key = (self.reader.pk, self.recipe.pk)
+        write_views({key: self.now})
+        write_views({key: self.now + timedelta(days=6)})
+        interaction = RecipeInteraction.objects.get(user=self.reader, recipe=self.recipe)
+        self.assertEqual((interaction.viewed_count, interaction.last_viewed), (1, self.now + timedelta(days=6)))
+
+        # A week after the last counted view, not after the last view.
+        write_views({key: self.now + timedelta(days=7)})
+        interaction.refresh_from_db()
+        self.assertEqual(interaction.viewed_count, 2)
+        self.assertEqual(interaction.last_viewed_count_updated, self.now + timedelta(days=7))
+        self.assertEqual(self.view_count(self.recipe), 2)
+
+    def test_existing_interaction_keeps_its_state(self, ensure_worker):
+        RecipeInteraction.objects.create(user=self.reader, recipe=self.recipe, liked=True)
+        write_views({(self.reader.pk, self.recipe.pk): self.now + timedelta(minutes=1)})
+        interaction = RecipeInteraction.objects.get(user=self.reader, recipe=self.recipe)
+        self.assertTrue(interaction.liked)
+        self.assertEqual(interaction.last_viewed, self.now + timedelta(minutes=1))
+
+    def test_failed_flush_is_requeued(self, ensure_worker):
+        self.buffer.record(self.reader.pk, self.recipe.pk, self.now)
+        with mock.patch('recipes.view_tracking.write_views', side_effect=DatabaseError("locked")):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+        self.assertFalse(RecipeInteraction.objects.exists())
+
+        # Views recorded meanwhile merge with the re-queued ones.
+        self.buffer.record(self.reader.pk, self.recipe.pk, self.now + timedelta(minutes=1))
+        self.assertEqual(self.buffer.flush(), 1)
+        interaction = RecipeInteraction.objects.get(user=self.reader, recipe=self.recipe)
+        self.assertEqual(interaction.last_viewed, self.now + timedelta(minutes=1))
+        self.assertEqual(self.view_count(self.recipe), 1)
+
+    @override_settings(RECIPE_VIEW_FLUSH_SIZE=2)
+    def test_full_buffer_wakes_the_worker(self, ensure_worker):
+        self.buffer.record(self.reader.pk, self.recipe.pk, self.now)
+        self.assertFalse(self.buffer._wakeup.is_set())
+        self.buffer.record(self.reader.pk, self.other.pk, self.now)
+        self.assertTrue(self.buffer._wakeup.is_set())
+
+    @override_settings(RECIPE_VIEW_FLUSH_INTERVAL=0)
+    def test_unbuffered_views_are_written_through(self, ensure_worker):
+        self.buffer.record(self.reader.pk, self.recipe.pk, self.now)
+        ensure_worker.assert_not_called()
+        self.assertEqual(self.view_count(self.recipe), 1)
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_runs_and_rolls_back(self):
+        make_recipe(1)
+        bitmap_index.rebuild()
+        out = StringIO()
+        call_command('benchmark_recipe_queries', recipes=30, interactions=10, repeat=1, stdout=out)
+        for case in ('search (flag + diets + cuisine)', 'profile liked', 'profile saved', 'profile recently visited'):
+            self.assertIn(f"== {case}", out.getvalue())
+        self.assertEqual(list(Recipe.objects.values_list('pk', flat=True)), [1])
+        self.assertEqual(bitmap_index.recipe_ids(bitmap_index.candidates()), [1])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+@mock.patch('api.views.record_recipe_view')
+class RecipeDetailQueryBudgetTests(TestCase):
+    # recipe (+stats, user), five taxonomy relations, ingredients, viewer's interaction
+    QUERY_BUDGET = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader", email="reader@example.com", password="pw")
+        cls.small = make_recipe(1, ingredient_count=1, user=cls.user)
+        cls.large = make_recipe(2, ingredient_count=25, user=cls.user)
+        RecipeInteraction.objects.create(user=cls.user, recipe=cls.large, liked=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def count_queries(self, recipe):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_anonymous_query_count_does_not_grow_with_ingredients(self, record_view):
+        small_count, _ = self.count_queries(self.small)
+        large_count, data = self.count_queries(self.large)
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, self.QUERY_BUDGET)
+        self.assertEqual(len(data['recipe_ingredients']), 25)
+        record_view.assert_not_called()
+
+    def test_authenticated_query_count_does_not_grow_with_ingredients(self, record_view):
+        self.client.force_authenticate(self.user)
+        small_count, _ = self.count_queries(self.small)
+        large_count, data = self.count_queries(self.large)
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, self.QUERY_BUDGET)
+        self.assertTrue(data['is_liked'])
+        self.assertFalse(data['is_saved'])
+        record_view.assert_called_with(self.user.pk, self.large.pk)
+
+    def test_cached_snapshot_only_loads_live_fields(self, record_view):
+        self.client.force_authenticate(self.user)
+        _, first = self.count_queries(self.large)
+        # Recipe row with stats, then the viewer's interaction.
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/recipes/{self.large.pk}/')
+        self.assertEqual(response.json(), first)
+
+    def test_ingredient_change_invalidates_snapshot(self, record_view):
+        self.count_queries(self.large)
+        recipe_ingredient = self.large.recipe_ingredients.first()
+        recipe_ingredient.metric_amount = 250
+        recipe_ingredient.save()
+        _, data = self.count_queries(self.large)
+        self.assertIn(250, [item['metric_amount'] for item in data['recipe_ingredients']])
+
+    def test_shared_term_changes_invalidate_snapshots(self, record_view):
+        self.count_queries(self.large)
+        ingredient = Ingredient.objects.get(pk=1)
+        ingredient.name = "shallot"
+        ingredient.save()
+        _, data = self.count_queries(self.large)
+        self.assertIn("shallot", [item['name'] for item in data['recipe_ingredients']])
+
+        cuisine = Cuisine.objects.get(name="Indian")
+        cuisine.name = "Punjabi"
+        cuisine.save()
+        _, data = self.count_queries(self.large)
+        self.assertEqual([cuisine['name'] for cuisine in data['cuisines']], ["Punjabi"])
+
+        Diet.objects.get(name="vegetarian").delete()
+        _, data = self.count_queries(self.large)
+        self.assertEqual(data['diets'], [])
+
+    def test_unchanged_term_save_leaves_recipes_alone(self, record_view):
+        words_version = get_version(pantry.VERSION_NAME)
+        with mock.patch.object(recipes_changed, 'send') as send:
+            Ingredient.objects.update_or_create(id=1, defaults={'name': "ingredient 1"})
+            Tag.objects.get(name="Easy").save()
+        send.assert_not_called()
+        self.assertEqual(get_version(pantry.VERSION_NAME), words_version)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+@mock.patch('api.views.record_recipe_view')
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader", email="reader@example.com", password="pw")
+        cls.recipe = make_recipe(1, ingredient_count=3, user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_recipe_detail_not_modified(self, record_view):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        etag = self.client.get(url)['ETag']
+        # Snapshot plus ETag inputs only; nothing is serialized.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_recipe_detail_etag_follows_counters_and_viewer(self, record_view):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        anonymous_etag = self.client.get(url)['ETag']
+
+        self.client.force_authenticate(self.user)
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, anonymous_etag)
+
+        self.client.post(f'{url}like/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_liked'])
+
+    def test_recipe_detail_etag_follows_ingredients_and_taxonomy(self, record_view):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        ingredient = Ingredient.objects.get(pk=1)
+        for change in ('ingredient', 'cuisine'):
+            etag = self.client.get(url)['ETag']
+            # Neither edit saves the recipe itself.
+            if change == 'ingredient':
+                ingredient.name = "shallot"
+                ingredient.save()
+            else:
+                self.recipe.cuisines.add(Cuisine.objects.create(name="Thai"))
+            with self.subTest(change=change):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_filter_options_etag_changes_with_taxonomy(self, record_view):
+        etag = self.client.get('/api/search/filters/')['ETag']
+        self.assertEqual(self.client.get('/api/search/filters/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Cuisine.objects.create(name="Thai")
+        response = self.client.get('/api/search/filters/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_developer_info_etag_changes_with_developers(self, record_view):
+        developer = Developer.objects.create(name="Asha", role="Backend", bio="")
+        etag = self.client.get('/api/developers/')['ETag']
+        # The version stamp only; the view doesn't run.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/developers/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        developer.role = "Full stack"
+        developer.save()
+        response = self.client.get('/api/developers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['role'], "Full stack")
+        self.assertIn('Last-Modified', response)
+
+    def test_download_link_etag_changes_with_the_link(self, record_view):
+        link = DownloadLink.objects.create(title="Android", url="https://example.com/v1.apk")
+        etag = self.client.get('/api/download-link/')['ETag']
+        self.assertEqual(self.client.get('/api/download-link/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        link.url = "https://example.com/v2.apk"
+        link.save()
+        response = self.client.get('/api/download-link/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['download_link'], "https://example.com/v2.apk")
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RecipeBitmapFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curry = make_recipe(1, vegetarian=True, glutenFree=True)
+        cls.salad = make_recipe(2, vegetarian=True, vegan=True)
+        cls.stew = make_recipe(3)
+        cls.paleo = Diet.objects.create(name="paleo")
+        cls.stew.diets.add(cls.paleo)
+        cls.stew.cuisines.set([Cuisine.objects.create(name="Irish")])
+
+    def setUp(self):
+        cache.clear()
+        search_result_cache.invalidate()
+        self.client = APIClient()
+
+    def search_ids(self, query):
+        response = self.client.get(f'/api/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(recipe['id'] for recipe in response.json()['results'])
+
+    def test_filters_match_orm(self):
+        cases = {
+            'vegetarian=true': Recipe.objects.filter(vegetarian=True),
+            'vegetarian=true&vegan=false': Recipe.objects.filter(vegetarian=True, vegan=False),
+            'diets__name=paleo,vegetarian': Recipe.objects.filter(diets__name__in=['paleo', 'vegetarian']),
+            'cuisines__name=Irish&diets__name=paleo': Recipe.objects.filter(cuisines__name='Irish'),
+            'cuisines__name=Irish&vegetarian=true': Recipe.objects.none(),
+            'occasions__name=unknown': Recipe.objects.none(),
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.search_ids(query), sorted(set(expected.values_list('id', flat=True))))
+
+    def test_filtering_does_not_join_taxonomy_tables(self):
+        self.search_ids('vegan=true')  # build the index
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search_ids('diets__name=paleo&cuisines__name=Irish'), [self.stew.pk])
+        self.assertFalse(any('recipes_recipe_diets' in query['sql'] for query in queries))
+
+    def test_index_follows_committed_changes(self):
+        self.assertEqual(self.search_ids('diets__name=paleo'), [self.stew.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.curry.diets.add(self.paleo)
+            self.stew.delete()
+        self.assertEqual(self.search_ids('diets__name=paleo'), [self.curry.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paleo.name = "primal"
+            self.paleo.save()
+        self.assertEqual(self.search_ids('diets__name=primal'), [self.curry.pk])
+        self.assertEqual(self.search_ids('diets__name=paleo'), [])
+
+    def test_changes_committed_elsewhere_trigger_a_rebuild(self):
+        def paleo_ids():
+            return sorted(bitmap_index.recipe_ids(bitmap_index.candidates(terms={'diets': ['paleo']})))
+
+        self.assertEqual(paleo_ids(), [self.stew.pk])
+        # As if another process (say, import_recipes) made the change: the
+        # version moves with it, but this process never sees its on_commit hooks.
+        self.curry.diets.add(self.paleo)
+        self.assertEqual(paleo_ids(), [self.curry.pk, self.stew.pk])
+
+    def test_candidate_bitset_decodes_to_ids(self):
+        bitmap_index.rebuild()
+        bits = bitmap_index.candidates({'vegetarian': True})
+        self.assertEqual(sorted(bitmap_index.recipe_ids(bits)), [self.curry.pk, self.salad.pk])
+
+    def test_filter_options_facet_counts(self):
+        response = self.client.get('/api/search/filters/')
+        facets = response.json()['facets']
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(facets['flags']['vegetarian'], 2)
+        self.assertEqual(facets['diets'], {'vegetarian': 3, 'paleo': 1})
+
+        # Narrowed by the applied filters; a facet ignores its own filter.
+        response = self.client.get('/api/search/filters/?vegan=true&diets__name=paleo')
+        facets = response.json()['facets']
+        self.assertEqual(facets['total'], 0)
+        self.assertEqual(facets['flags']['vegan'], 0)
+        self.assertEqual(facets['flags']['vegetarian'], 0)
+        self.assertEqual(facets['diets'], {'vegetarian': 1, 'paleo': 0})
+        self.assertEqual(facets['cuisines'], {'Indian': 0, 'Irish': 0})
+
+        facets = self.client.get('/api/search/filters/?vegetarian=true').json()['facets']
+        self.assertEqual(facets['cuisines'], {'Indian': 2, 'Irish': 0})
+        self.assertEqual(facets['flags']['vegetarian'], 2)
+        self.assertCountEqual(response.json()['diets'], ['vegetarian', 'paleo'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PantrySearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        names = ["tomatoes", "garlic", "olive oil", "basil", "spaghetti", "eggs", "butter"]
+        cls.ingredients = {
+            name: Ingredient.objects.create(id=n + 1, name=name) for n, name in enumerate(names)
+        }
+
+        def recipe(recipe_id, ingredient_names, **kwargs):
+            recipe = Recipe.objects.create(id=recipe_id, title=f"Recipe {recipe_id}", description="", **kwargs)
+            for name in ingredient_names:
+                RecipeIngredient.objects.create(recipe=recipe, ingredient=cls.ingredients[name])
+            return recipe
+
+        cls.sauce = recipe(1, ["tomatoes", "garlic", "olive oil"], vegan=True)
+        cls.pasta = recipe(2, ["tomatoes", "garlic", "olive oil", "basil", "spaghetti"], vegan=True)
+        cls.omelette = recipe(3, ["eggs", "butter"])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def pantry(self, query):
+        response = self.client.get(f'/api/recipes/pantry/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranks_by_missing_then_coverage(self):
+        data = self.pantry('ingredients=tomato,garlic,oil,egg')
+        self.assertEqual([r['id'] for r in data['results']], [self.sauce.pk, self.omelette.pk, self.pasta.pk])
+        self.assertEqual(data['results'][0]['missing_count'], 0)
+        self.assertEqual(data['results'][1]['missing_ingredients'], ['butter'])
+        self.assertEqual(data['results'][2]['coverage'], 0.6)
+        self.assertEqual(data['unmatched'], [])
+
+    def test_max_missing_limit_and_filters(self):
+        data = self.pantry('ingredients=tomato,garlic,oil,egg&max_missing=1')
+        self.assertEqual([r['id'] for r in data['results']], [self.sauce.pk, self.omelette.pk])
+        data = self.pantry('ingredients=tomato,garlic,oil,egg&vegan=true&limit=1')
+        self.assertEqual([r['id'] for r in data['results']], [self.sauce.pk])
+        data = self.pantry('ingredients=truffle')
+        self.assertEqual((data['results'], data['unmatched']), ([], ['truffle']))
+
+    def test_index_follows_committed_changes(self):
+        self.pantry('ingredients=egg')
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(recipe=self.sauce, ingredient=self.ingredients["basil"])
+        data = self.pantry('ingredients=tomato,garlic,oil')
+        self.assertEqual(data['results'][0]['missing_ingredients'], ['basil'])
+
+    def test_ingredients_added_elsewhere_are_matched(self):
+        self.assertEqual(self.pantry('ingredients=saffron')['unmatched'], ['saffron'])
+        # No on_commit hooks run here, as if another process made the change.
+        saffron = Ingredient.objects.create(id=20, name="saffron threads")
+        RecipeIngredient.objects.create(recipe=self.omelette, ingredient=saffron)
+        data = self.pantry('ingredients=saffron')
+        self.assertEqual([r['id'] for r in data['results']], [self.omelette.pk])
+
+    def test_requires_ingredients(self):
+        self.assertEqual(self.client.get('/api/recipes/pantry/').status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchSuggestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tikka = Recipe.objects.create(id=1, title="Paneer Tikka Masala", description="", aggregateLikes=50)
+        cls.butter = Recipe.objects.create(id=2, title="Butter Chicken", description="", aggregateLikes=500)
+        cls.chickpea = Recipe.objects.create(id=3, title="Chickpea Curry", description="", aggregateLikes=5)
+        Ingredient.objects.create(id=1, name="chicken breast", nameClean="chicken breast")
+        Cuisine.objects.create(name="Chinese")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def suggest(self, query):
+        response = self.client.get('/api/search/suggest/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [(item['type'], item['text']) for item in response.json()['suggestions']]
+
+    def test_prefix_matches_rank_by_query_start_then_popularity(self):
+        self.assertEqual(self.suggest("chick"), [
+            ('recipe', "Chickpea Curry"),
+            ('ingredient', "chicken breast"),
+            ('recipe', "Butter Chicken"),
+        ])
+        self.assertIn(('cuisine', "Chinese"), self.suggest("chi"))
+
+    def test_tolerates_typos(self):
+        self.assertEqual(self.suggest("paner tika"), [('recipe', "Paneer Tikka Masala")])
+        self.assertEqual(self.suggest("buttr chik")[0], ('recipe', "Butter Chicken"))
+        # No typos in short words, nor in the first letter.
+        self.assertEqual(self.suggest("xhickpea"), [])
+        self.assertEqual(self.suggest("c"), [])
+
+    def test_updates_incrementally_after_commit(self):
+        self.assertEqual(self.suggest("biryani"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(id=4, title="Hyderabadi Biryani", description="")
+            self.chickpea.delete()
+            Occasion.objects.create(name="Diwali")
+        self.assertEqual(self.suggest("biryani"), [('recipe', "Hyderabadi Biryani")])
+        self.assertEqual(self.suggest("curry"), [])
+        self.assertEqual(self.suggest("diwal"), [('occasion', "Diwali")])
+
+    def test_changes_committed_elsewhere_trigger_a_rebuild(self):
+        self.assertEqual(self.suggest("biryani"), [])
+        # No on_commit hooks run here, as if another process made the change.
+        Recipe.objects.create(id=4, title="Hyderabadi Biryani", description="")
+        Cuisine.objects.get(name="Chinese").delete()
+        self.assertEqual(self.suggest("biryani"), [('recipe', "Hyderabadi Biryani")])
+        self.assertNotIn(('cuisine', "Chinese"), self.suggest("chi"))
+
+    def test_unchanged_term_save_keeps_the_index(self):
+        self.suggest("chick")
+        version = get_version(suggest.VERSION_NAME)
+        Ingredient.objects.get(id=1).save()
+        self.assertEqual(get_version(suggest.VERSION_NAME), version)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ProfileListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader", email="reader@example.com", password="pw")
+        other = User.objects.create_user(username="other", email="other@example.com", password="pw")
+        now = timezone.now()
+        for n in range(1, 6):
+            recipe = make_recipe(n)
+            RecipeInteraction.objects.create(
+                user=cls.user, recipe=recipe, liked=n % 2 == 1,
+                time_when_liked=now - timedelta(minutes=n) if n % 2 == 1 else None,
+            )
+            RecipeInteraction.objects.create(user=other, recipe=recipe, liked=True, time_when_liked=now)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_liked_recipes_page_through_without_distinct(self):
+        ids = []
+        url = '/api/profile/liked/?page_size=2'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                data = self.client.get(url).json()
+                ids += [recipe['id'] for recipe in data['results']]
+                url = data['next']
+        self.assertEqual(ids, [1, 3, 5])
+        self.assertFalse(any('DISTINCT' in query['sql'] for query in queries))
+
+
+def nutrients(calories, protein, unit='g'):
+    return {"nutrients": [
+        {"name": "Calories", "amount": calories, "unit": "kcal", "percentOfDailyNeeds": 20.0},
+        {"name": "Protein", "amount": protein, "unit": unit, "percentOfDailyNeeds": 40.0},
+        {"name": "Vitamin C", "amount": 12.0, "unit": "mg", "percentOfDailyNeeds": 15.0},
+    ]}
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NutritionFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.light = make_recipe(1, nutrition=nutrients(250.5, 8))
+        cls.medium = make_recipe(2, nutrition=nutrients(480, 31), vegetarian=True)
+        cls.heavy = make_recipe(3, nutrition=nutrients(910, 45))
+        cls.unknown = make_recipe(4)
+
+    def setUp(self):
+        cache.clear()
+        search_result_cache.invalidate()
+        self.client = APIClient()
+
+    def search_ids(self, query):
+        response = self.client.get(f'/api/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(recipe['id'] for recipe in response.json()['results'])
+
+    def test_nutrients_are_extracted_on_save(self):
+        facts = RecipeNutrition.objects.get(recipe=self.light)
+        self.assertEqual((facts.calories, facts.protein, facts.fat), (250.5, 8.0, None))
+        self.assertFalse(RecipeNutrition.objects.filter(recipe=self.unknown).exists())
+
+        self.light.nutrition = nutrients(300, 12, unit='mg')
+        self.light.save()
+        facts.refresh_from_db()
+        # Amounts in an unexpected unit are dropped rather than misread.
+        self.assertEqual((facts.calories, facts.protein), (300.0, None))
+
+        self.light.nutrition = None
+        self.light.save()
+        self.assertFalse(RecipeNutrition.objects.filter(recipe=self.light).exists())
+
+    def test_range_filters(self):
+        cases = {
+            'calories_min=300&calories_max=600': [2],
+            'calories_max=500': [1, 2],
+            'calories_min=400&protein_min=40': [3],
+            'calories_min=300&vegetarian=true': [2],
+            'protein_max=5': [],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.search_ids(query), expected)
+
+    def test_range_filter_uses_calorie_index(self):
+        plan = Recipe.objects.filter(nutrition_facts__calories__range=(300, 600)).explain()
+        self.assertIn('recipes_recipenutrition_calories', plan)
+
+    def test_facets_respect_nutrient_ranges(self):
+        facets = self.client.get('/api/search/filters/?calories_max=500').json()['facets']
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['flags']['vegetarian'], 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchResultCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for n in range(1, 6):
+            make_recipe(n, vegetarian=n % 2 == 1)
+            # Distinct creation times so the default ordering is deterministic.
+            Recipe.objects.filter(pk=n).update(created_at=now - timedelta(minutes=n))
+
+    def setUp(self):
+        cache.clear()
+        search_result_cache.invalidate()
+        self.client = APIClient()
+
+    def get(self, query):
+        """Return (response data, whether the page came from the result cache)."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), not any('LIMIT' in q['sql'] and 'FROM "recipes_recipe"' in q['sql'] for q in queries)
+
+    def test_equivalent_queries_share_a_cached_page(self):
+        first, cached = self.get('vegetarian=true&diets__name=vegetarian,paleo&page_size=2&utm_source=app')
+        self.assertFalse(cached)
+        second, cached = self.get('page_size=2&diets__name=paleo,vegetarian&vegetarian=True')
+        self.assertTrue(cached)
+        self.assertEqual([r['id'] for r in first['results']], [1, 3])
+        self.assertEqual(second['results'], first['results'])
+
+        for data in (first, second):
+            following, _ = self.get(data['next'].split('?', 1)[1])
+            self.assertEqual([r['id'] for r in following['results']], [5])
+            self.assertIsNone(following['next'])
+
+    def test_cached_page_only_loads_card_fields(self):
+        self.get('vegetarian=true')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/search/?vegetarian=true')
+        recipe_queries = [q['sql'] for q in queries if 'FROM "recipes_recipe"' in q['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('"description"', recipe_queries[0])
+
+    def test_recipe_changes_drop_cached_pages(self):
+        self.get('vegetarian=true')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.get(pk=2)
+            recipe.vegetarian = True
+            recipe.save()
+        data, cached = self.get('vegetarian=true')
+        self.assertFalse(cached)
+        self.assertEqual([r['id'] for r in data['results']], [1, 2, 3, 5])
+
+    def test_changes_committed_elsewhere_drop_cached_pages(self):
+        self.get('vegetarian=true')
+        # No on_commit hooks run here, as if another process made the change.
+        Recipe.objects.filter(pk=2).update(vegetarian=True)
+        notify_recipes_changed([2])
+        data, cached = self.get('vegetarian=true')
+        self.assertFalse(cached)
+        self.assertEqual([r['id'] for r in data['results']], [1, 2, 3, 5])
+
+    def test_counter_orderings_are_not_cached(self):
+        self.get('ordering=-like_count')
+        self.get('ordering=title')
+        self.assertEqual(len(search_result_cache), 1)
+
+    @override_settings(SEARCH_RESULT_CACHE_SIZE=2)
+    def test_least_recently_used_page_is_evicted(self):
+        self.get('vegetarian=true')
+        self.get('vegetarian=false')
+        self.get('vegetarian=true')
+        self.get('vegan=true')
+        self.assertTrue(self.get('vegetarian=true')[1])
+        self.assertFalse(self.get('vegetarian=false')[1])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RecipeCardQueryCountTests(TestCase):
+    """
+    A page of recipe cards costs the same number of queries however many
+    cards it holds. If a field added to RecipeSearchSerializer breaks this,
+    load it in RecipeSearchSerializer.setup_eager_loading.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="cook", email="cook@example.com", password="pw")
+        for n in range(1, 7):
+            recipe = make_recipe(n, ingredient_count=2, user=cls.user)
+            recipe.tags.add(Tag.objects.get_or_create(name=f"tag {n}")[0])
+            RecipeInteraction.objects.create(user=cls.user, recipe=recipe, liked=True, saved=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertConstantQueries(self, url, expected):
+        self.client.get(url)  # build the in-memory indexes
+        for page_size in (1, 6):
+            search_result_cache.invalidate()
+            with self.subTest(url=url, page_size=page_size), self.assertNumQueries(expected):
+                response = self.client.get(f'{url}page_size={page_size}')
+                self.assertEqual(len(response.json()['results']), page_size)
+
+    def test_search(self):
+        # Result cache version, recipes and their tags, plus the bitmap index
+        # version check when filtering.
+        self.assertConstantQueries('/api/search/?', 3)
+        self.assertConstantQueries('/api/search/?vegetarian=false&', 4)
+
+    def test_search_result_cache_hit(self):
+        for page_size in (1, 6):
+            self.client.get(f'/api/search/?page_size={page_size}')
+            # Result cache version, recipes and their tags.
+            with self.subTest(page_size=page_size), self.assertNumQueries(3):
+                self.client.get(f'/api/search/?page_size={page_size}')
+
+    def test_profile_lists(self):
+        for url in ('/api/profile/liked/?', '/api/profile/saved/?', '/api/profile/recently-visited/?'):
+            self.assertConstantQueries(url, 2)
+
+    def test_pantry_search(self):
+        url = '/api/recipes/pantry/?ingredients=ingredient 1&limit='
+        self.client.get(f'{url}1')  # build the in-memory indexes
+        for limit in (1, 6):
+            # Word and bitmap index versions, missing ingredient names, recipes, and their tags.
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get(f'{url}{limit}')
+                self.assertEqual(len(response.json()['results']), limit)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+@mock.patch('api.views.record_recipe_view')
+class RecipeBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="batch", email="batch@example.com", password="pw")
+        for n in range(1, 7):
+            make_recipe(n, ingredient_count=3)
+        RecipeInteraction.objects.create(user=cls.user, recipe_id=2, liked=True)
+        RecipeInteraction.objects.create(user=cls.user, recipe_id=5, saved=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, query):
+        response = self.client.get(f'/api/recipes/batch/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_detail_payloads_match_detail_endpoint(self, record_view):
+        data = self.batch('ids=5,2,404,2')
+        self.assertEqual([recipe['id'] for recipe in data['results']], [5, 2])
+        self.assertEqual(data['missing'], [404])
+        self.assertEqual(data['results'][1]['is_liked'], True)
+        self.assertEqual(data['results'][0]['is_saved'], True)
+        for recipe in data['results']:
+            with self.subTest(recipe=recipe['id']):
+                self.assertEqual(recipe, self.client.get(f"/api/recipes/{recipe['id']}/").json())
+        # Only the detail endpoint counts as a view.
+        self.assertEqual(record_view.call_count, 2)
+
+    def test_card_payloads(self, record_view):
+        data = self.batch('ids=3,1&payload=card')
+        self.assertEqual([recipe['id'] for recipe in data['results']], [3, 1])
+        self.assertNotIn('recipe_ingredients', data['results'][0])
+        self.assertCountEqual([tag['name'] for tag in data['results'][0]['tags']], ['Easy', 'Indian'])
+
+    def test_constant_queries(self, record_view):
+        # Recipes with stats, then the full graph (recipes, five taxonomy
+        # relations, ingredients) for those without a snapshot, then the
+        # viewer's interactions.
+        for ids in ('1,2', '1,2,3,4,5,6'):
+            cache.clear()
+            with self.subTest(ids=ids), self.assertNumQueries(9):
+                self.batch(f'ids={ids}')
+        # Once snapshotted: recipes with stats and interactions only.
+        with self.assertNumQueries(2):
+            self.batch('ids=1,2,3,4,5,6')
+        with self.assertNumQueries(2):
+            self.batch('ids=1,2,3,4,5,6&payload=card')
+
+    def test_rejects_bad_requests(self, record_view):
+        for query in ('', 'ids=1,x', 'ids=' + ','.join(str(n) for n in range(1, 52)), 'ids=1&payload=full'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/recipes/batch/?{query}').status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+@mock.patch('api.views.record_recipe_view')
+class SparseFieldsetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="sparse", email="sparse@example.com", password="pw")
+        cls.recipe = make_recipe(1, ingredient_count=3, nutrition=nutrients(400, 20))
+        make_recipe(2)
+        RecipeInteraction.objects.create(user=cls.user, recipe=cls.recipe, liked=True)
+
+    def setUp(self):
+        cache.clear()
+        search_result_cache.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_detail_fields(self, record_view):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/recipes/1/?fields=title,is_liked,bogus').json()
+        self.assertEqual(data, {'id': 1, 'title': "Recipe 1", 'is_liked': True})
+        # The recipe row without the JSON columns, and the viewer's interaction.
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"nutrition"', queries[0]['sql'])
+
+    def test_sparse_detail_uses_but_never_fills_the_snapshot(self, record_view):
+        sparse = self.client.get('/api/recipes/1/?fields=title')
+        self.assertIsNone(get_detail_snapshot(1))
+        full = self.client.get('/api/recipes/1/')
+        self.assertIsNotNone(get_detail_snapshot(1))
+        self.assertNotEqual(sparse['ETag'], full['ETag'])
+        self.assertIn('nutrition', full.json())
+
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/recipes/1/?fields=cuisines,like_count').json()
+        self.assertEqual(data, {'id': 1, 'cuisines': full.json()['cuisines'], 'like_count': 0})
+
+    def test_card_expand(self, record_view):
+        results = self.client.get('/api/search/').json()['results']
+        self.assertNotIn('cuisines', results[0])
+        results = self.client.get('/api/search/?expand=cuisines,nutrition').json()['results']
+        self.assertEqual(results[0]['cuisines'][0]['name'], "Indian")
+        self.assertIn('nutrition', results[0])
+        self.assertIn('tags', results[0])
+
+    def test_card_fields_prune_queries(self, record_view):
+        self.client.get('/api/search/')  # build the in-memory indexes
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get('/api/search/?fields=title&count=true').json()['results']
+        self.assertEqual(results, [{'id': 2, 'title': "Recipe 2"}, {'id': 1, 'title': "Recipe 1"}])
+        # The result cache version, the count and the page, without tags or unused columns.
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('"description"', queries[2]['sql'])
+
+    def test_batch_fields(self, record_view):
+        data = self.client.get('/api/recipes/batch/?ids=1,2&fields=title,is_saved').json()
+        self.assertEqual(data['results'], [
+            {'id': 1, 'title': "Recipe 1", 'is_saved': False},
+            {'id': 2, 'title': "Recipe 2", 'is_saved': False},
+        ])
+        cards = self.client.get('/api/recipes/batch/?ids=1&payload=card&expand=diets').json()
+        self.assertEqual(cards['results'][0]['diets'][0]['name'], "vegetarian")
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RecipeInteractionStateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.user = User.objects.create_user(username="fan", email="fan@example.com", password="pw")
+        cls.recipe = make_recipe(1, user=cls.owner)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def put(self, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(url, data, format='json')
+
+    def test_repeated_like_counts_once(self):
+        first = self.put('/api/recipes/1/like/').json()
+        second = self.put('/api/recipes/1/like/').json()
+        self.assertEqual(first, {'liked': True, 'like_count': 1, 'changed': True})
+        self.assertEqual(second, {'liked': True, 'like_count': 1, 'changed': False})
+        self.assertEqual(Notification.objects.filter(user=self.owner, type='like').count(), 1)
+
+    def test_repeated_unlike_counts_once(self):
+        self.put('/api/recipes/1/like/')
+        for _ in range(2):
+            data = self.client.delete('/api/recipes/1/like/').json()
+            self.assertEqual(data['like_count'], 0)
+        self.assertFalse(RecipeInteraction.objects.get(user=self.user, recipe=self.recipe).liked)
+        self.assertFalse(Notification.objects.filter(user=self.owner, type='like').exists())
+
+    def test_unlike_removes_only_that_users_like_notification(self):
+        other = User.objects.create_user(username="other", email="other@example.com", password="pw")
+        self.put('/api/recipes/1/like/')
+        self.client.force_authenticate(other)
+        self.put('/api/recipes/1/like/')
+        self.assertEqual(Notification.objects.get(user=self.owner, actor=other).data['userId'], str(other.id))
+
+        self.client.delete('/api/recipes/1/like/')
+        self.assertEqual(
+            list(Notification.objects.filter(user=self.owner, type='like').values_list('actor', flat=True)),
+            [self.user.id]
+        )
+
+    def test_put_false_and_invalid_body(self):
+        self.put('/api/recipes/1/like/', {'liked': True})
+        data = self.put('/api/recipes/1/like/', {'liked': False}).json()
+        self.assertEqual(data, {'liked': False, 'like_count': 0, 'changed': True})
+        self.assertEqual(self.put('/api/recipes/1/like/', {'liked': 'yes'}).status_code, 400)
+
+    def test_post_still_toggles(self):
+        self.assertEqual(self.client.post('/api/recipes/1/save/').json()['save_count'], 1)
+        self.assertEqual(self.client.post('/api/recipes/1/save/').json()['save_count'], 0)
+        interaction = RecipeInteraction.objects.get(user=self.user, recipe=self.recipe)
+        self.assertFalse(interaction.saved)
+        self.assertIsNone(interaction.time_when_saved)
+
+    def test_save_state_is_independent_of_like(self):
+        self.put('/api/recipes/1/like/')
+        data = self.put('/api/recipes/1/save/').json()
+        self.assertEqual(data, {'saved': True, 'save_count': 1, 'changed': True})
+        interaction = RecipeInteraction.objects.get(user=self.user, recipe=self.recipe)
+        self.assertTrue(interaction.liked and interaction.saved)
+
+    def test_unchanged_state_skips_writes(self):
+        self.put('/api/recipes/1/like/')
+        with CaptureQueriesContext(connection) as queries:
+            self.put('/api/recipes/1/like/')
+        self.assertFalse(any(query['sql'].startswith(('INSERT', 'DELETE')) for query in queries))
+        self.assertFalse(any('recipes_recipestats" SET' in query['sql'] for query in queries))
+
+    def test_missing_recipe_and_anonymous(self):
+        self.assertEqual(self.client.put('/api/recipes/99/like/').status_code, 404)
+        self.assertEqual(APIClient().put('/api/recipes/1/like/').status_code, 401)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATION_FANOUT_ASYNC=False)
+class RecipeMilestoneTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.user = User.objects.create_user(username="fan", email="fan@example.com", password="pw")
+        cls.recipe = make_recipe(1, user=cls.owner)
+        RecipeStats.objects.create(recipe=cls.recipe, like_count=9)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def milestone_notifications(self):
+        return Notification.objects.filter(type='milestone', related_recipe=self.recipe)
+
+    def put(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(url)
+
+    def test_crossing_is_announced_once(self):
+        self.put('/api/recipes/1/like/')
+        self.assertEqual(RecipeMilestone.objects.get().threshold, 10)
+        self.assertEqual(self.milestone_notifications().count(), User.objects.count())
+
+        # Dropping below the threshold and crossing it again doesn't repeat it.
+        self.client.delete('/api/recipes/1/like/')
+        self.put('/api/recipes/1/like/')
+        self.assertEqual(RecipeMilestone.objects.count(), 1)
+        self.assertEqual(self.milestone_notifications().count(), User.objects.count())
+
+    def test_no_milestone_queries_without_crossing(self):
+        RecipeStats.objects.filter(recipe=self.recipe).update(like_count=3)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put('/api/recipes/1/like/')
+        self.assertFalse(any('recipemilestone' in query['sql'] for query in queries))
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertFalse(self.milestone_notifications().exists())
+
+    def test_jump_over_threshold_is_detected(self):
+        before = RecipeStats(like_count=99, save_count=9)
+        after = RecipeStats(like_count=101, save_count=10)
+        self.assertEqual(crossed_milestones(before, after), [('likes', 100), ('saves', 10)])
+        self.assertEqual(crossed_milestones(after, before), [])
+
+
+def sent_all(messages):
+    return PushResult(sent=len(messages), failed=0, unregistered=0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotificationFanoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.user = User.objects.create_user(username="fan", email="fan@example.com", password="pw")
+        for n in range(5):
+            User.objects.create_user(
+                username=f"user{n}", email=f"user{n}@example.com", password="pw",
+                push_token=f"ExponentPushToken[{n}]" if n % 2 == 0 else None,
+            )
+        cls.recipe = make_recipe(1, user=cls.owner)
+        RecipeStats.objects.create(recipe=cls.recipe, like_count=9)
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('recipes.notification_fanout.logger')
+    @mock.patch('recipes.notification_fanout.deliver')
+    def test_milestone_is_queued_after_the_request(self, deliver, logger):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.put('/api/recipes/1/like/')
+        self.assertEqual(response.json()['like_count'], 10)
+        notification_fanout.join()
+
+        job = deliver.call_args.args[0]
+        self.assertEqual((job.title, job.recipe_id, job.user_ids), ("Recipe Milestone!", 1, None))
+        self.assertEqual(job.data['milestone'], 10)
+        self.assertFalse(Notification.objects.filter(type='milestone').exists())
+
+    @override_settings(NOTIFICATION_FANOUT_CHUNK_SIZE=3)
+    @mock.patch('recipes.notification_fanout.send_push_messages', side_effect=sent_all)
+    def test_deliver_streams_users_in_chunks(self, send_push_messages):
+        job = FanoutJob("Hello", "Everyone", 'system', None, {'type': 'system'}, None)
+        with CaptureQueriesContext(connection) as queries:
+            summary = deliver(job)
+        self.assertEqual(summary, (User.objects.count(), 3))
+
+        self.assertEqual(Notification.objects.filter(title="Hello").count(), User.objects.count())
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)  # 7 users, 3 per chunk
+        tokens = [message.to for call in send_push_messages.call_args_list for message in call.args[0]]
+        self.assertEqual(tokens, [f"ExponentPushToken[{n}]" for n in (0, 2, 4)])
+
+    @mock.patch('recipes.notification_fanout.send_push_messages', side_effect=sent_all)
+    def test_deliver_to_selected_users(self, send_push_messages):
+        job = FanoutJob("Hello", "You two", 'system', 1, {'type': 'system'}, [self.owner.pk, self.user.pk])
+        self.assertEqual(deliver(job).notified, 2)
+        self.assertEqual(
+            set(Notification.objects.filter(related_recipe=self.recipe).values_list('user_id', flat=True)),
+            {self.owner.pk, self.user.pk},
+        )
+        send_push_messages.assert_called_once_with([])
+
+    @override_settings(NOTIFICATION_FANOUT_CHUNK_SIZE=4)
+    @mock.patch('recipes.notification_fanout.send_push_messages')
+    def test_send_batch_notifications_returns_summary(self, send_push_messages):
+        send_push_messages.side_effect = [PushResult(1, 0, 0), PushResult(0, 2, 0)]
+        with CaptureQueriesContext(connection) as queries:
+            summary = send_batch_notifications(
+                users=User.objects.all(), title="Hi", message="All", related_recipe=self.recipe,
+            )
+        # Two chunks, one push token in the first; the second chunk's push batch failed.
+        self.assertEqual(summary, (User.objects.count(), 1))
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 2)
+        notification = Notification.objects.filter(title="Hi").first()
+        self.assertEqual(notification.data['recipeId'], '1')
+
+    @mock.patch('recipes.notification_fanout.send_push_messages', side_effect=sent_all)
+    def test_send_batch_notifications_consumes_users_once(self, send_push_messages):
+        users = iter([self.owner, self.user])
+        self.assertEqual(send_batch_notifications(users=users, title="Hi", message="Two").notified, 2)
+        self.assertEqual(Notification.objects.filter(title="Hi").count(), 2)
+
+
+class StandInExpoServer:
+    """
+    Local HTTP server speaking the bits of the Expo push API the client uses.
+    `send_failures` requests fail with `failure_status` first; tokens in `unregistered`
+    get a DeviceNotRegistered ticket, tickets in `unregistered_receipts` a
+    DeviceNotRegistered receipt, and receipt requests asking for a ticket in
+    `failing_receipts` fail with a 400.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.send_failures = 0
+        self.failure_status = 503
+        self.unregistered = set()
+        self.unregistered_receipts = set()
+        self.failing_receipts = set()
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with server.lock:
+                    server.requests.append((self.path, body))
+                    fail = server.send_failures > 0 and self.path.endswith('/push/send')
+                    if fail:
+                        server.send_failures -= 1
+                if fail:
+                    self.respond(server.failure_status, b'unavailable')
+                elif self.path.endswith('/push/send'):
+                    self.respond(200, json.dumps({'data': [
+                        {'status': 'error', 'message': 'not registered', 'details': {'error': 'DeviceNotRegistered'}}
+                        if message['to'] in server.unregistered else
+                        {'status': 'ok', 'id': f"ticket-{message['to']}"}
+                        for message in body
+                    ]}).encode())
+                elif len(body['ids']) > 1000 or server.failing_receipts.intersection(body['ids']):
+                    self.respond(400, b'bad receipt request')
+                else:
+                    self.respond(200, json.dumps({'data': {
+                        ticket_id: {'status': 'error', 'message': 'gone', 'details': {'error': 'DeviceNotRegistered'}}
+                        if ticket_id in server.unregistered_receipts else {'status': 'ok'}
+                        for ticket_id in body['ids']
+                    }}).encode())
+
+            def respond(self, code, payload):
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json' if code == 200 else 'text/plain')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def sent(self):
+        return [body for path, body in self.requests if path.endswith('/push/send')]
+
+
+@mock.patch('recipes.push.logger')
+class PushDeliveryTests(TestCase):
+
+    def setUp(self):
+        self.expo = StandInExpoServer()
+        self.addCleanup(self.expo.close)
+        settings = override_settings(EXPO_PUSH_HOST=self.expo.url, PUSH_RETRY_BACKOFF=0, PUSH_MAX_WORKERS=3)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    @staticmethod
+    def messages(count):
+        return [PushMessage(to=f"ExponentPushToken[{n}]", title="Hi", body="There") for n in range(count)]
+
+    def test_batches_of_one_hundred(self, logger):
+        result = push_delivery.send(self.messages(250) + [PushMessage(to="not-a-token")])
+        self.assertEqual(result, (250, 0, 0))
+        self.assertEqual(sorted(len(batch) for batch in self.expo.sent()), [50, 100, 100])
+        self.assertEqual(PendingPushReceipt.objects.count(), 250)
+
+    def test_retries_server_errors(self, logger):
+        self.expo.send_failures = 2
+        self.assertEqual(push_delivery.send(self.messages(3)).sent, 3)
+        self.assertEqual(len(self.expo.sent()), 3)
+
+        self.expo.send_failures = 10
+        self.assertEqual(push_delivery.send(self.messages(3)), (0, 3, 0))
+        logger.error.assert_called_once()
+
+    def test_retries_only_transient_errors(self, logger):
+        for status, attempts in ((429, 2), (400, 1), (404, 1)):
+            with self.subTest(status=status):
+                self.expo.requests.clear()
+                self.expo.failure_status = status
+                self.expo.send_failures = 1
+                push_delivery.send(self.messages(1))
+                self.assertEqual(len(self.expo.sent()), attempts)
+
+    def test_single_attempt(self, logger):
+        self.expo.send_failures = 1
+        self.assertEqual(push_delivery.send(self.messages(3), retries=0), (0, 3, 0))
+        self.assertEqual(len(self.expo.sent()), 1)
+
+    def test_receipts_are_read_in_batches(self, logger):
+        user = User.objects.create_user(username="gone", password="pw", push_token="ExponentPushToken[7]")
+        PendingPushReceipt.objects.bulk_create([
+            PendingPushReceipt(ticket_id=f"ticket-{n}", push_token=f"ExponentPushToken[{n}]") for n in range(2500)
+        ])
+        PendingPushReceipt.objects.update(created_at=timezone.now() - timedelta(minutes=20))
+        self.expo.unregistered_receipts = {"ticket-7"}
+
+        self.assertEqual(push_delivery.check_receipts(), 1)
+        self.assertEqual(
+            sorted(len(body['ids']) for path, body in self.expo.requests if path.endswith('/push/getReceipts')),
+            [500, 1000, 1000],
+        )
+        self.assertFalse(PendingPushReceipt.objects.exists())
+        user.refresh_from_db()
+        self.assertIsNone(user.push_token)
+
+    def test_failed_receipt_batch_stays_pending(self, logger):
+        PendingPushReceipt.objects.bulk_create([
+            PendingPushReceipt(ticket_id=f"ticket-{n}", push_token=f"ExponentPushToken[{n}]") for n in range(1500)
+        ])
+        PendingPushReceipt.objects.update(created_at=timezone.now() - timedelta(minutes=20))
+        self.expo.failing_receipts = {"ticket-0"}
+
+        push_delivery.check_receipts()
+        # The other batch was read and dropped; the failed one is tried again next pass.
+        self.assertTrue(PendingPushReceipt.objects.filter(ticket_id="ticket-0").exists())
+        self.assertLess(PendingPushReceipt.objects.count(), 1500)
+        logger.error.assert_called_once()
+
+    def test_request_path_notifications_are_sent_once(self, logger):
+        user = User.objects.create_user(username="liked", password="pw", push_token="ExponentPushToken[0]")
+        self.expo.send_failures = 1
+        self.assertIsNotNone(send_notification(user, "Liked", "Someone liked your recipe"))
+        self.assertEqual(len(self.expo.sent()), 1)
+
+    def test_unregistered_tokens_are_cleared(self, logger):
+        gone = User.objects.create_user(username="gone", password="pw", push_token="ExponentPushToken[0]")
+        later = User.objects.create_user(username="later", password="pw", push_token="ExponentPushToken[1]")
+        kept = User.objects.create_user(username="kept", password="pw", push_token="ExponentPushToken[2]")
+        self.expo.unregistered = {"ExponentPushToken[0]"}
+        self.assertEqual(push_delivery.send(self.messages(3)), (2, 1, 1))
+
+        # Receipts are only read once they are old enough.
+        self.expo.unregistered_receipts = {"ticket-ExponentPushToken[1]"}
+        self.assertEqual(push_delivery.check_receipts(), 0)
+        PendingPushReceipt.objects.update(created_at=timezone.now() - timedelta(minutes=20))
+        self.assertEqual(push_delivery.check_receipts(), 1)
+
+        self.assertEqual(
+            [user.push_token for user in User.objects.filter(pk__in=[gone.pk, later.pk, kept.pk]).order_by('pk')],
+            [None, None, "ExponentPushToken[2]"],
+        )
+        self.assertFalse(PendingPushReceipt.objects.exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class UnreadCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader", email="reader@example.com", password="pw")
+        cls.notifications = [
+            Notification.objects.create(user=cls.user, type='system', title=f"N{n}", message="", is_read=n == 0)
+            for n in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def unread_count(self):
+        return self.client.get('/api/notifications/unread-count/').json()['unread_count']
+
+    def test_cached_count_needs_no_query(self):
+        # Counted, then checked once more after filling the cache.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.unread_count(), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 3)
+
+    def test_new_notifications_increment(self):
+        self.unread_count()
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, type='system', title="New", message="")
+        with mock.patch('recipes.notification_fanout.send_push_messages', side_effect=sent_all):
+            with self.captureOnCommitCallbacks(execute=True):
+                send_batch_notifications(users=[self.user], title="Bulk", message="")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 5)
+
+    def test_mark_read_and_destroy_decrement(self):
+        self.unread_count()
+        unread = self.notifications[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{unread.pk}/mark-read/')
+            self.client.post(f'/api/notifications/{unread.pk}/mark-read/')
+            self.client.delete(f'/api/notifications/{self.notifications[0].pk}/')  # already read
+            self.client.delete(f'/api/notifications/{self.notifications[2].pk}/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 1)
+
+    def test_change_between_count_and_fill_is_not_lost(self):
+        add = cache.add
+
+        def add_after_a_new_notification(*args, **kwargs):
+            # Commits after the count; its increment finds no entry yet.
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=self.user, type='system', title="New", message="")
+            return add(*args, **kwargs)
+
+        with mock.patch('recipes.unread_counts.cache.add', side_effect=add_after_a_new_notification):
+            self.assertEqual(self.unread_count(), 4)
+        self.assertEqual(self.unread_count(), 4)
+
+    def test_mark_all_read_resets(self):
+        self.unread_count()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark-all-read/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 0)
+        self.assertFalse(Notification.objects.filter(user=self.user, is_read=False).exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotificationStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="listener", email="listener@example.com", password="pw")
+        cls.token = str(AccessToken.for_user(cls.user))
+
+    async def open_stream(self, **extra):
+        response = await AsyncClient().get('/api/notifications/stream/', **extra)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertIn(b': connected', await anext(stream))
+        return stream
+
+    async def test_published_notifications_are_streamed(self):
+        broker = get_broker()
+        stream = event_stream('stream-test')
+        self.assertIn(': connected', await anext(stream))
+        self.assertTrue(broker.has_subscribers('stream-test'))
+
+        # Published from another thread, as a request or the fan-out worker would.
+        await asyncio.to_thread(broker.publish_many, [('stream-test', {'id': "n1", 'title': "Hi"})])
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(chunk, 'event: notification\nid: n1\ndata: {"id": "n1", "title": "Hi"}\n\n')
+
+        await stream.aclose()
+        self.assertFalse(broker.has_subscribers('stream-test'))
+
+    async def test_streams_over_asgi_with_header_token(self):
+        stream = await self.open_stream(headers={'Authorization': f"Bearer {self.token}"})
+        await stream.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_KEEPALIVE=0.01)
+    async def test_keepalive_and_query_token(self):
+        stream = await self.open_stream(QUERY_STRING=f"token={self.token}")
+        self.assertEqual(await asyncio.wait_for(anext(stream), 1), b': keepalive\n\n')
+        await stream.aclose()
+
+    async def test_requires_token(self):
+        response = await AsyncClient().get('/api/notifications/stream/', QUERY_STRING="token=nonsense")
+        self.assertEqual(response.status_code, 401)
+
+    def test_refused_outside_asgi(self):
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.client.get('/api/notifications/stream/', headers={'Authorization': f"Bearer {self.token}"})
+        self.assertEqual(response.status_code, 501)
+
+    @mock.patch('recipes.notification_stream.get_broker')
+    def test_new_notifications_are_published_after_commit(self, get_broker):
+        broker = get_broker.return_value
+        broker.has_subscribers.return_value = True
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = Notification.objects.create(user=self.user, type='system', title="Hello", message="")
+            broker.publish_many.assert_not_called()
+        [(user_id, event)] = broker.publish_many.call_args.args[0]
+        self.assertEqual((user_id, event['id'], event['title']), (self.user.pk, str(notification.pk), "Hello"))
@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.urls import path, include
 from .views import *
 from recipes.views import *
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
 from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 from rest_framework.routers import DefaultRouter
+from .streams import notification_stream
 
 urlpatterns = [    
     # Authentication
@@ -15,6 +17,7 @@ urlpatterns = [
     # Search and Filters
     path('search/', RecipeSearchViewSet.as_view({'get': 'list'}), name='search'),
     path('search/filters/', RecipeFilterOptionsView.as_view(), name='search-filters'),
+    path('search/suggest/', SearchSuggestView.as_view(), name='search-suggest'),
 
     # Profile endpoints
     path('profile/liked/', ProfileLikedRecipesView.as_view(), name='profile-liked'),
@@ -22,6 +25,8 @@ urlpatterns = [
     path('profile/recently-visited/', ProfileRecentlyVisitedRecipesView.as_view(), name='profile-recently-visited'),
 
     # Recipe endpoints
+    path('recipes/pantry/', PantrySearchView.as_view(), name='recipe-pantry'),
+    path('recipes/batch/', RecipeBatchView.as_view(), name='recipe-batch'),
     path('recipes/<int:pk>/', RecipeDetailView.as_view(), name='recipe-detail'),
     path('recipes/<int:pk>/like/', RecipeLikeView.as_view(), name='recipe-like'),
     path('recipes/<int:pk>/save/', RecipeSaveView.as_view(), name='recipe-save'),
@@ -33,9 +38,14 @@ urlpatterns = [
     # Notifications
     path('notifications/', NotificationViewSet.as_view({'get': 'list'}), name='notification-list'),
     path('notifications/mark-all-read/', NotificationViewSet.as_view({'post': 'mark_all_read'}), name='notification-mark-all-read'),
+    # Polled for the badge: the user id in the token is enough, don't load the user.
+    path('notifications/unread-count/', NotificationViewSet.as_view(
+        {'get': 'unread_count'}, authentication_classes=[JWTStatelessUserAuthentication]
+    ), name='notification-unread-count'),
     path('notifications/<uuid:pk>/mark-read/', NotificationViewSet.as_view({'post': 'mark_read'}), name='notification-mark-read'),
     path('notifications/<uuid:pk>/', NotificationViewSet.as_view({'delete': 'destroy'}), name='notification-mark-read'),
     path('notifications/register-push-token/', register_push_token, name='register-push-token'),
+    path('notifications/stream/', notification_stream, name='notification-stream'),
 
     # Payment endpoints
     path('payments/create-order/', OrderViewSet.as_view({'post': 'create_order'}), name='create-order'),
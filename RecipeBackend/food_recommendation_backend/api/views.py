@@ -8,24 +8,44 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes, action
 from food_recommendation_backend.views import get_user_profile_picture
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import Recipe, RecipeInteraction, Cuisine, Order, Payment # , UserPreference, Ingredient
+from recipes.models import Recipe, RecipeInteraction, RecipeIngredient, Cuisine, Order, Payment # , UserPreference, Ingredient
 from recipes.serializers import *
 from rest_framework import generics
-from django.utils import timezone
-from datetime import timedelta
-from .filters import RecipeFilter
+from .filters import RecipeFilter, RecipeSearchFilter
+from .pagination import KeysetPagination
+from .result_cache import search_result_cache, canonical_value, ResultPage
 from django.shortcuts import get_object_or_404
 from recipes.models import Notification
 from .models import Developer, DownloadLink
 from .serializers import DeveloperSerializer
-from recipes.utils import send_notification, send_batch_notifications, check_recipe_milestone
+from recipes.utils import send_notification
+from recipes.notification_fanout import broadcast_notification
+from recipes.unread_counts import add_unread, get_unread_count, reset_unread
+from recipes.interactions import set_interaction_state
+from recipes.milestones import record_milestones
+from recipes.view_tracking import record_recipe_view
+from recipes.detail_cache import get_detail_snapshot, get_detail_snapshots, set_detail_snapshot, SNAPSHOT_VERSION
+from recipes.bitmap_index import bitmap_index
+from recipes.pantry import search_pantry
+from recipes.suggest import suggest_index
+from recipes.search import query_terms
+from .conditional import (
+    conditional_response, set_validators, make_etag, table_condition, table_etag,
+    TAXONOMY_TABLES, DEVELOPER_TABLES, DOWNLOAD_LINK_TABLE
+)
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django_filters.constants import EMPTY_VALUES
+from django_filters.utils import translate_validation
 from django.conf import settings
 import razorpay
 from decimal import Decimal
 
 import os
 import json
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from langchain_core.messages import HumanMessage
 from langchain_core.chat_history import BaseChatMessageHistory
 
@@ -116,32 +136,128 @@ class RecipeSearchViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows recipes to be viewed with advanced filtering, searching,
     and ordering based on recipe flags, many-to-many relationships, and ingredients.
+    Cards take ?fields= and ?expand= (see recipes.serializers.SparseFieldsMixin).
     """
     permission_classes = [AllowAny]
     queryset = Recipe.objects.all()
     serializer_class = RecipeSearchSerializer
+    pagination_class = KeysetPagination
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # RecipeSearchFilter goes last so relevance ordering wins over the default ordering.
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, RecipeSearchFilter]
     # Use our custom filterset.
     filterset_class = RecipeFilter
 
-    # Allow searching by recipe title, description, and ingredient name.
-    search_fields = ['title', 'description', 'ingredients__originalName']
+    # ?search= runs against the full-text index (title, summary, ingredient names).
 
-    # Allow ordering by these fields.
-    ordering_fields = ['created_at', 'title', 'aggregateLikes', 'healthScore']
+    # Allow ordering by these fields. like_count/save_count/view_count are the live
+    # RecipeStats counters.
+    ordering_fields = [
+        'created_at', 'title', 'aggregateLikes', 'healthScore',
+        'like_count', 'save_count', 'view_count'
+    ]
     ordering = ['-created_at']
 
-    def get_queryset(self):
-        # Use distinct() to avoid duplicate recipes due to many-to-many joins.
-        return Recipe.objects.all().distinct()
+    # Result pages are cached by id (api/result_cache.py), except when ordered
+    # by the live counters, which move with every like, save and view.
+    uncached_ordering_fields = {'like_count', 'save_count', 'view_count'}
+
+    def get_queryset(self, fields=None):
+        """
+        The recipes with their counters, loading only what the card `fields`
+        read: by default those the request asks for, or every card field when
+        the view has no request (e.g. in benchmark_recipe_queries).
+        """
+        if fields is None and getattr(self, 'request', None) is not None:
+            fields = self.get_serializer().fields
+        # No distinct() needed: taxonomy filters go through the bitmap index and
+        # search through the full-text index, both as `id IN (...)`, so nothing
+        # here joins a many-to-many table. Ordering columns are kept for the cursor.
+        return RecipeSearchSerializer.setup_eager_loading(Recipe.objects.annotate(
+            like_count=Coalesce('stats__like_count', 0),
+            save_count=Coalesce('stats__save_count', 0),
+            view_count=Coalesce('stats__view_count', 0),
+        ), fields, keep=self.ordering_fields)
+
+    def get_result_cache_key(self, request):
+        """
+        A canonical signature of the request, or None if its results shouldn't
+        be cached. Filters are compared by their cleaned values (`true` and
+        `True`, `a,b` and `b,a` are the same), search text by its indexed
+        terms and the ordering as actually applied; page size, cursor and the
+        count flag complete the key. Unknown parameters are ignored.
+        """
+        params = request.query_params
+        paginator = self.paginator
+        if paginator.legacy_page_query_param in params and paginator.cursor_query_param not in params:
+            return None
+
+        queryset = self.get_queryset()
+        filterset = DjangoFilterBackend().get_filterset(request, queryset, self)
+        if not filterset.is_valid():
+            return None
+        ordering = tuple(filters.OrderingFilter().get_ordering(request, queryset, self))
+        if any(field.lstrip('-') in self.uncached_ordering_fields for field in ordering):
+            return None
+        terms = tuple(query_terms(params.get(RecipeSearchFilter.search_param, '')))
+        if terms and not params.get(RecipeSearchFilter.ordering_param):
+            ordering = RecipeSearchFilter.relevance_ordering
+
+        return (
+            tuple(sorted(
+                (name, canonical_value(value))
+                for name, value in filterset.form.cleaned_data.items() if value not in EMPTY_VALUES
+            )),
+            terms,
+            ordering,
+            paginator.get_page_size(request),
+            params.get(paginator.cursor_query_param),
+            params.get(paginator.count_query_param, '').lower() in ('1', 'true'),
+        )
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_result_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        paginator = self.paginator
+        generation = search_result_cache.generation()
+        entry = search_result_cache.get(key, generation)
+        if entry is None:
+            page = paginator.paginate_queryset(self.filter_queryset(self.get_queryset()), request, view=self)
+            search_result_cache.set(
+                key, ResultPage(tuple(recipe.pk for recipe in page), paginator.next_cursor, paginator.count),
+                generation
+            )
+        else:
+            # Only the columns and relations the cards show.
+            recipes = RecipeSearchSerializer.setup_eager_loading(
+                Recipe.objects.all(), self.get_serializer().fields
+            ).in_bulk(entry.ids)
+            page = paginator.restore_page(
+                [recipes[pk] for pk in entry.ids if pk in recipes], request, entry.next_cursor, entry.count
+            )
+
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+def filter_options_etag(request, *args, **kwargs):
+    # Names come from the taxonomy tables, facet counts from the bitmap index.
+    return make_etag(table_etag(TAXONOMY_TABLES), bitmap_index.generation, request.GET.urlencode())
+
 
 class RecipeFilterOptionsView(APIView):
     """
     Endpoint to provide available filter options for recipes.
+
+    `facets` holds the number of recipes per flag and per option, narrowed by
+    the same filter parameters the search endpoint takes (each facet ignores
+    its own parameter). Counts come from the in-memory bitmap index,
+    so this never runs GROUP BY over the M2M tables.
     """
     permission_classes = [AllowAny]
 
+    @method_decorator(condition(etag_func=filter_options_etag))
     def get(self, request, format=None):
         # Hardcode flags as they are fixed fields in the Recipe model.
 
@@ -153,7 +269,10 @@ class RecipeFilterOptionsView(APIView):
             "lowFodmap"
         ]
 
-        ordering = ['created_at', 'title', 'aggregateLikes', 'healthScore']
+        ordering = [
+            'created_at', 'title', 'aggregateLikes', 'healthScore',
+            'like_count', 'save_count', 'view_count'
+        ]
 
         # Get list of unique values for each many-to-many field.
         cuisines = list(Cuisine.objects.values_list('name', flat=True))
@@ -161,21 +280,114 @@ class RecipeFilterOptionsView(APIView):
         diets = list(Diet.objects.values_list('name', flat=True))
         occasions = list(Occasion.objects.values_list('name', flat=True))
 
+        filterset = RecipeFilter(request.query_params, queryset=Recipe.objects.none())
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        applied_flags, applied_terms, others = filterset.indexed_filters()
+        facets = bitmap_index.facet_counts(applied_flags, applied_terms, filterset.candidate_ids(others))
+        # Options without recipes are still listed, with a zero count.
+        for field, names in (('cuisines', cuisines), ('dishTypes', dishTypes),
+                             ('diets', diets), ('occasions', occasions)):
+            facets[field] = {name: facets[field].get(name, 0) for name in names}
+
         data = {
             "flags": flags,
             "cuisines": cuisines,
             "dishTypes": dishTypes,
             "diets": diets,
             "occasions": occasions,
-            'ordering': ordering
+            'ordering': ordering,
+            'facets': facets,
         }
         return Response(data)
 
 
+class SearchSuggestView(APIView):
+    """
+    Autocomplete for the search box: recipe titles, ingredient names and
+    cuisines / dish types / diets / occasions matching `?q=`, tolerating a
+    typo or two. Served from memory (recipes/suggest.py), so it is cheap
+    enough to call on every keystroke.
+
+    Query parameters:
+      - q: what has been typed so far (at least 2 characters)
+      - limit: number of suggestions (default 8, max 20)
+    """
+    permission_classes = [AllowAny]
+    default_limit = 8
+    max_limit = 20
+
+    def get(self, request, format=None):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'query': query, 'suggestions': suggest_index.suggest(query, limit)})
+
+
+class PantrySearchView(APIView):
+    """
+    "Cook with what I have": recipes ranked by how much of a pantry they use,
+    fewest missing ingredients first, then most ingredients covered.
+
+    Query parameters:
+      - ingredients (required): comma-separated ingredient names
+      - limit: number of recipes to return (default 20, max 50)
+      - max_missing: leave out recipes needing more than this many other ingredients
+      - any flag / taxonomy / nutrient range filter accepted by /api/search/
+    """
+    permission_classes = [AllowAny]
+    default_limit = 20
+    max_limit = 50
+
+    def get(self, request, format=None):
+        names = [name.strip() for name in request.query_params.get('ingredients', '').split(',') if name.strip()]
+        if not names:
+            return Response({"error": "ingredients is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+            max_missing = request.query_params.get('max_missing')
+            max_missing = int(max_missing) if max_missing not in (None, '') else None
+        except ValueError:
+            return Response({"error": "limit and max_missing must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        filterset = RecipeFilter(request.query_params, queryset=Recipe.objects.none())
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        flags, terms, others = filterset.indexed_filters()
+        matches, unmatched = search_pantry(
+            names, limit=limit, max_missing=max_missing, flags=flags, terms=terms,
+            candidate_ids=filterset.candidate_ids(others)
+        )
+
+        serializer = RecipeSearchSerializer(context={'request': request})
+        recipes = RecipeSearchSerializer.setup_eager_loading(Recipe.objects.all(), serializer.fields).in_bulk(
+            [match.recipe_id for match in matches]
+        )
+        results = []
+        for match in matches:
+            recipe = recipes.get(match.recipe_id)
+            if recipe is None:
+                # Deleted since the index was last updated.
+                continue
+            data = serializer.to_representation(recipe)
+            data.update({
+                'matched_count': match.matched,
+                'missing_count': match.total - match.matched,
+                'coverage': round(match.matched / match.total, 3),
+                'missing_ingredients': match.missing,
+            })
+            results.append(data)
+
+        return Response({'unmatched': unmatched, 'results': results})
+
+
 class RecipeDetailView(generics.RetrieveAPIView):
     """
-    Returns full details of a recipe.
-    For authenticated users, update interaction:
+    Returns full details of a recipe, or the subset asked for with ?fields=.
+    For authenticated users the view is queued in recipes.view_tracking and
+    written behind in bulk, which updates the interaction:
       • Create if not exists with viewed_count=1 and current timestamps.
       • Always update last_viewed.
       • If more than a week has passed since last_viewed_count_updated, increment viewed_count and update that field.
@@ -183,24 +395,67 @@ class RecipeDetailView(generics.RetrieveAPIView):
     queryset = Recipe.objects.all()
     serializer_class = RecipeDetailSerializer
     permission_classes = [AllowAny]
+    use_snapshot = False
+
+    def get_queryset(self):
+        if self.use_snapshot:
+            # The public payload comes from the cache; only load what the live fields need.
+            return self.queryset.select_related('stats').only(
+                'id', 'updated_at', 'stats__like_count', 'stats__save_count', 'stats__view_count'
+            )
+        return RecipeDetailSerializer.setup_eager_loading(
+            self.queryset, self.request.user, fields=self.get_serializer().fields
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        snapshot = get_detail_snapshot(self.kwargs[self.lookup_field])
+        self.use_snapshot = snapshot is not None
+        recipe = self.get_object()
+        serializer = self.get_serializer(recipe)
+
+        # Conditional GET: answer 304 before serializing anything.
+        etag = self.get_etag(recipe, serializer)
+        not_modified = conditional_response(request, etag, recipe.updated_at)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ['Authorization'])
+            return not_modified
+
+        if snapshot is not None and snapshot['updated_at'] == recipe.updated_at:
+            response = Response({**serializer.select_fields(snapshot['data']), **serializer.to_live_representation(recipe)})
+        else:
+            if self.use_snapshot:
+                # Stale entry: load the full graph after all.
+                self.use_snapshot = False
+                recipe = self.get_queryset().get(pk=recipe.pk)
+                serializer = self.get_serializer(recipe)
+
+            data = serializer.to_public_representation(recipe)
+            if not serializer.is_sparse:
+                # Only whole payloads are shared; a ?fields= subset can't serve other requests.
+                set_detail_snapshot(recipe, data)
+            response = Response({**data, **serializer.to_live_representation(recipe)})
+
+        set_validators(response, etag, recipe.updated_at)
+        # is_liked/is_saved depend on who is asking.
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def get_etag(self, recipe, serializer):
+        """
+        Strong ETag covering everything in the payload: which fields are sent,
+        the recipe content (updated_at) and the live fields among them (the
+        counters and the viewer's like/save state).
+        """
+        return make_etag(
+            recipe.pk, recipe.updated_at.isoformat(), SNAPSHOT_VERSION,
+            ','.join(serializer.fields), serializer.to_live_representation(recipe),
+        )
 
     def get_object(self):
         recipe = super().get_object()
         request = self.request
         if request.user.is_authenticated:
-            interaction, created = RecipeInteraction.objects.get_or_create(
-                user=request.user,
-                recipe=recipe,
-                defaults={'viewed_count': 1,
-                          'last_viewed': timezone.now(),
-                          'last_viewed_count_updated': timezone.now()}
-            )
-            # Always update last_viewed
-            interaction.last_viewed = timezone.now()
-            if not created and timezone.now() - interaction.last_viewed_count_updated >= timedelta(weeks=1):
-                interaction.viewed_count += 1
-                interaction.last_viewed_count_updated = timezone.now()
-            interaction.save()
+            record_recipe_view(request.user.pk, recipe.pk)
         return recipe
 
     def get_serializer_context(self):
@@ -208,96 +463,202 @@ class RecipeDetailView(generics.RetrieveAPIView):
         context.update({"request": self.request})
         return context
 
-class RecipeLikeView(APIView):
+class RecipeBatchView(APIView):
+    """
+    Many recipes in one round trip, for screens that would otherwise call
+    /api/recipes/<pk>/ once per recipe (chat results, notification targets,
+    offline favourites).
+
+    Query parameters:
+      - ids (required): comma-separated recipe ids, at most 50
+      - payload: `detail` (default, as /api/recipes/<pk>/) or `card` (as /api/search/)
+      - fields / expand: as on those endpoints
+
+    Results come back in the order asked for; ids that don't exist are listed
+    in `missing`. Detail payloads come from the detail snapshots where fresh,
+    the rest of the graph is loaded with one bulk prefetch, and the viewer's
+    likes/saves are looked up once for the whole set. Unlike the detail
+    endpoint, this does not count as viewing the recipes.
+    """
+    permission_classes = [AllowAny]
+    max_ids = 50
+    payloads = ('detail', 'card')
+
+    def get(self, request, format=None):
+        try:
+            ids = list(dict.fromkeys(
+                int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()
+            ))
+        except ValueError:
+            return Response({"error": "ids must be comma-separated integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({"error": "ids is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.max_ids:
+            return Response({"error": f"At most {self.max_ids} ids per request."}, status=status.HTTP_400_BAD_REQUEST)
+        payload = request.query_params.get('payload', 'detail')
+        if payload not in self.payloads:
+            return Response({"error": f"payload must be one of: {', '.join(self.payloads)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if payload == 'card':
+            serializer = RecipeSearchSerializer(context={'request': request})
+            recipes = RecipeSearchSerializer.setup_eager_loading(Recipe.objects.all(), serializer.fields).in_bulk(ids)
+            results = {pk: serializer.to_representation(recipe) for pk, recipe in recipes.items()}
+        else:
+            results = self.get_details(request, ids)
+
+        response = Response({
+            'results': [results[pk] for pk in ids if pk in results],
+            'missing': [pk for pk in ids if pk not in results],
+        })
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def get_details(self, request, ids):
+        """Return {recipe_id: detail payload} for the ids that exist."""
+        serializer = RecipeDetailSerializer(context={'request': request})
+        snapshots = get_detail_snapshots(ids)
+        # Every recipe's live fields need its stats; that's all the snapshotted ones need.
+        recipes = Recipe.objects.select_related('stats').only(
+            'id', 'updated_at', 'stats__like_count', 'stats__save_count', 'stats__view_count'
+        ).in_bulk(ids)
+        stale = {
+            pk for pk, recipe in recipes.items()
+            if pk not in snapshots or snapshots[pk]['updated_at'] != recipe.updated_at
+        }
+        if stale:
+            full = RecipeDetailSerializer.setup_eager_loading(
+                Recipe.objects.all(), fields=serializer.fields
+            ).in_bulk(stale)
+            for pk in stale:
+                if pk in full:
+                    recipes[pk] = full[pk]
+                else:
+                    # Deleted in between.
+                    del recipes[pk]
+
+        interactions = {}
+        if request.user.is_authenticated:
+            interactions = {
+                interaction.recipe_id: interaction
+                for interaction in RecipeInteraction.objects.filter(user=request.user, recipe_id__in=list(recipes))
+            }
+        for pk, recipe in recipes.items():
+            recipe.user_interactions = [interactions[pk]] if pk in interactions else []
+
+        results = {}
+        for pk, recipe in recipes.items():
+            if pk in stale:
+                data = serializer.to_public_representation(recipe)
+                if not serializer.is_sparse:
+                    set_detail_snapshot(recipe, data)
+            else:
+                data = serializer.select_fields(snapshots[pk]['data'])
+            results[pk] = {**data, **serializer.to_live_representation(recipe)}
+        return results
+
+class RecipeInteractionStateView(APIView):
+    """
+    Base for the like and save endpoints (recipes.interactions):
+
+      - PUT sets the state: body `{"<field>": true}` (the default) or false,
+      - DELETE clears it,
+      - POST toggles it, for older app builds; unlike the others it isn't
+        safe to retry.
+
+    PUT and DELETE can be repeated freely: the counters only move when the
+    state actually changes. Responds with the new state, the counter and
+    whether anything changed.
+    """
+    field = None          # RecipeInteraction flag
+    count_field = None    # RecipeStats counter returned with it
+
+    def put(self, request, pk, format=None):
+        value = request.data.get(self.field, True)
+        if not isinstance(value, bool):
+            return Response({"detail": f"{self.field} must be true or false."}, status=status.HTTP_400_BAD_REQUEST)
+        return self.set_state(request, pk, value)
+
+    def delete(self, request, pk, format=None):
+        return self.set_state(request, pk, False)
+
     def post(self, request, pk, format=None):
         if not request.user.is_authenticated:
-            return Response({"detail": "Authentication required."}, 
-                          status=status.HTTP_401_UNAUTHORIZED)
+            return self.authentication_required()
+        current = RecipeInteraction.objects.filter(user=request.user, recipe_id=pk, **{self.field: True}).exists()
+        return self.set_state(request, pk, not current)
 
-        try:
-            recipe = get_object_or_404(Recipe, id=pk)
-        except Recipe.DoesNotExist:
-            return Response({"detail": "Recipe not found."}, 
-                          status=status.HTTP_404_NOT_FOUND)
+    def authentication_required(self):
+        return Response({"detail": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
 
-        interaction, created = RecipeInteraction.objects.get_or_create(
-            user=request.user,
-            recipe=recipe,
-            defaults={'liked': True, 'time_when_liked': timezone.now()}
-        )
+    def set_state(self, request, pk, value):
+        if not request.user.is_authenticated:
+            return self.authentication_required()
+
+        recipe = Recipe.objects.select_related('user').only('id', 'title', 'user').filter(pk=pk).first()
+        if recipe is None:
+            return Response({"detail": "Recipe not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        changed, before, after = set_interaction_state(request.user.pk, recipe.pk, self.field, value)
+        if changed:
+            milestones = record_milestones(recipe.pk, before, after)
+            self.state_changed(request, recipe, value, milestones)
+        return Response({
+            self.field: value,
+            self.count_field: getattr(after, self.count_field),
+            'changed': changed,
+        }, status=status.HTTP_200_OK)
+
+    def state_changed(self, request, recipe, value, milestones):
+        """
+        Hook for side effects of an actual change. `milestones` are the
+        (kind, threshold) pairs the change reached for the first time.
+        """
+
+
+class RecipeLikeView(RecipeInteractionStateView):
+    field = 'liked'
+    count_field = 'like_count'
+
+    def state_changed(self, request, recipe, value, milestones):
+        if not value:
+            # Retract this user's like notification (notification_actor_idx)
+            Notification.objects.filter(
+                user=recipe.user, type='like', related_recipe=recipe, actor=request.user
+            ).delete()
+            return
 
-        if not created:
-            interaction.liked = not interaction.liked
-            if interaction.liked:
-                interaction.time_when_liked = timezone.now()
-            else:
-                interaction.time_when_liked = None
-                # Remove the notification using exact match
-                Notification.objects.filter(
-                    user=recipe.user,
-                    type='like',
-                    related_recipe=recipe,
-                    data={'type': 'like', 'userId': str(request.user.id)}
-                ).delete()
-            interaction.save()
-
-        new_like_count = recipe.interactions.filter(liked=True).count()
-        
         # Send notification to recipe owner if recipe was liked
-        if recipe.user and recipe.user != request.user and interaction.liked:
+        if recipe.user and recipe.user != request.user:
+            like_data = {'type': 'like', 'userId': str(request.user.id)}
             send_notification(
                 user=recipe.user,
                 title="New Like!",
                 message=f"{request.user.username} liked your recipe '{recipe.title}'",
                 notification_type='like',
                 related_recipe=recipe,
-                data={'type': 'like', 'userId': str(request.user.id)}
+                data=like_data,
+                actor=request.user
             )
 
-        # Check for milestones
-        milestone_reached, milestone_type, count = check_recipe_milestone(recipe)
-        if milestone_reached and milestone_type == 'likes':
-            # Send notification to all users
-            send_batch_notifications(
-                users=User.objects.all(),
+        # Milestones crossed by this like, each announced once
+        for kind, count in milestones:
+            # Notify all users in the background
+            broadcast_notification(
                 title="Recipe Milestone!",
-                message=f"'{recipe.title}' just reached {count} likes! 🎉",
+                message=f"'{recipe.title}' just reached {count} {kind}! 🎉",
                 notification_type='milestone',
                 related_recipe=recipe,
-                data={'type': 'milestone', 'milestone': count, 'milestoneType': 'likes'}
+                data={'type': 'milestone', 'milestone': count, 'milestoneType': kind}
             )
 
-        return Response({"like_count": new_like_count}, status=status.HTTP_200_OK)
 
-class RecipeSaveView(APIView):
+class RecipeSaveView(RecipeInteractionStateView):
     """
-    Toggle save status for a recipe. Updates time_when_saved when saved.
+    Save state of a recipe. Updates time_when_saved when saved.
     """
-    def post(self, request, pk, format=None):
-        if not request.user.is_authenticated:
-            return Response({"detail": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
-
-        try:
-            recipe = Recipe.objects.get(pk=pk)
-        except Recipe.DoesNotExist:
-            return Response({"detail": "Recipe not found."}, status=status.HTTP_404_NOT_FOUND)
-
-        interaction, created = RecipeInteraction.objects.get_or_create(
-            user=request.user,
-            recipe=recipe,
-            defaults={'saved': True, 'time_when_saved': timezone.now()}
-        )
-        if not created:
-            interaction.saved = not interaction.saved
-            if interaction.saved:
-                interaction.time_when_saved = timezone.now()
-            else:
-                interaction.time_when_saved = None
-            interaction.save()
-
-        new_save_count = recipe.interactions.filter(saved=True).count()
-        
-        return Response({"save_count": new_save_count}, status=status.HTTP_200_OK)
+    field = 'saved'
+    count_field = 'save_count'
 
 
 class ProfileLikedRecipesView(generics.ListAPIView):
@@ -307,12 +668,19 @@ class ProfileLikedRecipesView(generics.ListAPIView):
     """
     serializer_class = RecipeSearchSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Recipe.objects.filter(
-            interactions__user=self.request.user,
-            interactions__liked=True
-        ).order_by('-interactions__time_when_liked').distinct()
+        # Semi-join on the user's interactions instead of JOIN + DISTINCT; the
+        # timestamp is annotated so KeysetPagination can use it as the cursor key.
+        liked = RecipeInteraction.objects.filter(user=self.request.user, liked=True)
+        return RecipeSearchSerializer.setup_eager_loading(Recipe.objects.all(), self.get_serializer().fields).filter(
+            pk__in=liked.values('recipe_id')
+        ).annotate(
+            liked_at=Subquery(liked.filter(recipe=OuterRef('pk')).values(
+                time=Coalesce('time_when_liked', 'last_viewed')
+            )[:1])
+        ).order_by('-liked_at')
 
 class ProfileSavedRecipesView(generics.ListAPIView):
     """
@@ -321,12 +689,17 @@ class ProfileSavedRecipesView(generics.ListAPIView):
     """
     serializer_class = RecipeSearchSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Recipe.objects.filter(
-            interactions__user=self.request.user,
-            interactions__saved=True
-        ).order_by('-interactions__time_when_saved').distinct()
+        saved = RecipeInteraction.objects.filter(user=self.request.user, saved=True)
+        return RecipeSearchSerializer.setup_eager_loading(Recipe.objects.all(), self.get_serializer().fields).filter(
+            pk__in=saved.values('recipe_id')
+        ).annotate(
+            saved_at=Subquery(saved.filter(recipe=OuterRef('pk')).values(
+                time=Coalesce('time_when_saved', 'last_viewed')
+            )[:1])
+        ).order_by('-saved_at')
 
 class ProfileRecentlyVisitedRecipesView(generics.ListAPIView):
     """
@@ -335,11 +708,15 @@ class ProfileRecentlyVisitedRecipesView(generics.ListAPIView):
     """
     serializer_class = RecipeSearchSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Recipe.objects.filter(
-            interactions__user=self.request.user
-        ).order_by('-interactions__last_viewed').distinct()
+        visited = RecipeInteraction.objects.filter(user=self.request.user)
+        return RecipeSearchSerializer.setup_eager_loading(Recipe.objects.all(), self.get_serializer().fields).filter(
+            pk__in=visited.values('recipe_id')
+        ).annotate(
+            visited_at=Subquery(visited.filter(recipe=OuterRef('pk')).values('last_viewed')[:1])
+        ).order_by('-visited_at')
 
 
 # if "GOOGLE_API_KEY" not in os.environ:
@@ -474,17 +851,19 @@ def search_recipes(user_query, context, user_preferences):
     # Build ORM query
     recipes = Recipe.objects.all()
 
-    if "ingredients" in criteria:
-        for ingredient in criteria["ingredients"]:
-            recipes = recipes.filter(ingredients__name__icontains=ingredient)
-
+    # Many-to-many conditions are semi-joins, so no DISTINCT is needed below.
+    recipe_cuisines = Recipe.cuisines.through.objects
     if "cuisines" in criteria:
-        recipes = recipes.filter(cuisines__name__in=criteria["cuisines"])
+        recipes = recipes.filter(pk__in=recipe_cuisines.filter(
+            cuisine__name__in=criteria["cuisines"]
+        ).values('recipe_id'))
 
     # Apply user preferences
     if user_preferences:
         if user_preferences.preferred_cuisines.exists():
-            recipes = recipes.filter(cuisines__in=user_preferences.preferred_cuisines.all())
+            recipes = recipes.filter(pk__in=recipe_cuisines.filter(
+                cuisine__in=user_preferences.preferred_cuisines.all()
+            ).values('recipe_id'))
         if user_preferences.disliked_ingredients.exists():
             recipes = recipes.exclude(ingredients__in=user_preferences.disliked_ingredients.all())
         if user_preferences.dietary_restrictions.exists():
@@ -493,15 +872,30 @@ def search_recipes(user_query, context, user_preferences):
                 recipes = recipes.filter(vegan=True)
             if "gluten-free" in dietary_tags:
                 recipes = recipes.filter(glutenFree=True)
+        # Range scans on the indexed per-serving columns (recipes/nutrition.py).
+        if user_preferences.calorie_range_min is not None:
+            recipes = recipes.filter(nutrition_facts__calories__gte=user_preferences.calorie_range_min)
+        if user_preferences.calorie_range_max is not None:
+            recipes = recipes.filter(nutrition_facts__calories__lte=user_preferences.calorie_range_max)
+
+    if criteria.get("ingredients"):
+        # Rank by how many of the ingredients each recipe uses (see recipes/pantry.py)
+        # instead of requiring every one of them.
+        candidate_ids = set(recipes.values_list('id', flat=True)) if recipes.query.where else None
+        matches, _ = search_pantry(criteria["ingredients"], limit=5, candidate_ids=candidate_ids)
+        found = Recipe.objects.prefetch_related('ingredients').in_bulk([m.recipe_id for m in matches])
+        top_recipes = [found[m.recipe_id] for m in matches if m.recipe_id in found]
+    else:
+        top_recipes = list(recipes.prefetch_related('ingredients')[:5])  # Limit to top 5 results
 
-    if recipes.exists():
+    if top_recipes:
         recipe_list = [
             {
                 "id": r.id,
                 "title": r.title,
                 "ingredients": [i.name for i in r.ingredients.all()],
                 "instructions": r.instructions or r.analyzedInstructions
-            } for r in recipes[:5]  # Limit to top 5 results
+            } for r in top_recipes
         ]
         return {"message": f"Found {len(recipe_list)} matching recipes.", "recipes": recipe_list}
     else:
@@ -541,8 +935,9 @@ def find_similar_recipes(recipe_id, context):
     cuisines = recipe.cuisines.all()
 
     similar_recipes = Recipe.objects.filter(
-        Q(ingredients__in=ingredients) | Q(cuisines__in=cuisines)
-    ).exclude(id=recipe_id).distinct()
+        Exists(RecipeIngredient.objects.filter(recipe=OuterRef('pk'), ingredient__in=ingredients)) |
+        Exists(Recipe.cuisines.through.objects.filter(recipe=OuterRef('pk'), cuisine__in=cuisines))
+    ).exclude(id=recipe_id).prefetch_related('ingredients')
 
     recipe_list = [
         {
@@ -794,6 +1189,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     """
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """Get notifications for current user, ordered by creation date"""
@@ -804,7 +1200,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
     def destroy(self, request, *args, **kwargs):
-        """Delete a notification"""
+        """Delete a notification (the unread count follows via post_delete)"""
         notification = self.get_object()
         notification.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -813,16 +1209,27 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_read(self, request, pk=None):
         """Mark single notification as read"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        # Only the request that actually flips it takes it off the unread count.
+        if self.get_queryset().filter(pk=notification.pk, is_read=False).update(is_read=True):
+            add_unread([request.user.pk], -1)
         return Response(status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read for current user"""
         self.get_queryset().update(is_read=True)
+        reset_unread(request.user.pk)
         return Response(status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """
+        Number of unread notifications of the current user, for the app badge.
+        Routed with token-only authentication (see api/urls.py), so a cached
+        count is served without touching the database.
+        """
+        return Response({"unread_count": get_unread_count(request.user.id)})
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def register_push_token(request):
@@ -1027,6 +1434,7 @@ def get_orders(request):
 
 @api_view(['GET']) 
 @permission_classes([AllowAny])
+@table_condition(DEVELOPER_TABLES)
 def get_dev_info(request):
     """
     Fetch developer information from database with all related data.
@@ -1067,6 +1475,7 @@ def get_dev_info(request):
 
 @api_view(['GET']) 
 @permission_classes([AllowAny])
+@table_condition(DOWNLOAD_LINK_TABLE)
 def get_download_link(request):
     """
     Fetch the download link for the app from the database.
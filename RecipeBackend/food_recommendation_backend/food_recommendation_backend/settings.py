@@ -141,6 +141,25 @@ DATABASES = {
 #     }
 # }
 
+# Cache (rendered recipe payloads, counters). Use a shared backend such as
+# redis://... in CACHE_URL when running more than one worker. The in-memory
+# indexes and search result pages don't depend on it; they track changes
+# through recipes.DataVersion.
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+RECIPE_DETAIL_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Cached unread notification counts (recipes/unread_counts.py) are recounted
+# at least this often (seconds). Keep it short unless the cache is shared.
+UNREAD_COUNT_TIMEOUT = env.int("UNREAD_COUNT_TIMEOUT", default=60)
+
+# Search result pages (recipe ids) cached per process, least recently used evicted first.
+SEARCH_RESULT_CACHE_SIZE = 1000
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -337,6 +356,35 @@ RAZORPAY_KEY_SECRET = env("RAZORPAY_KEY_SECRET", default="")
 
 GOOGLE_API_KEY = env("GOOGLE_API_KEY", default="")
 
+# Recipe detail views are buffered in memory and written in bulk by a background
+# thread (recipes/view_tracking.py). An interval of 0 writes every view inline.
+RECIPE_VIEW_FLUSH_INTERVAL = env.float("RECIPE_VIEW_FLUSH_INTERVAL", default=5.0)
+RECIPE_VIEW_FLUSH_SIZE = env.int("RECIPE_VIEW_FLUSH_SIZE", default=500)
+
+# Milestone and broadcast notifications are fanned out to users by a background
+# thread (recipes/notification_fanout.py), a chunk of users per transaction.
+NOTIFICATION_FANOUT_ASYNC = env.bool("NOTIFICATION_FANOUT_ASYNC", default=True)
+NOTIFICATION_FANOUT_CHUNK_SIZE = env.int("NOTIFICATION_FANOUT_CHUNK_SIZE", default=500)
+
+# Expo push delivery (recipes/push.py): batches published concurrently on a pool
+# of PUSH_MAX_WORKERS threads; network errors, 5xx and 429 responses are retried
+# with exponential backoff (single pushes sent during a request are not). Run the
+# check_push_receipts command periodically to drop unregistered tokens.
+EXPO_PUSH_HOST = env("EXPO_PUSH_HOST", default="https://exp.host")
+PUSH_MAX_WORKERS = env.int("PUSH_MAX_WORKERS", default=4)
+PUSH_MAX_RETRIES = env.int("PUSH_MAX_RETRIES", default=3)
+PUSH_RETRY_BACKOFF = env.float("PUSH_RETRY_BACKOFF", default=0.5)
+PUSH_TIMEOUT = env.float("PUSH_TIMEOUT", default=10.0)
+
+# Live notification stream (api/streams.py, served by the ASGI application).
+# The in-process broker only reaches streams held by the process that created
+# the notification; with several workers use the Redis broker.
+NOTIFICATION_STREAM_BACKEND = env(
+    "NOTIFICATION_STREAM_BACKEND", default="recipes.notification_stream.InProcessBroker"
+)
+NOTIFICATION_STREAM_REDIS_URL = env("NOTIFICATION_STREAM_REDIS_URL", default="")
+NOTIFICATION_STREAM_KEEPALIVE = env.float("NOTIFICATION_STREAM_KEEPALIVE", default=25.0)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -1,7 +1,6 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect
 
-from recipes.serializers import NotificationSerializer
 from .forms import ProfileForm, UserPreferenceForm
 from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import timedelta
@@ -11,6 +10,7 @@ from django.contrib import messages
 from recipes.models import Recipe, UserPreference
 from food_recommendation_backend.models import CustomUser
 from recipes.utils import send_batch_notifications
+from recipes.notification_fanout import broadcast_notification
 from rest_framework.response import Response
 from rest_framework import status
 import json
@@ -134,7 +134,7 @@ def admin_notification_view(request):
 
             # Get target users
             if all_users:
-                users = CustomUser.objects.all()
+                users = None  # fanned out in the background below
             else:
                 # Filter out empty strings and ensure it's a list
                 user_ids = [str(uid) for uid in user_ids if uid and str(uid).strip()]
@@ -172,8 +172,26 @@ def admin_notification_view(request):
                 'timestamp': timezone.now().isoformat()
             }
 
+            if all_users:
+                # Everyone: hand it to the background fan-out instead of
+                # writing a row per user inside this request.
+                broadcast_notification(
+                    title=title,
+                    message=message,
+                    notification_type=notification_type,
+                    related_recipe=related_recipe,
+                    data=notification_data
+                )
+                if is_api:
+                    return Response({
+                        "status": "success",
+                        "message": "Queued notifications for all users",
+                    })
+                messages.success(request, "Queued notifications for all users")
+                return redirect('admin-notification')
+
             # Send notifications
-            notifications = send_batch_notifications(
+            summary = send_batch_notifications(
                 users=users,
                 title=title,
                 message=message,
@@ -186,13 +204,14 @@ def admin_notification_view(request):
             if is_api:
                 return Response({
                     "status": "success",
-                    "message": f"Sent notifications to {len(notifications)} users",
-                    "notifications": NotificationSerializer(notifications, many=True).data
+                    "message": f"Sent notifications to {summary.notified} users",
+                    "notified": summary.notified,
+                    "pushed": summary.pushed,
                 })
             else:
                 messages.success(
                     request, 
-                    f"Successfully sent notifications to {len(notifications)} users"
+                    f"Successfully sent notifications to {summary.notified} users"
                 )
                 return redirect('admin-notification')
 
@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     Cuisine, DishType, Diet, Occasion, Tag, Ingredient,
     Recipe, RecipeIngredient, Favorite, Notification,
-    APIMetadata, UserPreference, RecipeInteraction, Recommendation
+    APIMetadata, UserPreference, RecipeInteraction, Recommendation,
+    RecipeStats, RecipeNutrition, RecipeMilestone
 )
 
 #########################
@@ -86,7 +87,7 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ['type', 'is_read', 'created_at']
     search_fields = ['user__username', 'title', 'message']
     readonly_fields = ['created_at']
-    raw_id_fields = ['user', 'related_recipe']
+    raw_id_fields = ['user', 'actor', 'related_recipe']
 
 @admin.register(APIMetadata)
 class APIMetadataAdmin(admin.ModelAdmin):
@@ -106,6 +107,28 @@ class RecipeInteractionAdmin(admin.ModelAdmin):
     list_filter = ('liked', 'saved')
     ordering = ('-last_viewed',)
 
+@admin.register(RecipeStats)
+class RecipeStatsAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'like_count', 'save_count', 'view_count')
+    search_fields = ('recipe__title',)
+    ordering = ('-like_count',)
+    raw_id_fields = ('recipe',)
+
+@admin.register(RecipeNutrition)
+class RecipeNutritionAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'calories', 'protein', 'fat', 'carbohydrates')
+    search_fields = ('recipe__title',)
+    ordering = ('calories',)
+    raw_id_fields = ('recipe',)
+
+@admin.register(RecipeMilestone)
+class RecipeMilestoneAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'kind', 'threshold', 'reached_at')
+    list_filter = ('kind', 'threshold')
+    search_fields = ('recipe__title',)
+    ordering = ('-reached_at',)
+    raw_id_fields = ('recipe',)
+
 @admin.register(Recommendation)
 class RecommendationAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe', 'score', 'created_at')
@@ -0,0 +1,398 @@
+"""
+In-memory bitmap index over the recipe flags, taxonomy terms and ingredients.
+
+Every recipe gets a dense bit position (so sparse Spoonacular ids don't blow
+up the bitsets), and every flag, every cuisine / dish type / diet / occasion
+name and every ingredient id gets a Python int used as a bitset over those
+positions. A filter combination such as `vegan=true&diets__name=paleo,primal`
+then resolves to a set of candidate ids with a few big-int ANDs and ORs, and
+the database only sees a single `id IN (...)` instead of one join per M2M
+filter plus DISTINCT.
+
+Pantry ranking (see recipes/pantry.py) uses bit-sliced counters: the number
+of ingredients each recipe has, and the number a pantry covers, are held as
+one bitset per binary digit, so per-recipe counts for the whole catalog are
+added and compared with a handful of big-int operations.
+
+The index is per process. It is built lazily on first use and kept in sync
+through the `recipes_changed` signal (see recipes/signals.py): the change
+bumps the index's version in the database (recipes/versions.py) inside its
+transaction and is applied here after it commits. Every query checks that
+version, so other processes (e.g. web workers after `import_recipes` ran)
+notice their copy is out of date and rebuild it.
+"""
+import json
+import threading
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe, RecipeIngredient
+from .versions import bump_version, get_version
+
+FLAG_FIELDS = (
+    'vegetarian', 'vegan', 'glutenFree', 'dairyFree', 'veryHealthy',
+    'cheap', 'veryPopular', 'sustainable', 'lowFodmap',
+)
+TAXONOMY_FIELDS = ('cuisines', 'dishTypes', 'diets', 'occasions')
+
+VERSION_NAME = 'recipe-bitmap-index'
+
+# Keep each statement well under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+# Positions of the set bits in every possible byte, for decoding bitsets.
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _bitset(positions):
+    """Build a bitset from bit positions in one pass (OR-ing bits one by one is quadratic)."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def _load(recipe_ids=None):
+    """
+    Return ({recipe_id: {flag: bool}}, {recipe_id: {taxonomy_field: {names}}},
+    {recipe_id: {ingredient ids}}) for all recipes, or only the given ones.
+    """
+    batches = [None] if recipe_ids is None else _chunks(recipe_ids)
+    flags, terms, ingredients = {}, {}, {}
+    for ids in batches:
+        recipes = Recipe.objects.all() if ids is None else Recipe.objects.filter(id__in=ids)
+        for pk, *values in recipes.values_list('id', *FLAG_FIELDS).order_by('id'):
+            flags[pk] = dict(zip(FLAG_FIELDS, values))
+            terms[pk] = {field: set() for field in TAXONOMY_FIELDS}
+            ingredients[pk] = set()
+        for field in TAXONOMY_FIELDS:
+            rows = recipes.filter(**{f'{field}__isnull': False}).values_list('id', f'{field}__name')
+            for pk, name in rows:
+                terms[pk][field].add(name)
+        rows = RecipeIngredient.objects.all() if ids is None else RecipeIngredient.objects.filter(recipe_id__in=ids)
+        for pk, ingredient_id in rows.values_list('recipe_id', 'ingredient_id'):
+            if pk in ingredients:
+                ingredients[pk].add(ingredient_id)
+    return flags, terms, ingredients
+
+
+def _add_one(planes, bits):
+    """Add 1 at every position in `bits` to the bit-sliced counter `planes` (in place)."""
+    carry = bits
+    for digit, plane in enumerate(planes):
+        if not carry:
+            return
+        planes[digit], carry = plane ^ carry, plane & carry
+    if carry:
+        planes.append(carry)
+
+
+def _subtract(minuend, subtrahend):
+    """Bit-sliced `minuend - subtrahend`, assuming no position goes negative."""
+    result, borrow = [], 0
+    for digit, plane in enumerate(minuend):
+        other = subtrahend[digit] if digit < len(subtrahend) else 0
+        result.append(plane ^ other ^ borrow)
+        borrow = (~plane & other) | (~(plane ^ other) & borrow)
+    return result
+
+
+def _equal(planes, value, within):
+    """Positions in `within` where the bit-sliced counter equals `value`."""
+    if value >> len(planes):
+        return 0
+    bits = within
+    for digit, plane in enumerate(planes):
+        bits &= plane if value >> digit & 1 else ~plane
+        if not bits:
+            break
+    return bits
+
+
+class RecipeBitmapIndex:
+    """Bitsets over recipe flags, taxonomy terms and ingredients. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+        self._reset()
+
+    def _reset(self):
+        self._ids = []          # bit position -> recipe id
+        self._positions = {}    # recipe id -> bit position
+        self._all = 0           # every live recipe
+        self._flags = {field: 0 for field in FLAG_FIELDS}
+        self._terms = {field: {} for field in TAXONOMY_FIELDS}
+        self._ingredients = {}  # ingredient id -> bitset
+        self._totals = []       # bit-sliced ingredient count per recipe
+
+    # --- maintenance ---
+
+    def rebuild(self):
+        """Reload the whole index from the database. Returns the number of recipes indexed."""
+        # Read before loading: a change committed meanwhile leaves the index
+        # at an older version, so it is rebuilt again rather than missed.
+        version = get_version(VERSION_NAME)
+        loaded = _load()
+        with self._lock:
+            self._reset()
+            self._apply(*loaded)
+            self._version = version
+            return len(self._positions)
+
+    def bump_version(self):
+        """
+        Record a change to the indexed recipes in the current transaction.
+        Returns the new version, to hand to update() once it commits.
+        """
+        return bump_version(VERSION_NAME)
+
+    def update(self, recipe_ids, version):
+        """
+        Re-read the given recipes, changed by the commit that moved the index
+        to `version` (from bump_version()). Ids of deleted recipes are dropped.
+        """
+        with self._lock:
+            if self._version is None or self._version == version:
+                # Never built (the first query will load everything anyway),
+                # or already rebuilt from the committed data.
+                return
+            if self._version != version - 1:
+                # Recipes also changed in another commit: a partial update
+                # would paper over that, so rebuild on the next query.
+                self._version = None
+                return
+
+            recipe_ids = set(recipe_ids)
+            mask = _bitset(self._positions[pk] for pk in recipe_ids if pk in self._positions)
+            if mask:
+                keep = ~mask
+                self._all &= keep
+                for field in FLAG_FIELDS:
+                    self._flags[field] &= keep
+                for index in [*self._terms.values(), self._ingredients]:
+                    for key in list(index):
+                        index[key] &= keep
+                        if not index[key]:
+                            del index[key]
+                self._totals = [plane & keep for plane in self._totals]
+
+            self._apply(*_load(recipe_ids))
+            self._version = version
+
+    def invalidate(self):
+        """Force a full rebuild on the next query, here and in every other process."""
+        bump_version(VERSION_NAME)
+        with self._lock:
+            self._version = None
+
+    def _apply(self, flags, terms, ingredients):
+        # Caller holds the lock. Collects positions per bitset first, then
+        # merges each bitset once.
+        positions = []
+        flag_positions = {field: [] for field in FLAG_FIELDS}
+        term_positions = {field: {} for field in TAXONOMY_FIELDS}
+        ingredient_positions = {}
+        total_positions = {}
+        for pk, values in flags.items():
+            position = self._positions.get(pk)
+            if position is None:
+                position = self._positions[pk] = len(self._ids)
+                self._ids.append(pk)
+            positions.append(position)
+            for field, value in values.items():
+                if value:
+                    flag_positions[field].append(position)
+            for field, names in terms[pk].items():
+                for name in names:
+                    term_positions[field].setdefault(name, []).append(position)
+            for ingredient_id in ingredients[pk]:
+                ingredient_positions.setdefault(ingredient_id, []).append(position)
+            total = len(ingredients[pk])
+            digit = 0
+            while total:
+                if total & 1:
+                    total_positions.setdefault(digit, []).append(position)
+                total >>= 1
+                digit += 1
+
+        self._all |= _bitset(positions)
+        for field, field_positions in flag_positions.items():
+            self._flags[field] |= _bitset(field_positions)
+        for field, names in term_positions.items():
+            index = self._terms[field]
+            for name, name_positions in names.items():
+                index[name] = index.get(name, 0) | _bitset(name_positions)
+        for ingredient_id, ingredient_id_positions in ingredient_positions.items():
+            self._ingredients[ingredient_id] = (
+                self._ingredients.get(ingredient_id, 0) | _bitset(ingredient_id_positions)
+            )
+        for digit, digit_positions in total_positions.items():
+            while len(self._totals) <= digit:
+                self._totals.append(0)
+            self._totals[digit] |= _bitset(digit_positions)
+
+    def _ensure_current(self):
+        if get_version(VERSION_NAME) != self._version:
+            self.rebuild()
+
+    # --- queries ---
+
+    @property
+    def generation(self):
+        """Token that changes whenever the indexed data does."""
+        self._ensure_current()
+        return self._version
+
+    def candidates(self, flags=None, terms=None):
+        """
+        Return the bitset of recipes matching every flag in `flags`
+        ({field: bool}) and, for each field in `terms` ({taxonomy_field:
+        [names]}), at least one of the given names.
+        """
+        self._ensure_current()
+        with self._lock:
+            return self._match(flags or {}, terms or {})
+
+    def facet_counts(self, flags=None, terms=None, candidate_ids=None):
+        """
+        Count recipes per flag and per taxonomy term, narrowed by `flags` and
+        `terms` (as for candidates()) and, if given, to `candidate_ids`. Each
+        facet ignores its own filter, so the counts say how many results
+        picking that option would give:
+
+            {'total': n, 'flags': {flag: n}, 'cuisines': {name: n}, ...}
+        """
+        flags, terms = flags or {}, terms or {}
+        self._ensure_current()
+        with self._lock:
+            within = self._within(candidate_ids)
+            counts = {'total': (self._match(flags, terms) & within).bit_count(), 'flags': {}}
+            for field in FLAG_FIELDS:
+                bits = self._match({k: v for k, v in flags.items() if k != field}, terms) & within
+                counts['flags'][field] = (bits & self._flags[field]).bit_count()
+            for field in TAXONOMY_FIELDS:
+                bits = self._match(flags, {k: v for k, v in terms.items() if k != field}) & within
+                counts[field] = {
+                    name: (bits & term_bits).bit_count()
+                    for name, term_bits in self._terms[field].items()
+                }
+            return counts
+
+    def pantry_matches(self, ingredient_ids, flags=None, terms=None, candidate_ids=None,
+                       limit=20, max_missing=None):
+        """
+        Rank recipes using at least one of `ingredient_ids`: fewest missing
+        ingredients first, then most ingredients covered. Recipes are narrowed
+        by `flags` and `terms` (as for candidates()) and, if given, to
+        `candidate_ids`. Returns up to `limit` (recipe_id, matched, total).
+        """
+        self._ensure_current()
+        with self._lock:
+            within = self._match(flags or {}, terms or {}) & self._within(candidate_ids)
+
+            matched, hits = [], 0
+            for ingredient_id in set(ingredient_ids):
+                bits = self._ingredients.get(ingredient_id, 0) & within
+                if bits:
+                    _add_one(matched, bits)
+                    hits |= bits
+            if not hits:
+                return []
+            missing = _subtract(self._totals, matched)
+
+            results = []
+            most_matched = (1 << len(matched)) - 1
+            most_missing = (1 << len(missing)) - 1
+            if max_missing is not None:
+                most_missing = min(most_missing, max_missing)
+            for missing_count in range(most_missing + 1):
+                bucket = _equal(missing, missing_count, hits)
+                if not bucket:
+                    continue
+                hits &= ~bucket
+                for matched_count in range(most_matched, 0, -1):
+                    cell = _equal(matched, matched_count, bucket)
+                    if not cell:
+                        continue
+                    bucket &= ~cell
+                    for recipe_id in self._decode(cell, limit - len(results)):
+                        results.append((recipe_id, matched_count, matched_count + missing_count))
+                    if len(results) >= limit:
+                        return results
+                    if not bucket:
+                        break
+                if not hits:
+                    break
+            return results
+
+    def _match(self, flags, terms):
+        # Caller holds the lock.
+        bits = self._all
+        for field, value in flags.items():
+            bits &= self._flags[field] if value else ~self._flags[field]
+        for field, names in terms.items():
+            index = self._terms[field]
+            matching = 0
+            for name in names:
+                matching |= index.get(name, 0)
+            bits &= matching
+        return bits
+
+    def _within(self, candidate_ids):
+        # Caller holds the lock.
+        if candidate_ids is None:
+            return self._all
+        positions = self._positions
+        return _bitset(positions[pk] for pk in candidate_ids if pk in positions)
+
+    def _decode(self, bits, limit=None):
+        # Caller holds the lock.
+        ids = self._ids
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        result = []
+        for offset, byte in enumerate(data):
+            if byte:
+                result.extend(ids[offset * 8 + bit] for bit in _BYTE_BITS[byte])
+                if limit is not None and len(result) >= limit:
+                    return result[:limit]
+        return result
+
+    def recipe_ids(self, bits):
+        """Decode a bitset returned by candidates() into recipe ids."""
+        with self._lock:
+            return self._decode(bits)
+
+    def filter_queryset(self, queryset, flags=None, terms=None):
+        """Restrict a Recipe queryset to the recipes matching `flags` and `terms`."""
+        bits = self.candidates(flags, terms)
+        if not bits:
+            return queryset.none()
+        return queryset.filter(id__in=ids_subquery(self.recipe_ids(bits)))
+
+
+def ids_subquery(ids):
+    """
+    An `id__in` right-hand side for an arbitrarily long id list, passed as a
+    single parameter where the backend allows it so large candidate sets
+    don't run into bound-parameter limits.
+    """
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        return RawSQL("SELECT value FROM json_each(%s)", [json.dumps(ids)])
+    if vendor == 'postgresql':
+        return RawSQL("SELECT unnest(%s::integer[])", [ids])
+    return ids
+
+
+bitmap_index = RecipeBitmapIndex()
@@ -0,0 +1,45 @@
+"""
+Cache of the public part of the recipe detail payload.
+
+Ingredients, instructions, nutrition and taxonomy only change when a recipe is
+edited or re-imported, so RecipeDetailView serializes them once and keeps the
+result here. Each request then only adds the live counters and the viewer's
+is_liked/is_saved on top (see RecipeDetailSerializer.LIVE_FIELDS).
+
+Entries are keyed by recipe id and carry the recipe's updated_at, so a stale
+entry is never served. The `recipes_changed` signal moves updated_at for
+ingredient and taxonomy edits that don't save the recipe, and drops the
+entries right away.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+# Bump when the shape of the detail payload changes.
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_key(recipe_id):
+    return f'recipe-detail:v{SNAPSHOT_VERSION}:{recipe_id}'
+
+
+def get_detail_snapshot(recipe_id):
+    """Return {'updated_at': datetime, 'data': dict} or None."""
+    return cache.get(snapshot_key(recipe_id))
+
+
+def get_detail_snapshots(recipe_ids):
+    """get_detail_snapshot() for many recipes in one cache round trip: {recipe_id: snapshot}."""
+    keys = {snapshot_key(recipe_id): recipe_id for recipe_id in recipe_ids}
+    return {keys[key]: snapshot for key, snapshot in cache.get_many(keys).items()}
+
+
+def set_detail_snapshot(recipe, data):
+    cache.set(
+        snapshot_key(recipe.pk),
+        {'updated_at': recipe.updated_at, 'data': data},
+        getattr(settings, 'RECIPE_DETAIL_CACHE_TIMEOUT', 60 * 60 * 24)
+    )
+
+
+def invalidate_detail_snapshots(recipe_ids):
+    cache.delete_many([snapshot_key(recipe_id) for recipe_id in recipe_ids])
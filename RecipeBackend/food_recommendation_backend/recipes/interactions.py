@@ -0,0 +1,59 @@
+"""
+Idempotent like/save state changes.
+
+set_interaction_state() moves a user's like or save of a recipe to a given
+state instead of toggling it, so a double tap or a retried request can't flip
+it back. The change is a single conditional UPDATE (plus an INSERT the first
+time the user touches the recipe), a repeat only reads, and the RecipeStats counter moves only if
+the state actually changed.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import RecipeInteraction, RecipeStats
+from .stats import apply_stats_delta
+
+# Interaction flag -> (timestamp field, apply_stats_delta keyword).
+STATE_FIELDS = {
+    'liked': ('time_when_liked', 'likes'),
+    'saved': ('time_when_saved', 'saves'),
+}
+
+
+def _update_if_different(user_id, recipe_id, field, values):
+    return RecipeInteraction.objects.filter(
+        user_id=user_id, recipe_id=recipe_id
+    ).exclude(**{field: values[field]}).update(**values) > 0
+
+
+def set_interaction_state(user_id, recipe_id, field, value):
+    """
+    Set the user's `field` ('liked' or 'saved') on a recipe to `value`,
+    stamping or clearing its timestamp. The recipe must exist.
+
+    Returns (changed, before, after) where before/after are the recipe's
+    RecipeStats around the change (the same snapshot twice if nothing changed).
+    """
+    timestamp_field, counter = STATE_FIELDS[field]
+    values = {field: value, timestamp_field: timezone.now() if value else None}
+
+    with transaction.atomic():
+        changed = _update_if_different(user_id, recipe_id, field, values)
+        if not changed and value and not RecipeInteraction.objects.filter(
+            user_id=user_id, recipe_id=recipe_id
+        ).exists():
+            # First interaction with the recipe.
+            try:
+                with transaction.atomic():
+                    RecipeInteraction.objects.create(user_id=user_id, recipe_id=recipe_id, **values)
+                changed = True
+            except IntegrityError:
+                # The row exists; it may have been created concurrently in the other state.
+                changed = _update_if_different(user_id, recipe_id, field, values)
+
+        if changed:
+            before, after = apply_stats_delta(recipe_id, **{counter: 1 if value else -1})
+            return True, before, after
+
+    stats = RecipeStats.objects.filter(recipe_id=recipe_id).first() or RecipeStats(recipe_id=recipe_id)
+    return False, stats, stats
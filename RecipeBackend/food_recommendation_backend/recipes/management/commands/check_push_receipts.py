@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from recipes.push import push_delivery
+
+
+class Command(BaseCommand):
+    help = (
+        "Read Expo delivery receipts of recently sent push notifications and clear "
+        "push tokens of devices that are no longer registered. Run every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=15,
+                            help='Only check tickets at least this many minutes old (default: 15).')
+
+    def handle(self, *args, **options):
+        cleared = push_delivery.check_receipts(min_age=timedelta(minutes=options['min_age']))
+        self.stdout.write(self.style.SUCCESS(f"Cleared {cleared} unregistered push tokens."))
@@ -5,6 +5,7 @@ from recipes.models import (
     Recipe, Ingredient, RecipeIngredient, Cuisine,
     DishType, Diet, Occasion, Tag
 )
+from recipes.signals import batch_recipe_changes
 
 def process_nutrition(nutrition_data):
     """
@@ -86,7 +87,8 @@ class Command(BaseCommand):
         imported_count = 0
         updated_count = 0
 
-        with transaction.atomic():
+        # Derived data (search index, ...) is refreshed once at the end of the batch.
+        with transaction.atomic(), batch_recipe_changes():
             for recipe_data in data:
                 recipe_id = recipe_data.get("id")
                 if not recipe_id:
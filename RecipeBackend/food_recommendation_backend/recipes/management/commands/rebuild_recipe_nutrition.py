@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.nutrition import rebuild_recipe_nutrition
+
+
+class Command(BaseCommand):
+    help = "Re-extract the indexed RecipeNutrition columns from Recipe.nutrition."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_recipe_nutrition()
+        self.stdout.write(self.style.SUCCESS(f"Nutrition columns rebuilt for {count} recipes."))
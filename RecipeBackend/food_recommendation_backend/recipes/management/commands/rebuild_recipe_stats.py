@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from recipes.stats import rebuild_recipe_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the RecipeStats like/save/view counters from RecipeInteraction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int, help='Only rebuild these recipes (default: all).')
+
+    def handle(self, *args, **options):
+        count = rebuild_recipe_stats(options['recipe_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {count} recipes."))
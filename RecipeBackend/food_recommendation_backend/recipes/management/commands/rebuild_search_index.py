@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text recipe search index from the Recipe and RecipeIngredient tables."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {count} recipes."))
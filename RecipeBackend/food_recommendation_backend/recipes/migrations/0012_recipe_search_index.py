@@ -0,0 +1,82 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5("
+            "title, summary, ingredients, "
+            "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS recipes_recipe_search ("
+            "recipe_id integer PRIMARY KEY REFERENCES recipes_recipe (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS recipes_recipe_search_document_idx "
+            "ON recipes_recipe_search USING GIN (document)"
+        )
+    else:
+        return
+    populate_search_index(apps, schema_editor)
+
+
+def populate_search_index(apps, schema_editor):
+    """Index the recipes that already exist."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+
+    names = {}
+    for recipe_id, name, original_name in RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient__name', 'ingredient__originalName'
+    ):
+        recipe_names = names.setdefault(recipe_id, [])
+        for value in (name, original_name):
+            if value and value not in recipe_names:
+                recipe_names.append(value)
+
+    rows = [
+        (pk, title or '', strip_tags(description or ''), ' '.join(names.get(pk, [])))
+        for pk, title, description in Recipe.objects.values_list('id', 'title', 'description').iterator()
+    ]
+    if not rows:
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'sqlite':
+            cursor.executemany(
+                "INSERT INTO recipes_recipe_fts (rowid, title, summary, ingredients) VALUES (%s, %s, %s, %s)",
+                rows
+            )
+        else:
+            cursor.executemany(
+                "INSERT INTO recipes_recipe_search (recipe_id, document) VALUES (%s, "
+                "setweight(to_tsvector('english', %s), 'A') || "
+                "setweight(to_tsvector('english', %s), 'C') || "
+                "setweight(to_tsvector('english', %s), 'B'))",
+                rows
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS recipes_recipe_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS recipes_recipe_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_alter_userpreference_dietary_restrictions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
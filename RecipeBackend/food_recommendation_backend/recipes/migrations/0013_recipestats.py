@@ -0,0 +1,47 @@
+# Generated by Django 5.1.9 on 2026-10-17 19:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_recipe_stats(apps, schema_editor):
+    RecipeInteraction = apps.get_model('recipes', 'RecipeInteraction')
+    RecipeStats = apps.get_model('recipes', 'RecipeStats')
+    totals = RecipeInteraction.objects.values('recipe_id').annotate(
+        likes=Count('id', filter=Q(liked=True)),
+        saves=Count('id', filter=Q(saved=True)),
+        views=Sum('viewed_count'),
+    ).order_by()
+    RecipeStats.objects.bulk_create([
+        RecipeStats(
+            recipe_id=row['recipe_id'],
+            like_count=row['likes'],
+            save_count=row['saves'],
+            view_count=row['views'] or 0,
+        )
+        for row in totals
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='recipes.recipe')),
+                ('like_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('save_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('view_count', models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Recipe stats',
+            },
+        ),
+        migrations.RunPython(populate_recipe_stats, migrations.RunPython.noop),
+    ]
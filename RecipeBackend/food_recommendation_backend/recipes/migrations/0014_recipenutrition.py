@@ -0,0 +1,69 @@
+# Generated by Django 5.1.9 on 2026-10-17 20:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of recipes.nutrition.NUTRIENTS as of this migration.
+NUTRIENTS = {
+    'calories': ('calories', 'kcal'),
+    'protein': ('protein', 'g'),
+    'fat': ('fat', 'g'),
+    'saturated_fat': ('saturated fat', 'g'),
+    'carbohydrates': ('carbohydrates', 'g'),
+    'sugar': ('sugar', 'g'),
+    'fiber': ('fiber', 'g'),
+    'sodium': ('sodium', 'mg'),
+}
+
+
+def populate_recipe_nutrition(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeNutrition = apps.get_model('recipes', 'RecipeNutrition')
+    rows = []
+    for recipe_id, nutrition in Recipe.objects.exclude(nutrition=None).values_list('id', 'nutrition').iterator():
+        if not isinstance(nutrition, dict):
+            continue
+        by_name = {}
+        for nutrient in nutrition.get('nutrients') or []:
+            if isinstance(nutrient, dict) and isinstance(nutrient.get('name'), str):
+                by_name.setdefault(nutrient['name'].strip().lower(), nutrient)
+        values = {}
+        for field, (name, unit) in NUTRIENTS.items():
+            nutrient = by_name.get(name)
+            if nutrient is None or str(nutrient.get('unit', unit)).lower() != unit:
+                continue
+            try:
+                values[field] = float(nutrient['amount'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        if values:
+            rows.append(RecipeNutrition(recipe_id=recipe_id, **values))
+    RecipeNutrition.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition_facts', serialize=False, to='recipes.recipe')),
+                ('calories', models.FloatField(blank=True, db_index=True, help_text='kcal per serving', null=True)),
+                ('protein', models.FloatField(blank=True, db_index=True, help_text='Grams per serving', null=True)),
+                ('fat', models.FloatField(blank=True, db_index=True, help_text='Grams per serving', null=True)),
+                ('saturated_fat', models.FloatField(blank=True, db_index=True, help_text='Grams per serving', null=True)),
+                ('carbohydrates', models.FloatField(blank=True, db_index=True, help_text='Grams per serving', null=True)),
+                ('sugar', models.FloatField(blank=True, db_index=True, help_text='Grams per serving', null=True)),
+                ('fiber', models.FloatField(blank=True, db_index=True, help_text='Grams per serving', null=True)),
+                ('sodium', models.FloatField(blank=True, db_index=True, help_text='Milligrams per serving', null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Recipe nutrition',
+            },
+        ),
+        migrations.RunPython(populate_recipe_nutrition, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.9 on 2026-10-17 20:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of recipes.milestones.THRESHOLDS as of this migration.
+THRESHOLDS = (10, 100, 500, 1000)
+
+
+def record_reached_milestones(apps, schema_editor):
+    # Milestones already passed must not fire again when a counter next moves.
+    RecipeStats = apps.get_model('recipes', 'RecipeStats')
+    RecipeMilestone = apps.get_model('recipes', 'RecipeMilestone')
+    rows = []
+    stats = RecipeStats.objects.filter(like_count__gte=THRESHOLDS[0]) | RecipeStats.objects.filter(
+        save_count__gte=THRESHOLDS[0]
+    )
+    for recipe_id, likes, saves in stats.values_list('recipe_id', 'like_count', 'save_count').iterator():
+        for kind, count in (('likes', likes), ('saves', saves)):
+            rows += [
+                RecipeMilestone(recipe_id=recipe_id, kind=kind, threshold=threshold)
+                for threshold in THRESHOLDS if threshold <= count
+            ]
+    RecipeMilestone.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipenutrition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeMilestone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('likes', 'Likes'), ('saves', 'Saves')], max_length=10)),
+                ('threshold', models.PositiveIntegerField()),
+                ('reached_at', models.DateTimeField(auto_now_add=True)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestones', to='recipes.recipe')),
+            ],
+            options={
+                'unique_together': {('recipe', 'kind', 'threshold')},
+            },
+        ),
+        migrations.RunPython(record_reached_milestones, migrations.RunPython.noop),
+    ]
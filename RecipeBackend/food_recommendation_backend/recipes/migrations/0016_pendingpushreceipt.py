@@ -0,0 +1,21 @@
+# Generated by Django 5.1.9 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipemilestone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPushReceipt',
+            fields=[
+                ('ticket_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('push_token', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.9 on 2026-10-17 20:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_like_actors(apps, schema_editor):
+    # Like notifications so far only recorded the liker in data['userId'].
+    Notification = apps.get_model('recipes', 'Notification')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    user_ids = set(User.objects.values_list('pk', flat=True))
+    updated = []
+    for notification in Notification.objects.filter(type='like', actor__isnull=True).only('id', 'data').iterator():
+        try:
+            actor_id = int((notification.data or {}).get('userId'))
+        except (TypeError, ValueError):
+            continue
+        if actor_id in user_ids:
+            notification.actor_id = actor_id
+            updated.append(notification)
+    Notification.objects.bulk_update(updated, ['actor'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_pendingpushreceipt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='caused_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'type', 'related_recipe', 'actor'], name='notification_actor_idx'),
+        ),
+        migrations.RunPython(backfill_like_actors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.9 on 2026-10-17 21:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
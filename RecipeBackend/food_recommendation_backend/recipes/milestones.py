@@ -0,0 +1,49 @@
+"""
+Like/save milestones detected from counter transitions.
+
+apply_stats_delta() returns the RecipeStats before and after each atomic
+update, so a milestone is reached exactly when an update moves a counter
+from below a threshold to at or above it. Concurrent likes each see their
+own transition and can't step over a threshold unnoticed. Checking costs
+nothing unless a threshold was crossed, and RecipeMilestone's unique
+constraint makes sure each one is recorded, and announced, only once even
+if unlikes and re-likes cross it again.
+"""
+from django.db import IntegrityError, transaction
+
+from .models import RecipeMilestone
+
+THRESHOLDS = (10, 100, 500, 1000)
+
+# RecipeMilestone.kind -> RecipeStats counter.
+COUNTERS = {
+    'likes': 'like_count',
+    'saves': 'save_count',
+}
+
+
+def crossed_milestones(before, after):
+    """Return the (kind, threshold) pairs crossed upwards between two RecipeStats snapshots."""
+    crossed = []
+    for kind, counter in COUNTERS.items():
+        old, new = getattr(before, counter), getattr(after, counter)
+        crossed += [(kind, threshold) for threshold in THRESHOLDS if old < threshold <= new]
+    return crossed
+
+
+def record_milestones(recipe_id, before, after):
+    """
+    Record the milestones crossed between `before` and `after` and return the
+    (kind, threshold) pairs reached for the first time, which the caller
+    should announce.
+    """
+    reached = []
+    for kind, threshold in crossed_milestones(before, after):
+        try:
+            with transaction.atomic():
+                RecipeMilestone.objects.create(recipe_id=recipe_id, kind=kind, threshold=threshold)
+        except IntegrityError:
+            # Already reached before (e.g. unliked below it and liked again).
+            continue
+        reached.append((kind, threshold))
+    return reached
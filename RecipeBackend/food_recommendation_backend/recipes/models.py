@@ -193,13 +193,54 @@ class Notification(models.Model):
         blank=True,
         related_name='notifications'
     )
+    # The user whose action caused the notification (e.g. who liked), if any.
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='caused_notifications'
+    )
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Retracting a like finds its notification with one index lookup.
+            models.Index(fields=['user', 'type', 'related_recipe', 'actor'], name='notification_actor_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} notification for {self.user.username}"
 
+class PendingPushReceipt(models.Model):
+    """
+    An Expo push ticket whose delivery receipt hasn't been checked yet.
+    recipes.push records one per accepted message; the check_push_receipts
+    command reads the receipts and clears push tokens Expo reports as
+    DeviceNotRegistered.
+    """
+    ticket_id = models.CharField(max_length=64, primary_key=True)
+    push_token = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.ticket_id} -> {self.push_token}"
+
+class DataVersion(models.Model):
+    """
+    Change counter for derived data that every process keeps in memory (the
+    bitmap and suggestion indexes, pantry words, cached search pages) and for
+    the validators of conditional GETs on small lookup tables. It is bumped in
+    the same transaction as the change it covers, so the change is visible to
+    every process once it commits. See recipes/versions.py.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
 class APIMetadata(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     api_name = models.CharField(max_length=100)
@@ -251,6 +292,67 @@ class RecipeInteraction(models.Model):
     def __str__(self):
         return f"{self.user} - {self.recipe} - {'Liked' if self.liked else 'Not Liked'}"
 
+class RecipeStats(models.Model):
+    """
+    Denormalized engagement counters for a recipe, kept in step with
+    RecipeInteraction by recipes.stats.apply_stats_delta so reads are O(1).
+    `view_count` is the sum of RecipeInteraction.viewed_count.
+    Run the rebuild_recipe_stats command to reconcile after manual edits.
+    """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    like_count = models.PositiveIntegerField(default=0, db_index=True)
+    save_count = models.PositiveIntegerField(default=0, db_index=True)
+    view_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Recipe stats"
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.like_count} likes, {self.save_count} saves, {self.view_count} views"
+
+class RecipeNutrition(models.Model):
+    """
+    Per-serving amounts of the key nutrients, copied out of Recipe.nutrition
+    by recipes.nutrition so they can be range-filtered through an index.
+    A recipe without nutrition data has no row.
+    """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name="nutrition_facts")
+    calories = models.FloatField(null=True, blank=True, db_index=True, help_text="kcal per serving")
+    protein = models.FloatField(null=True, blank=True, db_index=True, help_text="Grams per serving")
+    fat = models.FloatField(null=True, blank=True, db_index=True, help_text="Grams per serving")
+    saturated_fat = models.FloatField(null=True, blank=True, db_index=True, help_text="Grams per serving")
+    carbohydrates = models.FloatField(null=True, blank=True, db_index=True, help_text="Grams per serving")
+    sugar = models.FloatField(null=True, blank=True, db_index=True, help_text="Grams per serving")
+    fiber = models.FloatField(null=True, blank=True, db_index=True, help_text="Grams per serving")
+    sodium = models.FloatField(null=True, blank=True, db_index=True, help_text="Milligrams per serving")
+
+    class Meta:
+        verbose_name_plural = "Recipe nutrition"
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.calories} kcal"
+
+class RecipeMilestone(models.Model):
+    """
+    A like/save count threshold a recipe has reached, recorded once by
+    recipes.milestones when a counter update crosses it.
+    """
+    KINDS = (
+        ('likes', 'Likes'),
+        ('saves', 'Saves'),
+    )
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name="milestones")
+    kind = models.CharField(max_length=10, choices=KINDS)
+    threshold = models.PositiveIntegerField()
+    reached_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('recipe', 'kind', 'threshold')
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.threshold} {self.kind}"
+
 class Recommendation(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recommendations")
@@ -0,0 +1,194 @@
+"""
+Background fan-out of broadcast notifications (milestones, admin broadcasts).
+
+Sending a notification to every user used to happen inside the request that
+triggered it, one INSERT and one Expo push per user. broadcast_notification()
+instead queues a job once the surrounding transaction commits and returns
+straight away; a daemon thread works through the queue:
+
+  • users are streamed in pk order, NOTIFICATION_FANOUT_CHUNK_SIZE at a time,
+  • each chunk's notifications go in with one bulk INSERT in a short
+    transaction of its own,
+  • the chunk's push messages are then handed to recipes.push, outside
+    any transaction.
+
+send_batch_notifications() runs the same chunked delivery synchronously.
+
+The queue is per process and held in memory; jobs still queued when the
+process exits are lost. Set NOTIFICATION_FANOUT_ASYNC to False to deliver
+inline (tests, management commands).
+"""
+import logging
+import queue
+import threading
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from exponent_server_sdk import PushMessage
+
+from .models import Notification, Recipe
+from .notification_stream import publish_notifications
+from .push import send_push_messages
+from .unread_counts import add_unread
+
+logger = logging.getLogger(__name__)
+
+# `user_ids` None means every user.
+FanoutJob = namedtuple('FanoutJob', 'title message notification_type recipe_id data user_ids')
+
+# Users notified, and push messages accepted by Expo.
+DeliverySummary = namedtuple('DeliverySummary', 'notified pushed')
+
+
+def iter_user_chunks(users, chunk_size):
+    """
+    Yield lists of (pk, push_token), chunk_size at a time. A queryset is
+    walked by primary key, so no chunk needs an OFFSET and nothing is
+    evaluated twice; any other iterable of users is consumed once.
+    """
+    if not isinstance(users, QuerySet):
+        users = iter(users)
+        while chunk := [(user.pk, getattr(user, 'push_token', None)) for user in islice(users, chunk_size)]:
+            yield chunk
+        return
+
+    users = users.order_by('pk').values_list('pk', 'push_token')
+    last_pk = None
+    while True:
+        page = users if last_pk is None else users.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1][0]
+
+
+def deliver_to_users(users, title, message, notification_type, recipe_id, data):
+    """
+    Create a notification for each of `users` (a queryset or iterable) and
+    push it to those with a push token, a chunk at a time: one bulk INSERT
+    in its own transaction, then the chunk's pushes outside it.
+    Returns a DeliverySummary.
+    """
+    related_recipe = None
+    if recipe_id is not None:
+        # Loaded once so streaming the notifications doesn't fetch it per row.
+        related_recipe = Recipe.objects.only('id', 'title', 'image', 'external_image').filter(pk=recipe_id).first()
+
+    notified = pushed = 0
+    for chunk in iter_user_chunks(users, getattr(settings, 'NOTIFICATION_FANOUT_CHUNK_SIZE', 500)):
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id,
+                    type=notification_type,
+                    title=title,
+                    message=message,
+                    related_recipe=related_recipe,
+                    data=data,
+                )
+                for user_id, _ in chunk
+            ])
+            # bulk_create sends no post_save.
+            add_unread(user_id for user_id, _ in chunk)
+            publish_notifications(notifications)
+        notified += len(chunk)
+
+        pushed += send_push_messages([
+            PushMessage(
+                to=push_token,
+                title=title,
+                body=message,
+                data=data,
+                sound="notification.wav",
+                priority="high",
+                channel_id="default"
+            )
+            for _, push_token in chunk if push_token
+        ]).sent
+    return DeliverySummary(notified=notified, pushed=pushed)
+
+
+def deliver(job):
+    """Deliver a queued FanoutJob. Returns a DeliverySummary."""
+    users = get_user_model().objects.all()
+    if job.user_ids is not None:
+        users = users.filter(pk__in=job.user_ids)
+    return deliver_to_users(users, job.title, job.message, job.notification_type, job.recipe_id, job.data)
+
+
+class NotificationFanout:
+    """Per-process job queue drained by a daemon thread."""
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def asynchronous(self):
+        return getattr(settings, 'NOTIFICATION_FANOUT_ASYNC', True)
+
+    def submit(self, job):
+        if not self.asynchronous:
+            deliver(job)
+            return
+        self._jobs.put(job)
+        self._ensure_worker()
+
+    def join(self):
+        """Block until every queued job has been delivered."""
+        self._jobs.join()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-fanout', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                summary = deliver(job)
+                logger.info(f"Fanned out '{job.title}' to {summary.notified} users ({summary.pushed} pushes)")
+            except Exception as e:
+                logger.error(f"Notification fan-out failed: {e}")
+            finally:
+                connection.close()
+                self._jobs.task_done()
+
+
+notification_fanout = NotificationFanout()
+
+
+def broadcast_notification(title, message, notification_type='system', related_recipe=None, data=None, user_ids=None):
+    """
+    Notify every user (or only `user_ids`) in the background, once the current
+    transaction commits. Never touches the users table on the caller's thread.
+    """
+    notification_data = {
+        'type': notification_type,
+        'timestamp': timezone.now().isoformat(),
+    }
+    if related_recipe:
+        notification_data['recipeId'] = str(related_recipe.id)
+    if data:
+        notification_data.update(data)
+
+    job = FanoutJob(
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        recipe_id=related_recipe.pk if related_recipe else None,
+        data=notification_data,
+        user_ids=list(user_ids) if user_ids is not None else None,
+    )
+    transaction.on_commit(lambda: notification_fanout.submit(job))
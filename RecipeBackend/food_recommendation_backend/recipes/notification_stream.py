@@ -0,0 +1,204 @@
+"""
+Pub/sub of newly created notifications for the live stream endpoint
+(api/streams.py).
+
+Each open stream subscribes to its user's channel with an asyncio queue on
+the event loop serving it, so an idle connection costs a queue and a
+suspended coroutine rather than a worker thread. Notifications are
+published once their transaction commits, from post_save (recipes/signals.py)
+and from the bulk fan-out path.
+
+The broker is chosen with NOTIFICATION_STREAM_BACKEND:
+
+  • recipes.notification_stream.InProcessBroker (default) only reaches
+    streams served by the process the notification was created in. Fine
+    for a single ASGI worker that also serves the API.
+  • recipes.notification_stream.RedisBroker relays every event through
+    Redis pub/sub (NOTIFICATION_STREAM_REDIS_URL), so any worker can
+    publish and every worker delivers to its own streams. Needs the
+    `redis` package.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+# Events a slow client may fall behind by before it is told to resync.
+MAX_QUEUED_EVENTS = 100
+
+
+class Subscription:
+    """One open stream: a bounded queue filled from any thread."""
+
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(MAX_QUEUED_EVENTS)
+        # Set when events had to be dropped; the client should refetch.
+        self.overflowed = False
+
+    def put_threadsafe(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Delivers events to the streams open in this process. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def has_subscribers(self, user_id):
+        """Whether publishing to `user_id` can reach anyone (saves building the event)."""
+        with self._lock:
+            return bool(self._subscriptions.get(str(user_id)))
+
+    def publish_many(self, events):
+        """Publish (user_id, event) pairs."""
+        for user_id, event in events:
+            self.deliver_local(user_id, event)
+
+    def deliver_local(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(str(user_id), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put_threadsafe(event)
+            except RuntimeError:
+                # Its event loop has closed; the stream is going away.
+                pass
+
+    def subscribe(self, user_id):
+        """Open a Subscription on the running event loop. Pair with unsubscribe()."""
+        subscription = Subscription(str(user_id), asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[subscription.user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Relays events through Redis so streams on every worker see them. Each
+    process runs one listener thread, started with its first subscriber.
+    """
+    CHANNEL_PREFIX = 'notifications:stream:'
+
+    def __init__(self):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisBroker requires the 'redis' package.")
+        url = getattr(settings, 'NOTIFICATION_STREAM_REDIS_URL', None)
+        if not url:
+            raise ImproperlyConfigured("Set NOTIFICATION_STREAM_REDIS_URL to use RedisBroker.")
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def has_subscribers(self, user_id):
+        # Subscribers may be on any worker.
+        return True
+
+    def publish_many(self, events):
+        pipeline = self._redis.pipeline(transaction=False)
+        for user_id, event in events:
+            pipeline.publish(f"{self.CHANNEL_PREFIX}{user_id}", json.dumps(event, cls=DjangoJSONEncoder))
+        pipeline.execute()
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='notification-stream', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+        try:
+            for message in pubsub.listen():
+                channel = message['channel'].decode()
+                try:
+                    self.deliver_local(channel[len(self.CHANNEL_PREFIX):], json.loads(message['data']))
+                except Exception as e:
+                    logger.error(f"Bad notification stream message on {channel}: {e}")
+        except Exception as e:
+            logger.error(f"Notification stream listener stopped: {e}")
+        finally:
+            pubsub.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(
+                    settings, 'NOTIFICATION_STREAM_BACKEND', 'recipes.notification_stream.InProcessBroker'
+                )
+                _broker = import_string(backend)()
+    return _broker
+
+
+def notification_event(notification):
+    """The stream payload of a notification: its API representation, JSON-ready."""
+    return json.loads(json.dumps(NotificationSerializer(notification).data, cls=DjangoJSONEncoder))
+
+
+def publish_notifications(notifications):
+    """Publish new notifications to their users' streams once the transaction commits."""
+    notifications = list(notifications)
+    if not notifications:
+        return
+
+    def publish():
+        broker = get_broker()
+        try:
+            broker.publish_many([
+                (notification.user_id, notification_event(notification))
+                for notification in notifications
+                if broker.has_subscribers(notification.user_id)
+            ])
+        except Exception as e:
+            logger.error(f"Failed to publish notifications to their streams: {e}")
+    transaction.on_commit(publish)
@@ -0,0 +1,88 @@
+"""
+Indexed per-serving nutrient columns extracted from Recipe.nutrition.
+
+Recipe.nutrition keeps the full Spoonacular nutrient list as JSON, which
+can't be filtered without parsing it for every row. The key nutrients are
+copied into RecipeNutrition, one indexed column each, so calorie and macro
+range filters are index range scans.
+
+Rows are kept in sync through the `recipes_changed` signal (see
+recipes/signals.py), so imports fill them once per batch. Run the
+rebuild_recipe_nutrition command after editing the JSON behind the ORM's back.
+"""
+from django.db import transaction
+
+from .models import Recipe, RecipeNutrition
+
+# RecipeNutrition field -> (Spoonacular nutrient name, unit stored).
+NUTRIENTS = {
+    'calories': ('calories', 'kcal'),
+    'protein': ('protein', 'g'),
+    'fat': ('fat', 'g'),
+    'saturated_fat': ('saturated fat', 'g'),
+    'carbohydrates': ('carbohydrates', 'g'),
+    'sugar': ('sugar', 'g'),
+    'fiber': ('fiber', 'g'),
+    'sodium': ('sodium', 'mg'),
+}
+
+# Keep each statement well under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+
+def extract_nutrients(nutrition):
+    """
+    Return {field: amount per serving} for the key nutrients found in a
+    Recipe.nutrition value. Entries in an unexpected unit are skipped rather
+    than guessed at.
+    """
+    if not isinstance(nutrition, dict):
+        return {}
+    by_name = {}
+    for nutrient in nutrition.get('nutrients') or []:
+        if isinstance(nutrient, dict) and isinstance(nutrient.get('name'), str):
+            by_name.setdefault(nutrient['name'].strip().lower(), nutrient)
+
+    values = {}
+    for field, (name, unit) in NUTRIENTS.items():
+        nutrient = by_name.get(name)
+        if nutrient is None or str(nutrient.get('unit', unit)).lower() != unit:
+            continue
+        try:
+            values[field] = float(nutrient['amount'])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return values
+
+
+def update_recipe_nutrition(recipe_ids):
+    """
+    Re-extract the nutrient columns of the given recipes. Recipes without
+    usable nutrition data lose their row; ids of deleted recipes are ignored.
+    """
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        ids = recipe_ids[start:start + CHUNK_SIZE]
+        rows = []
+        for recipe_id, nutrition in Recipe.objects.filter(id__in=ids).values_list('id', 'nutrition'):
+            values = extract_nutrients(nutrition)
+            if values:
+                rows.append(RecipeNutrition(recipe_id=recipe_id, **values))
+
+        with transaction.atomic():
+            RecipeNutrition.objects.filter(recipe_id__in=ids).exclude(
+                recipe_id__in=[row.recipe_id for row in rows]
+            ).delete()
+            RecipeNutrition.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['recipe'],
+                update_fields=list(NUTRIENTS),
+            )
+
+
+def rebuild_recipe_nutrition():
+    """Re-extract the nutrient columns of every recipe. Returns the recipe count."""
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    update_recipe_nutrition(recipe_ids)
+    return len(recipe_ids)
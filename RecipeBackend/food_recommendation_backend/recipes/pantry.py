@@ -0,0 +1,117 @@
+"""
+"Cook with what I have": rank recipes by how much of a pantry they use.
+
+Typed ingredient names are resolved to Ingredient ids through an in-memory
+word index, then recipes are scored on the bitmap index
+(recipes/bitmap_index.py), which holds one bitset per ingredient and
+bit-sliced per-recipe ingredient counts. Results come back fewest missing
+ingredients first, then most ingredients covered.
+
+The word index is per process and built lazily. Adding, renaming or deleting
+an Ingredient bumps its version in the database (recipes/versions.py) in the
+same transaction, and every process reloads the words on its next search.
+"""
+import re
+import threading
+from collections import namedtuple
+
+from .bitmap_index import bitmap_index
+from .models import Ingredient, RecipeIngredient
+from .versions import bump_version, get_version
+
+VERSION_NAME = 'ingredient-words'
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+PantryMatch = namedtuple('PantryMatch', 'recipe_id matched total missing')
+
+
+def _tokens(name):
+    return TOKEN_RE.findall((name or '').lower())
+
+
+def _token_forms(token):
+    """A token plus its naive singulars, so "tomatoes" and "tomato" meet."""
+    forms = {token}
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        forms.add(token[:-1])
+        if token.endswith('es'):
+            forms.add(token[:-2])
+    return forms
+
+
+class IngredientWords:
+    """Word index over Ingredient names. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._words = {}        # token form -> set of ingredient ids
+
+    def invalidate(self):
+        """Reload the words on the next search, here and in every other process."""
+        bump_version(VERSION_NAME)
+
+    def _ensure_current(self):
+        version = get_version(VERSION_NAME)
+        if version == self._version:
+            return
+        words = {}
+        for ingredient_id, name in Ingredient.objects.values_list('id', 'name'):
+            for token in _tokens(name):
+                for form in _token_forms(token):
+                    words.setdefault(form, set()).add(ingredient_id)
+        with self._lock:
+            self._words = words
+            self._version = version
+
+    def resolve(self, names):
+        """
+        Map typed ingredient names to ingredient ids. A name matches every
+        ingredient whose name contains all of its words ("oil" matches
+        "olive oil"; "olive oil" doesn't match "oil"), singular or plural.
+        Returns {name: set of ingredient ids}.
+        """
+        self._ensure_current()
+        resolved = {}
+        with self._lock:
+            for name in names:
+                ingredient_ids = None
+                for token in _tokens(name):
+                    matching = set()
+                    for form in _token_forms(token):
+                        matching |= self._words.get(form, set())
+                    ingredient_ids = matching if ingredient_ids is None else ingredient_ids & matching
+                resolved[name] = ingredient_ids or set()
+        return resolved
+
+
+ingredient_words = IngredientWords()
+
+
+def search_pantry(names, limit=20, max_missing=None, flags=None, terms=None, candidate_ids=None):
+    """
+    Rank recipes for a pantry given as ingredient names. `flags` and `terms`
+    narrow the recipes like the search filters do; `candidate_ids` (a set of
+    recipe ids) narrows them further. Returns (matches, unmatched_names),
+    where matches are PantryMatch tuples listing the missing ingredient names.
+    """
+    resolved = ingredient_words.resolve(names)
+    pantry = set().union(*resolved.values())
+    ranked = bitmap_index.pantry_matches(
+        pantry, flags=flags, terms=terms, candidate_ids=candidate_ids,
+        limit=limit, max_missing=max_missing
+    )
+
+    missing = {recipe_id: [] for recipe_id, _, _ in ranked}
+    rows = RecipeIngredient.objects.filter(recipe_id__in=missing).exclude(
+        ingredient_id__in=pantry
+    ).values_list('recipe_id', 'ingredient__name').order_by('ingredient__name').distinct()
+    for recipe_id, name in rows:
+        missing[recipe_id].append(name)
+
+    matches = [
+        PantryMatch(recipe_id, matched, total, missing[recipe_id])
+        for recipe_id, matched, total in ranked
+    ]
+    return matches, [name for name, ingredient_ids in resolved.items() if not ingredient_ids]
@@ -0,0 +1,253 @@
+"""
+Expo push delivery.
+
+Every push goes through push_delivery, which keeps one pooled HTTP session
+to the Expo push service per process:
+
+  • messages are sent with publish_multiple, PUSH_BATCH_SIZE per request,
+    and receipts read RECEIPT_BATCH_SIZE per request,
+  • several batches are sent concurrently on a bounded thread pool
+    (PUSH_MAX_WORKERS),
+  • a batch that fails with a network error, a timeout, a 5xx or a 429 is
+    retried with exponential backoff (PUSH_MAX_RETRIES, PUSH_RETRY_BACKOFF
+    seconds doubling each time); other errors would fail the same way again,
+    so they are not,
+  • tickets rejected with DeviceNotRegistered clear that push token right
+    away; accepted tickets are stored as PendingPushReceipt so the
+    check_push_receipts command can read their receipts later (Expo makes
+    them available after a few minutes) and clear tokens that turned out
+    to be unregistered.
+
+EXPO_PUSH_HOST points the client somewhere other than Expo, e.g. a local
+stand-in server in tests.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from exponent_server_sdk import PushClient, PushServerError, PushTicket
+from requests.adapters import HTTPAdapter
+
+from .models import PendingPushReceipt
+
+logger = logging.getLogger(__name__)
+
+# Expo accepts at most 100 messages, or 1000 receipt ids, per request.
+PUSH_BATCH_SIZE = 100
+RECEIPT_BATCH_SIZE = 1000
+
+# Expo keeps receipts for a day.
+RECEIPT_TTL = timedelta(days=1)
+
+# Expo asking us to slow down, or failing on its side.
+RETRYABLE_STATUS = 429
+
+# Messages Expo accepted, messages that failed, push tokens cleared as unregistered.
+PushResult = namedtuple('PushResult', 'sent failed unregistered')
+
+
+def is_retryable(error):
+    """Whether a failed Expo request may succeed if sent again."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, (requests.HTTPError, PushServerError)):
+        response = error.response
+        return response is not None and (response.status_code == RETRYABLE_STATUS or response.status_code >= 500)
+    return False
+
+
+def clear_push_tokens(tokens):
+    """Forget push tokens Expo no longer delivers to. Returns the number of users updated."""
+    if not tokens:
+        return 0
+    return get_user_model().objects.filter(push_token__in=set(tokens)).update(push_token=None)
+
+
+class PushDelivery:
+    """Pooled Expo client plus the worker pool that publishes batches. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor = None
+
+    # Read from settings on use so they can be overridden at runtime (and in tests).
+    @property
+    def host(self):
+        return getattr(settings, 'EXPO_PUSH_HOST', None) or PushClient.DEFAULT_HOST
+
+    @property
+    def max_workers(self):
+        return getattr(settings, 'PUSH_MAX_WORKERS', 4)
+
+    @property
+    def max_retries(self):
+        return getattr(settings, 'PUSH_MAX_RETRIES', 3)
+
+    @property
+    def backoff(self):
+        return getattr(settings, 'PUSH_RETRY_BACKOFF', 0.5)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'PUSH_TIMEOUT', 10)
+
+    def client(self):
+        """A PushClient on the shared session. Cheap: it only holds settings."""
+        return PushClient(host=self.host, session=self._get_session(), timeout=self.timeout)
+
+    def send(self, messages, retries=None):
+        """
+        Publish PushMessages and handle their tickets. Never raises for
+        delivery problems; they are logged and counted. Returns a PushResult.
+
+        `retries` overrides PUSH_MAX_RETRIES; pass 0 when a request is waiting
+        on the push and can't sit through the backoff.
+        """
+        messages = [message for message in messages if PushClient.is_exponent_push_token(message.to)]
+        if not messages:
+            return PushResult(sent=0, failed=0, unregistered=0)
+
+        batches = [messages[start:start + PUSH_BATCH_SIZE] for start in range(0, len(messages), PUSH_BATCH_SIZE)]
+        publish = partial(self._publish_batch, retries=self.max_retries if retries is None else retries)
+        if len(batches) == 1:
+            results = [publish(batches[0])]
+        else:
+            results = list(self._get_executor().map(publish, batches))
+
+        tickets = [ticket for batch_tickets in results if batch_tickets is not None for ticket in batch_tickets]
+        failed = sum(len(batch) for batch, batch_tickets in zip(batches, results) if batch_tickets is None)
+        return self._handle_tickets(tickets, failed)
+
+    def check_receipts(self, min_age=timedelta(minutes=15)):
+        """
+        Read the receipts of tickets at least `min_age` old, clear push tokens
+        reported as DeviceNotRegistered and drop the checked tickets.
+        Returns the number of tokens cleared.
+        """
+        now = timezone.now()
+        PendingPushReceipt.objects.filter(created_at__lt=now - RECEIPT_TTL).delete()
+        pending = dict(
+            PendingPushReceipt.objects.filter(created_at__lte=now - min_age).values_list('ticket_id', 'push_token')
+        )
+        if not pending:
+            return 0
+
+        ticket_ids = list(pending)
+        batches = [
+            ticket_ids[start:start + RECEIPT_BATCH_SIZE] for start in range(0, len(ticket_ids), RECEIPT_BATCH_SIZE)
+        ]
+        if len(batches) == 1:
+            results = [self._check_receipt_batch(batches[0])]
+        else:
+            results = list(self._get_executor().map(self._check_receipt_batch, batches))
+        receipts = [receipt for batch_receipts in results if batch_receipts is not None for receipt in batch_receipts]
+
+        unregistered = [
+            pending[receipt.id]
+            for receipt in receipts
+            if receipt.id in pending and self._is_unregistered(receipt)
+        ]
+        for receipt in receipts:
+            if not receipt.is_success() and not self._is_unregistered(receipt):
+                logger.warning(f"Push receipt {receipt.id} failed: {receipt.message}")
+
+        # Receipts Expo hasn't produced yet, and batches that failed, stay
+        # pending until the next pass.
+        PendingPushReceipt.objects.filter(ticket_id__in=[receipt.id for receipt in receipts]).delete()
+        return clear_push_tokens(unregistered)
+
+    def _publish_batch(self, batch, retries):
+        """Publish one batch with retries. Returns its tickets, or None if it failed for good."""
+        try:
+            return self._with_retries(retries, self.client().publish_multiple, batch)
+        except Exception as e:
+            logger.error(f"Push batch of {len(batch)} failed: {e}")
+            return None
+
+    def _check_receipt_batch(self, ticket_ids):
+        """Read one batch of receipts with retries. Returns them, or None if the batch failed for good."""
+        tickets = [
+            PushTicket(push_message=None, status=None, message='', details=None, id=ticket_id)
+            for ticket_id in ticket_ids
+        ]
+        try:
+            return self._with_retries(self.max_retries, self.client().check_receipts_multiple, tickets)
+        except Exception as e:
+            logger.error(f"Push receipt batch of {len(ticket_ids)} failed: {e}")
+            return None
+
+    def _with_retries(self, retries, call, *args):
+        for attempt in range(retries + 1):
+            try:
+                return call(*args)
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"Expo push request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _handle_tickets(self, tickets, failed):
+        sent = 0
+        unregistered = []
+        receipts = []
+        for ticket in tickets:
+            if ticket.is_success():
+                sent += 1
+                if ticket.id:
+                    receipts.append(PendingPushReceipt(ticket_id=ticket.id, push_token=ticket.push_message.to))
+            elif self._is_unregistered(ticket):
+                unregistered.append(ticket.push_message.to)
+                failed += 1
+            else:
+                logger.warning(f"Push to {ticket.push_message.to} rejected: {ticket.message}")
+                failed += 1
+
+        PendingPushReceipt.objects.bulk_create(receipts, ignore_conflicts=True)
+        cleared = clear_push_tokens(unregistered)
+        return PushResult(sent=sent, failed=failed, unregistered=cleared)
+
+    @staticmethod
+    def _is_unregistered(ticket):
+        return (ticket.details or {}).get('error') == PushTicket.ERROR_DEVICE_NOT_REGISTERED
+
+    def _get_session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.headers.update({
+                        'accept': 'application/json',
+                        'accept-encoding': 'gzip, deflate',
+                        'content-type': 'application/json',
+                    })
+                    # One pooled connection per publishing thread.
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers + 1)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='expo-push')
+        return self._executor
+
+
+push_delivery = PushDelivery()
+
+
+def send_push_messages(messages, retries=None):
+    """Publish PushMessages through the shared delivery pool. Returns a PushResult."""
+    return push_delivery.send(messages, retries)
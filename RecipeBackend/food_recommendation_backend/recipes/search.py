@@ -0,0 +1,166 @@
+"""
+Full-text search index over recipe title, summary and ingredient names.
+
+On SQLite the index is an FTS5 virtual table (rowid = recipe id) ranked with
+bm25(). On PostgreSQL it is a side table holding a weighted tsvector with a GIN
+index, ranked with ts_rank_cd(). Other backends fall back to icontains lookups.
+
+The tables are created by migration 0012 and kept in sync through the
+`recipes_changed` signal (see recipes/signals.py).
+"""
+import re
+
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import Recipe, RecipeIngredient
+
+FTS_TABLE = 'recipes_recipe_fts'
+PG_TABLE = 'recipes_recipe_search'
+
+# bm25() column weights for (title, summary, ingredients).
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+
+# Longer queries are truncated; nobody types more than this into a search box.
+MAX_QUERY_TERMS = 10
+
+# Keep each statement well under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _documents(recipe_ids):
+    """Return {recipe_id: (title, summary, ingredients)} for existing recipes."""
+    documents = {
+        pk: [title or '', strip_tags(description or ''), []]
+        for pk, title, description in Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', 'title', 'description')
+    }
+    rows = RecipeIngredient.objects.filter(recipe_id__in=documents.keys()).values_list(
+        'recipe_id', 'ingredient__name', 'ingredient__originalName'
+    )
+    for recipe_id, name, original_name in rows:
+        names = documents[recipe_id][2]
+        for value in (name, original_name):
+            if value and value not in names:
+                names.append(value)
+    return {
+        pk: (title, summary, ' '.join(names))
+        for pk, (title, summary, names) in documents.items()
+    }
+
+
+def update_search_index(recipe_ids):
+    """(Re)index the given recipes. Ids of deleted recipes are dropped from the index."""
+    vendor = connection.vendor
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+
+    for ids in _chunks(recipe_ids):
+        documents = _documents(ids)
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            if vendor == 'sqlite':
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids)
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, summary, ingredients) VALUES (%s, %s, %s, %s)",
+                    [(pk, *doc) for pk, doc in documents.items()]
+                )
+            else:
+                cursor.execute(f"DELETE FROM {PG_TABLE} WHERE recipe_id IN ({placeholders})", ids)
+                cursor.executemany(
+                    f"INSERT INTO {PG_TABLE} (recipe_id, document) VALUES (%s, "
+                    "setweight(to_tsvector('english', %s), 'A') || "
+                    "setweight(to_tsvector('english', %s), 'C') || "
+                    "setweight(to_tsvector('english', %s), 'B'))",
+                    [(pk, *doc) for pk, doc in documents.items()]
+                )
+
+
+def rebuild_search_index():
+    """Drop every indexed document and reindex the whole catalog. Returns the recipe count."""
+    vendor = connection.vendor
+    if vendor not in ('sqlite', 'postgresql'):
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE if vendor == 'sqlite' else PG_TABLE}")
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    update_search_index(recipe_ids)
+    return len(recipe_ids)
+
+
+def query_terms(text):
+    return TOKEN_RE.findall((text or '').lower())[:MAX_QUERY_TERMS]
+
+
+def _fts5_query(terms):
+    # Quote every term so user input can't inject FTS5 syntax, and treat the
+    # last one as a prefix because the app searches as the user types.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _tsquery(terms):
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+def search_recipes(queryset, text):
+    """
+    Restrict a Recipe queryset to full-text matches for `text` and annotate
+    each row with `search_rank` (higher is more relevant). Ordering is left
+    to the caller.
+    """
+    terms = query_terms(text)
+    if not terms:
+        return queryset
+
+    table = Recipe._meta.db_table
+    vendor = connection.vendor
+
+    if vendor == 'sqlite':
+        match = _fts5_query(terms)
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(search_rank=RawSQL(
+            # bm25() is "lower is better"; negate it so both backends sort the same way.
+            f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+            [match], output_field=FloatField()
+        ))
+
+    if vendor == 'postgresql':
+        tsquery = _tsquery(terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT recipe_id FROM {PG_TABLE} WHERE document @@ to_tsquery('english', %s)",
+                [tsquery]
+            )
+        ).annotate(search_rank=RawSQL(
+            f"SELECT ts_rank_cd(document, to_tsquery('english', %s)) FROM {PG_TABLE} "
+            f"WHERE recipe_id = {table}.id",
+            [tsquery], output_field=FloatField()
+        ))
+
+    # No full-text support on this backend: plain substring matching, unranked.
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term) | Q(description__icontains=term) |
+            Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient__originalName__icontains=term
+            ))
+        )
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -1,12 +1,14 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import Prefetch
 from .models import (
     Cuisine, DishType, Diet, Occasion, Tag, Ingredient,
     Recipe, RecipeIngredient, Favorite, Notification,
     APIMetadata, UserPreference, RecipeInteraction, Recommendation,
     Order, Payment
 )
+from .stats import get_recipe_stats
 
 User = get_user_model()
 
@@ -63,6 +65,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     
     def to_representation(self, instance):
         # Get the ingredient's representation using the IngredientSerializer.
+        # The ingredient is expected to be loaded with select_related('ingredient').
         ingredient_data = IngredientSerializer(instance.ingredient).data
         # Add the extra fields from RecipeIngredient.
         ingredient_data.update({
@@ -74,10 +77,75 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         return ingredient_data
 
 
+# ---------------------------
+# Sparse fieldsets
+# ---------------------------
+def _param_names(query_params, param):
+    value = query_params.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def defer_unused_columns(queryset, fields, keep=()):
+    """
+    Defer the model columns none of the serializer `fields` read, so the SQL
+    only selects what the response shows. `keep` names columns the caller
+    needs anyway, such as ordering keys.
+    """
+    used = {'id', 'updated_at', *keep}
+    for field in fields.values():
+        if field.source != '*':
+            used.add(field.source.split('.')[0])
+    unused = [
+        field.name for field in queryset.model._meta.concrete_fields
+        if field.name not in used and not field.primary_key
+    ]
+    return queryset.defer(*unused) if unused else queryset
+
+
+class SparseFieldsMixin:
+    """
+    Client-selectable field sets on read requests:
+
+      - ?fields=id,title keeps only the listed fields,
+      - ?expand=nutrition adds fields from Meta.expandable_fields, which are
+        left out unless asked for (by either parameter).
+
+    `id` is always kept and unknown names are ignored. Pass `self.fields`
+    to setup_eager_loading so unrequested fields cost no columns or queries.
+    """
+    fields_param = 'fields'
+    expand_param = 'expand'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_sparse = False
+        request = self.context.get('request')
+        query_params = {}
+        if request is not None and request.method in SAFE_METHODS:
+            query_params = getattr(request, 'query_params', request.GET)
+        requested = _param_names(query_params, self.fields_param)
+        expand = _param_names(query_params, self.expand_param) or set()
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        keep = set(self.fields) - expandable if requested is None else requested
+        keep |= (expand & expandable) | {'id'}
+
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+                # Leaving out an expandable field is the default shape, not a sparse one.
+                self.is_sparse = self.is_sparse or name not in expandable
+
+    def select_fields(self, data):
+        """Narrow an already serialized payload (e.g. a cached one) to the selected fields."""
+        return {name: value for name, value in data.items() if name in self.fields}
+
+
 # ---------------------------
 # Recipe Serializer
 # ---------------------------
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Nested many-to-many relationships (read-only) and write-only for updating
     cuisines = CuisineSerializer(many=True, read_only=True)
     dishTypes = DishTypeSerializer(many=True, read_only=True)
@@ -117,6 +185,9 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
     is_liked = serializers.SerializerMethodField()
     is_saved = serializers.SerializerMethodField()
 
+    # Per-request fields; everything else is public and cacheable (recipes.detail_cache).
+    LIVE_FIELDS = ('like_count', 'saved_count', 'is_liked', 'is_saved', 'total_view_count')
+
     class Meta:
         model = Recipe
         fields = (
@@ -140,15 +211,15 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('created_at', 'updated_at')
 
+    # Counters come from the denormalized RecipeStats row (select_related('stats')).
     def get_like_count(self, obj):
-        return obj.interactions.filter(liked=True).count()
+        return get_recipe_stats(obj).like_count
 
     def get_saved_count(self, obj):
-        return obj.interactions.filter(saved=True).count()
+        return get_recipe_stats(obj).save_count
     
     def get_total_view_count(self, obj):
-        total = obj.interactions.aggregate(total=Sum('viewed_count'))['total']
-        return total if total is not None else 0
+        return get_recipe_stats(obj).view_count
 
     def __init__(self, *args, **kwargs):
         super(RecipeDetailSerializer, self).__init__(*args, **kwargs)
@@ -158,23 +229,70 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
             self.fields.pop('is_liked', None)
             self.fields.pop('is_saved', None)
 
-    def get_is_liked(self, obj):
+    @staticmethod
+    def setup_eager_loading(queryset, user=None, fields=None):
+        """
+        Load everything this serializer touches in a fixed number of queries,
+        however many ingredients or tags the recipes have: one for the recipes
+        (with stats and owner joined in), one per taxonomy relation, one for the
+        ingredients and, for an authenticated user, one for their interactions.
+        Given the serializer's `fields`, only what those read is loaded.
+        """
+        if fields is not None:
+            queryset = defer_unused_columns(queryset, fields)
+        wanted = lambda *names: fields is None or any(name in fields for name in names)
+
+        if wanted('like_count', 'saved_count', 'total_view_count'):
+            queryset = queryset.select_related('stats')
+        if wanted('user'):
+            queryset = queryset.select_related('user')
+        queryset = queryset.prefetch_related(*[
+            name for name in ('cuisines', 'dishTypes', 'diets', 'occasions', 'tags') if wanted(name)
+        ])
+        if wanted('recipe_ingredients'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ))
+        if user is not None and user.is_authenticated and wanted('is_liked', 'is_saved'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'interactions',
+                queryset=RecipeInteraction.objects.filter(user=user),
+                to_attr='user_interactions'
+            ))
+        return queryset
+
+    def to_public_representation(self, instance):
+        """The payload without LIVE_FIELDS, safe to share between users."""
+        data = self.to_representation(instance)
+        for name in self.LIVE_FIELDS:
+            data.pop(name, None)
+        return data
+
+    def to_live_representation(self, instance):
+        """Only the LIVE_FIELDS that apply to this request, in payload order."""
+        return {
+            name: field.to_representation(field.get_attribute(instance))
+            for name, field in self.fields.items()
+            if name in self.LIVE_FIELDS
+        }
+
+    def get_user_interaction(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            # Check RecipeInteraction or any logic to determine if liked.
-            # Assuming you have a RecipeInteraction model where liked is stored:
-            interaction = obj.interactions.filter(user=request.user).first()
-            if interaction:
-                return interaction.liked
-        return False
+        if not (request and request.user.is_authenticated):
+            return None
+        if not hasattr(obj, 'user_interactions'):
+            # Not prefetched by setup_eager_loading: load it once for both fields.
+            obj.user_interactions = list(obj.interactions.filter(user=request.user)[:1])
+        return obj.user_interactions[0] if obj.user_interactions else None
+
+    def get_is_liked(self, obj):
+        interaction = self.get_user_interaction(obj)
+        return interaction.liked if interaction else False
 
     def get_is_saved(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            interaction = obj.interactions.filter(user=request.user).first()
-            if interaction:
-                return interaction.saved
-        return False
+        interaction = self.get_user_interaction(obj)
+        return interaction.saved if interaction else False
 
 
 # ---------------------------
@@ -253,9 +371,13 @@ class RecommendationSerializer(serializers.ModelSerializer):
         model = Recommendation
         fields = ('id', 'user', 'recipe', 'score', 'reason', 'created_at')
 
-class RecipeSearchSerializer(serializers.ModelSerializer):
+class RecipeSearchSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Many-to-many relationships: include nested read-only representations
     tags = TagSerializer(many=True, read_only=True)
+    cuisines = CuisineSerializer(many=True, read_only=True)
+    dishTypes = DishTypeSerializer(many=True, read_only=True)
+    diets = DietSerializer(many=True, read_only=True)
+    occasions = OccasionSerializer(many=True, read_only=True)
     
     # For user, show a read-only representation
     user = serializers.StringRelatedField(read_only=True)
@@ -267,9 +389,36 @@ class RecipeSearchSerializer(serializers.ModelSerializer):
             'external_image', 'healthScore',
             'imageType', 'tags',
             'created_by_user', 'user',
-            'created_at', 'updated_at'
+            'created_at', 'updated_at',
+            'description', 'cook_time', 'difficulty', 'servings', 'nutrition',
+            'vegetarian', 'vegan', 'glutenFree', 'dairyFree',
+            'cuisines', 'dishTypes', 'diets', 'occasions',
         )
         read_only_fields = ('created_at', 'updated_at')
+        # Only sent when asked for with ?expand= (or ?fields=).
+        expandable_fields = (
+            'description', 'cook_time', 'difficulty', 'servings', 'nutrition',
+            'vegetarian', 'vegan', 'glutenFree', 'dairyFree',
+            'cuisines', 'dishTypes', 'diets', 'occasions',
+        )
+
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, keep=()):
+        """
+        Load a page of cards in a fixed number of queries: the recipes with
+        their owner joined in, plus one per nested relation shown. Given the
+        serializer's `fields`, only the columns they read are selected (`keep`
+        as for defer_unused_columns). Keep this in step with the fields above
+        (api/tests.py counts the queries).
+        """
+        if fields is not None:
+            queryset = defer_unused_columns(queryset, fields, keep)
+        if fields is None or 'user' in fields:
+            queryset = queryset.select_related('user')
+        return queryset.prefetch_related(*[
+            name for name in ('tags', 'cuisines', 'dishTypes', 'diets', 'occasions')
+            if fields is None or name in fields
+        ])
 
 class OrderSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
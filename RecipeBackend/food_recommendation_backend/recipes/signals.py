@@ -0,0 +1,278 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .models import (
+    Recipe, RecipeIngredient, RecipeInteraction, Ingredient, Cuisine, DishType, Diet, Occasion, Tag, Notification
+)
+from . import search
+from .bitmap_index import bitmap_index
+from .pantry import ingredient_words
+from .suggest import suggest_index
+from .detail_cache import invalidate_detail_snapshots
+from .nutrition import update_recipe_nutrition
+from .stats import apply_stats_delta
+from .unread_counts import add_unread, invalidate_unread
+from .notification_stream import publish_notifications
+
+logger = logging.getLogger(__name__)
+
+# Keep each statement well under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+# Sent with `recipe_ids` (a set) whenever recipes are created, edited,
+# re-imported or deleted. Derived data (search index, caches) hangs off this.
+recipes_changed = Signal()
+
+_state = threading.local()
+
+
+@contextmanager
+def batch_recipe_changes():
+    """
+    Collect recipe changes made inside the block and send a single
+    `recipes_changed` signal when it exits. Used by bulk imports so derived
+    data is rebuilt once per recipe instead of once per row saved.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        # Nested batch: the outermost one sends the signal.
+        yield
+        return
+
+    _state.pending = set()
+    try:
+        yield
+        recipe_ids = _state.pending
+    finally:
+        _state.pending = None
+
+    if recipe_ids:
+        recipes_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+
+
+def notify_recipes_changed(recipe_ids):
+    """Send `recipes_changed` now, or queue the ids if a batch is open."""
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.update(recipe_ids)
+    else:
+        recipes_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_saved_or_deleted(sender, instance, **kwargs):
+    notify_recipes_changed([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_saved_or_deleted(sender, instance, **kwargs):
+    notify_recipes_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.cuisines.through)
+@receiver(m2m_changed, sender=Recipe.dishTypes.through)
+@receiver(m2m_changed, sender=Recipe.diets.through)
+@receiver(m2m_changed, sender=Recipe.occasions.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_taxonomy_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # recipe.cuisines.add(...) and friends.
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            notify_recipes_changed([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # cuisine.recipes.add(...): pk_set holds recipe ids.
+        notify_recipes_changed(pk_set)
+    elif action == 'pre_clear':
+        notify_recipes_changed(instance.recipes.values_list('pk', flat=True))
+
+
+# Fields of these rows that are copied into recipe payloads (detail
+# snapshots, search documents); changing one changes every recipe using the row.
+SHARED_TERM_FIELDS = {
+    Ingredient: ('aisle', 'name', 'nameClean', 'originalName'),
+    Cuisine: ('name',),
+    DishType: ('name',),
+    Diet: ('name',),
+    Occasion: ('name',),
+    Tag: ('name',),
+}
+
+
+@receiver(pre_save, sender=Ingredient)
+@receiver(pre_save, sender=Cuisine)
+@receiver(pre_save, sender=DishType)
+@receiver(pre_save, sender=Diet)
+@receiver(pre_save, sender=Occasion)
+@receiver(pre_save, sender=Tag)
+def shared_term_saving(sender, instance, **kwargs):
+    fields = SHARED_TERM_FIELDS[sender]
+    stored = None
+    if not instance._state.adding:
+        stored = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    if stored is None:
+        # A new row (or one written over an existing row by primary key).
+        instance._changed_fields = set(fields)
+    else:
+        # Imports save every ingredient they meet; only real edits touch recipes.
+        instance._changed_fields = {field for field in fields if stored[field] != getattr(instance, field)}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Cuisine)
+@receiver(post_save, sender=DishType)
+@receiver(post_save, sender=Diet)
+@receiver(post_save, sender=Occasion)
+@receiver(post_save, sender=Tag)
+def shared_term_saved(sender, instance, created, **kwargs):
+    if not created and instance._changed_fields:
+        notify_recipes_changed(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Cuisine)
+@receiver(pre_delete, sender=DishType)
+@receiver(pre_delete, sender=Diet)
+@receiver(pre_delete, sender=Occasion)
+@receiver(pre_delete, sender=Tag)
+def shared_term_deleting(sender, instance, **kwargs):
+    # The M2M rows go without an m2m_changed signal, so note the recipes now.
+    # (Deleting an Ingredient deletes its RecipeIngredient rows, which notify.)
+    instance._stale_recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Cuisine)
+@receiver(post_delete, sender=DishType)
+@receiver(post_delete, sender=Diet)
+@receiver(post_delete, sender=Occasion)
+@receiver(post_delete, sender=Tag)
+def shared_term_deleted(sender, instance, **kwargs):
+    notify_recipes_changed(getattr(instance, '_stale_recipe_ids', ()))
+
+
+@receiver(recipes_changed)
+def update_search_index(sender, recipe_ids, **kwargs):
+    search.update_search_index(recipe_ids)
+
+
+@receiver(recipes_changed)
+def update_nutrition_columns(sender, recipe_ids, **kwargs):
+    update_recipe_nutrition(recipe_ids)
+
+
+@receiver(recipes_changed)
+def touch_recipes(sender, recipe_ids, **kwargs):
+    # Ingredient, taxonomy and M2M edits change the recipe payload without
+    # saving the recipe; moving updated_at keeps its ETag and Last-Modified honest.
+    recipe_ids = list(recipe_ids)
+    now = timezone.now()
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        Recipe.objects.filter(pk__in=recipe_ids[start:start + CHUNK_SIZE]).update(updated_at=now)
+
+
+@receiver(recipes_changed)
+def drop_detail_snapshots(sender, recipe_ids, **kwargs):
+    invalidate_detail_snapshots(recipe_ids)
+
+
+@receiver(recipes_changed)
+def update_bitmap_index(sender, recipe_ids, **kwargs):
+    # Every process learns of the change through the version bumped with it;
+    # this one's in-memory copy is patched once the change is committed.
+    version = bitmap_index.bump_version()
+
+    def update():
+        try:
+            bitmap_index.update(recipe_ids, version)
+        except Exception as e:
+            logger.error(f"Failed to update the recipe bitmap index: {e}")
+            bitmap_index.invalidate()
+    transaction.on_commit(update)
+
+
+@receiver(recipes_changed)
+def update_suggest_index(sender, recipe_ids, **kwargs):
+    version = suggest_index.bump_version()
+
+    def update():
+        try:
+            suggest_index.update_recipes(recipe_ids, version)
+        except Exception as e:
+            logger.error(f"Failed to update the search suggestions: {e}")
+            suggest_index.invalidate()
+    transaction.on_commit(update)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Cuisine)
+@receiver(post_save, sender=DishType)
+@receiver(post_save, sender=Diet)
+@receiver(post_save, sender=Occasion)
+def suggestion_term_saved(sender, instance, **kwargs):
+    if 'name' in instance._changed_fields or 'nameClean' in instance._changed_fields:
+        version = suggest_index.bump_version()
+        transaction.on_commit(lambda: suggest_index.update_term(instance, version))
+
+
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Cuisine)
+@receiver(post_delete, sender=DishType)
+@receiver(post_delete, sender=Diet)
+@receiver(post_delete, sender=Occasion)
+def suggestion_term_deleted(sender, instance, **kwargs):
+    pk = instance.pk  # cleared on the instance once the delete completes
+    version = suggest_index.bump_version()
+    transaction.on_commit(lambda: suggest_index.remove_term(sender, pk, version))
+
+
+# Pantry search matches typed names against ingredient names in memory. The
+# version is bumped with the change, so every process reloads them once it commits.
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, **kwargs):
+    if 'name' in instance._changed_fields:
+        ingredient_words.invalidate()
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, **kwargs):
+    ingredient_words.invalidate()
+
+
+@receiver(post_delete, sender=RecipeInteraction)
+def recipe_interaction_deleted(sender, instance, **kwargs):
+    # Interactions vanish when a user or recipe is deleted; take them off the counters.
+    # The stats row is never created here, it may be going away with its recipe.
+    if instance.liked or instance.saved or instance.viewed_count:
+        apply_stats_delta(
+            instance.recipe_id,
+            likes=-int(instance.liked),
+            saves=-int(instance.saved),
+            views=-instance.viewed_count,
+            create=False,
+        )
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created:
+        if not instance.is_read:
+            add_unread([instance.user_id])
+        publish_notifications([instance])
+    else:
+        # An edit may have flipped is_read; recount rather than guess.
+        invalidate_unread([instance.user_id])
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        add_unread([instance.user_id], -1)
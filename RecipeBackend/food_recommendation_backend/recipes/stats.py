@@ -0,0 +1,109 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
+
+from .models import RecipeInteraction, RecipeStats
+
+# Keep each statement well under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+
+def get_recipe_stats(recipe):
+    """Return the recipe's RecipeStats, or an unsaved all-zero one if it has none yet."""
+    try:
+        return recipe.stats
+    except RecipeStats.DoesNotExist:
+        return RecipeStats(recipe_id=recipe.pk)
+
+
+COUNTER_FIELDS = ('like_count', 'save_count', 'view_count')
+
+
+def apply_stats_delta(recipe_id, likes=0, saves=0, views=0, create=True):
+    """
+    Atomically add the given deltas to a recipe's counters with a single
+    UPDATE ... SET x = x + n, creating the row on first use unless `create`
+    is False. Counters never go below zero.
+
+    Returns (before, after) RecipeStats snapshots so callers can react to the
+    transition (e.g. a like count crossing a milestone). The row is locked
+    and read before the UPDATE, inside the same transaction, so concurrent
+    callers each see their own distinct transition, and `before` holds the
+    real previous values even when a decrement was clamped at zero.
+    """
+    deltas = dict(zip(COUNTER_FIELDS, (likes, saves, views)))
+    values = {}
+    for field, delta in deltas.items():
+        if delta > 0:
+            values[field] = F(field) + delta
+        elif delta < 0:
+            # Never go below zero, even if the counters have drifted.
+            values[field] = Greatest(F(field) + delta, 0)
+
+    with transaction.atomic():
+        stats = RecipeStats.objects.select_for_update()
+        before = stats.filter(recipe_id=recipe_id).first()
+        if before is None and values and create:
+            try:
+                with transaction.atomic():
+                    after = RecipeStats.objects.create(
+                        recipe_id=recipe_id, **{field: max(delta, 0) for field, delta in deltas.items()}
+                    )
+                return RecipeStats(recipe_id=recipe_id), after
+            except IntegrityError:
+                # Someone else created the row first; apply on top of theirs.
+                before = stats.filter(recipe_id=recipe_id).first()
+        if before is None:
+            before = RecipeStats(recipe_id=recipe_id)
+            return before, before
+
+        if values:
+            RecipeStats.objects.filter(recipe_id=recipe_id).update(**values)
+
+    after = RecipeStats(recipe_id=recipe_id, **{
+        field: max(getattr(before, field) + delta, 0) for field, delta in deltas.items()
+    })
+    return before, after
+
+
+def rebuild_recipe_stats(recipe_ids=None):
+    """
+    Recompute counters from RecipeInteraction for the given recipes (all
+    recipes with interactions or stats when None). Returns the number of rows written.
+    """
+    interactions = RecipeInteraction.objects.all()
+    stats = RecipeStats.objects.all()
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        interactions = interactions.filter(recipe_id__in=recipe_ids)
+        stats = stats.filter(recipe_id__in=recipe_ids)
+
+    totals = interactions.values('recipe_id').annotate(
+        likes=Count('id', filter=Q(liked=True)),
+        saves=Count('id', filter=Q(saved=True)),
+        views=Sum('viewed_count'),
+    ).order_by()
+
+    rows = [
+        RecipeStats(
+            recipe_id=row['recipe_id'],
+            like_count=row['likes'],
+            save_count=row['saves'],
+            view_count=row['views'] or 0,
+        )
+        for row in totals
+    ]
+
+    with transaction.atomic():
+        # Recipes that lost all their interactions go back to zero.
+        stats.exclude(recipe_id__in=interactions.values('recipe_id')).update(
+            like_count=0, save_count=0, view_count=0
+        )
+        for start in range(0, len(rows), CHUNK_SIZE):
+            RecipeStats.objects.bulk_create(
+                rows[start:start + CHUNK_SIZE],
+                update_conflicts=True,
+                unique_fields=['recipe'],
+                update_fields=['like_count', 'save_count', 'view_count'],
+            )
+    return len(rows)
@@ -0,0 +1,382 @@
+"""
+Typo-tolerant autocomplete over recipe titles, ingredient names and the
+taxonomy tables (cuisines, dish types, diets, occasions).
+
+Every suggestion is split into words. A sorted word list answers prefix
+lookups with bisect, and a trigram index over the same words finds
+near-misses, which are then checked with a bounded Damerau-Levenshtein
+distance: one typo is tolerated in words of 4-6 letters, two from 7 letters
+on, never in the first letter. All words of the query must match (the last
+one as a prefix), and suggestions rank by typos, then whether the text
+starts with the query, then popularity.
+
+Like the bitmap index (recipes/bitmap_index.py) the structure is per
+process, built lazily on first use and versioned in the database
+(recipes/versions.py): `recipes_changed` and the Ingredient / taxonomy save
+and delete signals (see recipes/signals.py) bump the version inside the
+change's transaction and update this copy after it commits, and every query
+rebuilds it when the version shows another process changed the data.
+"""
+import bisect
+import heapq
+import re
+import threading
+from collections import Counter, namedtuple
+
+from django.db.models import Count
+
+from .models import Recipe, Ingredient, Cuisine, DishType, Diet, Occasion
+from .versions import bump_version, get_version
+
+VERSION_NAME = 'recipe-suggest-index'
+
+# Suggestion type for each model.
+KINDS = {
+    Recipe: 'recipe',
+    Ingredient: 'ingredient',
+    Cuisine: 'cuisine',
+    DishType: 'dishType',
+    Diet: 'diet',
+    Occasion: 'occasion',
+}
+TAXONOMY_MODELS = (Cuisine, DishType, Diet, Occasion)
+
+# Nobody types more than this into a search box.
+MAX_QUERY_WORDS = 6
+
+# Keep each statement well under SQLite's bound-parameter limit.
+CHUNK_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+Entry = namedtuple('Entry', 'text words weight')
+
+
+def _tokens(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _max_typos(word):
+    if len(word) >= 7:
+        return 2
+    if len(word) >= 4:
+        return 1
+    return 0
+
+
+def _trigrams(word, prefix=False):
+    # Words are padded so their first letters carry weight; a prefix has no
+    # end, so it gets no trailing pad.
+    padded = f'  {word}' if prefix else f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _one_typo(token, word, prefix=False):
+    """
+    Whether `token` is one substitution, insertion, deletion or adjacent
+    transposition away from `word` (or, with `prefix`, from a prefix of it).
+    Linear, unlike _distance().
+    """
+    n = len(token)
+    i = 0
+    while i < n and i < len(word) and token[i] == word[i]:
+        i += 1
+    if i == n:
+        # Equal, or token is a prefix of word: one deletion away at most.
+        return prefix or len(word) - n <= 1
+    # Substitution, extra letter in token, missing letter in token, transposition.
+    swapped = word[i + 1:i + 2] + word[i:i + 1]
+    if prefix:
+        return (
+            token[i + 1:] == word[i + 1:n] or
+            token[i + 1:] == word[i:n - 1] or
+            token[i:] == word[i + 1:n + 1] or
+            (token[i:i + 2] == swapped and token[i + 2:] == word[i + 2:n])
+        )
+    return (
+        token[i + 1:] == word[i + 1:] or
+        token[i + 1:] == word[i:] or
+        token[i:] == word[i + 1:] or
+        (token[i:i + 2] == swapped and token[i + 2:] == word[i + 2:])
+    )
+
+
+def _distance(token, word, max_distance, prefix=False):
+    """
+    Optimal string alignment distance between `token` and `word` (or, with
+    `prefix`, the closest prefix of `word`), or max_distance + 1 if it is
+    larger than max_distance.
+    """
+    if max_distance == 1:
+        if token == word or (prefix and word.startswith(token)):
+            return 0
+        return 1 if _one_typo(token, word, prefix) else 2
+    if prefix:
+        word = word[:len(token) + max_distance]
+    elif abs(len(word) - len(token)) > max_distance:
+        return max_distance + 1
+
+    before, previous = None, list(range(len(word) + 1))
+    for i, a in enumerate(token, 1):
+        current = [i] + [0] * len(word)
+        for j, b in enumerate(word, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b))
+            if i > 1 and j > 1 and a == word[j - 2] and token[i - 2] == b:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+
+    if prefix:
+        distance = min(previous[max(len(token) - max_distance, 0):])
+    else:
+        distance = previous[-1]
+    return min(distance, max_distance + 1)
+
+
+class SuggestIndex:
+    """Prefix and trigram index over suggestion words. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}      # (kind, id) -> Entry
+        self._words = []        # sorted distinct words
+        self._postings = {}     # word -> set of (kind, id)
+        self._trigrams = {}     # trigram -> set of words
+
+    # --- maintenance ---
+
+    def rebuild(self):
+        """Reload every suggestion from the database. Returns the number of suggestions."""
+        # Read before loading, as in the bitmap index: a change committed
+        # meanwhile leaves this copy behind, to be rebuilt again.
+        version = get_version(VERSION_NAME)
+        entries = self._load_recipes()
+        ingredients = Ingredient.objects.annotate(
+            recipe_count=Count('recipe_ingredients')
+        ).values_list('id', 'name', 'nameClean', 'recipe_count')
+        for pk, name, name_clean, recipe_count in ingredients:
+            entries[(KINDS[Ingredient], pk)] = (name, name_clean, recipe_count)
+        for model in TAXONOMY_MODELS:
+            terms = model.objects.annotate(recipe_count=Count('recipes')).values_list('id', 'name', 'recipe_count')
+            for pk, name, recipe_count in terms:
+                entries[(KINDS[model], pk)] = (name, None, recipe_count)
+
+        with self._lock:
+            self._reset()
+            for key, (text, extra, weight) in entries.items():
+                self._add(key, text, extra, weight, sort=False)
+            self._words.sort()
+            self._version = version
+            return len(self._entries)
+
+    def bump_version(self):
+        """
+        Record a change to the suggestions in the current transaction.
+        Returns the new version, to hand to the update methods once it commits.
+        """
+        return bump_version(VERSION_NAME)
+
+    def update_recipes(self, recipe_ids, version):
+        """Re-read the titles of the given recipes. Ids of deleted recipes are dropped."""
+        with self._lock:
+            if not self._follows(version):
+                return
+            recipe_ids = set(recipe_ids)
+            loaded = self._load_recipes(recipe_ids)
+            for pk in recipe_ids:
+                key = (KINDS[Recipe], pk)
+                self._remove(key)
+                if key in loaded:
+                    self._add(key, *loaded[key])
+            self._version = version
+
+    def update_term(self, instance, version):
+        """Add or refresh an Ingredient or taxonomy row."""
+        key = (KINDS[type(instance)], instance.pk)
+        with self._lock:
+            if not self._follows(version):
+                return
+            # Popularity is only recomputed on rebuilds.
+            weight = self._entries[key].weight if key in self._entries else 0
+            self._remove(key)
+            self._add(key, instance.name, getattr(instance, 'nameClean', None), weight)
+            self._version = version
+
+    def remove_term(self, model, pk, version):
+        with self._lock:
+            if not self._follows(version):
+                return
+            self._remove((KINDS[model], pk))
+            self._version = version
+
+    def invalidate(self):
+        """Force a full rebuild on the next query, here and in every other process."""
+        bump_version(VERSION_NAME)
+        with self._lock:
+            self._version = None
+
+    @staticmethod
+    def _load_recipes(recipe_ids=None):
+        """Return {(kind, id): (title, None, weight)}."""
+        if recipe_ids is None:
+            batches = [Recipe.objects.all()]
+        else:
+            recipe_ids = list(recipe_ids)
+            batches = [
+                Recipe.objects.filter(id__in=recipe_ids[start:start + CHUNK_SIZE])
+                for start in range(0, len(recipe_ids), CHUNK_SIZE)
+            ]
+        return {
+            (KINDS[Recipe], pk): (title, None, likes or 0)
+            for recipes in batches
+            for pk, title, likes in recipes.values_list('id', 'title', 'aggregateLikes')
+        }
+
+    def _follows(self, version):
+        # Caller holds the lock. Whether the commit that moved the index to
+        # `version` can be applied to this copy.
+        if self._version is None or self._version == version:
+            # Never built (the first query will load everything anyway),
+            # or already rebuilt from the committed data.
+            return False
+        if self._version != version - 1:
+            # Changed in another commit too; rebuild on the next query.
+            self._version = None
+            return False
+        return True
+
+    def _add(self, key, text, extra=None, weight=0, sort=True):
+        # Caller holds the lock.
+        words = set(_tokens(text)) | set(_tokens(extra))
+        if not words:
+            return
+        self._entries[key] = Entry(text, frozenset(words), weight)
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                if sort:
+                    bisect.insort(self._words, word)
+                else:
+                    self._words.append(word)
+                for gram in _trigrams(word):
+                    self._trigrams.setdefault(gram, set()).add(word)
+            postings.add(key)
+
+    def _remove(self, key):
+        # Caller holds the lock.
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for word in entry.words:
+            postings = self._postings[word]
+            postings.discard(key)
+            if postings:
+                continue
+            del self._postings[word]
+            index = bisect.bisect_left(self._words, word)
+            del self._words[index]
+            for gram in _trigrams(word):
+                self._trigrams[gram].discard(word)
+                if not self._trigrams[gram]:
+                    del self._trigrams[gram]
+
+    def _ensure_current(self):
+        if get_version(VERSION_NAME) != self._version:
+            self.rebuild()
+
+    # --- queries ---
+
+    def _match_word(self, token, prefix, max_typos):
+        """Return {word: typos} for index words within `max_typos` of `token`."""
+        matches = {}
+        if prefix:
+            start = bisect.bisect_left(self._words, token)
+            end = bisect.bisect_left(self._words, token + '\U0010ffff')
+            matches.update((word, 0) for word in self._words[start:end])
+        elif token in self._postings:
+            matches[token] = 0
+        if not max_typos:
+            return matches
+
+        # Candidates must keep the first letter. Beyond that, every typo
+        # destroys at most four trigrams (a transposition), so a word sharing
+        # fewer can't be close enough.
+        grams = _trigrams(token, prefix)
+        needed = len(grams) - 4 * max_typos
+        if needed > 0:
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._trigrams.get(gram, ()))
+            candidates = [word for word, count in shared.items() if count >= needed and word[0] == token[0]]
+        else:
+            start = bisect.bisect_left(self._words, token[0])
+            end = bisect.bisect_left(self._words, token[0] + '\U0010ffff')
+            candidates = self._words[start:end]
+
+        for word in candidates:
+            if word not in matches:
+                typos = _distance(token, word, max_typos, prefix)
+                if typos <= max_typos:
+                    matches[word] = typos
+        return matches
+
+    def _lookup(self, tokens, allowed_typos):
+        """Return {(kind, id): typos} for entries matching every token within `allowed_typos` in total."""
+        typos = None
+        for position, token in enumerate(tokens):
+            # Words before the last one are complete; the last is still being typed.
+            prefix = position == len(tokens) - 1
+            token_typos = {}
+            for word, word_typos in self._match_word(token, prefix, min(allowed_typos, _max_typos(token))).items():
+                for key in self._postings[word]:
+                    if word_typos < token_typos.get(key, word_typos + 1):
+                        token_typos[key] = word_typos
+            if typos is None:
+                typos = token_typos
+            else:
+                typos = {key: typos[key] + count for key, count in token_typos.items() if key in typos}
+            typos = {key: count for key, count in typos.items() if count <= allowed_typos}
+            if not typos:
+                break
+        return typos
+
+    def suggest(self, query, limit=8):
+        """
+        Return up to `limit` suggestions for `query` as
+        [{'text', 'type', 'id', 'typos'}], best first.
+        """
+        tokens = _tokens(query)[:MAX_QUERY_WORDS]
+        if not tokens or len(''.join(tokens)) < 2:
+            return []
+        self._ensure_current()
+
+        with self._lock:
+            # Fewer typos always rank first, so only look further out while
+            # the closer matches don't fill the page.
+            for allowed_typos in range(sum(_max_typos(token) for token in tokens) + 1):
+                typos = self._lookup(tokens, allowed_typos)
+                if len(typos) >= limit:
+                    break
+
+            text = ' '.join(tokens)
+            entries = self._entries
+            best = heapq.nsmallest(limit, typos.items(), key=lambda item: (
+                item[1],
+                not entries[item[0]].text.lower().startswith(text),
+                -entries[item[0]].weight,
+                len(entries[item[0]].text),
+            ))
+            return [
+                {'text': entries[key].text, 'type': key[0], 'id': key[1], 'typos': count}
+                for key, count in best
+            ]
+
+
+suggest_index = SuggestIndex()
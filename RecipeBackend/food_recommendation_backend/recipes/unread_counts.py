@@ -0,0 +1,87 @@
+"""
+Per-user unread notification counters kept in the cache.
+
+The badge count is read on every app poll, so it is served from a cache
+entry per user instead of a COUNT over the user's notifications. The entry
+is filled from the database on a miss and then adjusted in place:
+
+  • a new unread notification increments it (post_save in
+    recipes/signals.py; the bulk fan-out path calls add_unread directly),
+  • deleting an unread one decrements it (post_delete),
+  • marking one read decrements it, marking all read sets it to 0,
+  • any other edit of a notification drops the entry so it is recounted.
+
+Adjustments are applied once the surrounding transaction commits. An
+increment or decrement that finds no entry is skipped; the next read
+recounts. A read that fills the entry counts again after storing it, so an
+adjustment skipped between its count and the store isn't kept.
+
+Entries expire after UNREAD_COUNT_TIMEOUT seconds (a minute by default), so
+a counter that drifted heals quickly. That matters with a per-process cache
+backend, where adjustments only reach the process that made them; use a
+shared backend (CACHE_URL) when running more than one worker.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+
+def _timeout():
+    return getattr(settings, 'UNREAD_COUNT_TIMEOUT', 60)
+
+
+def unread_count_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def get_unread_count(user_id):
+    """The user's unread notification count; a cache hit costs no query."""
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        unread = Notification.objects.filter(user_id=user_id, is_read=False)
+        count = unread.count()
+        if cache.add(key, count, _timeout()):
+            # A change committed after the count found no entry to adjust.
+            recount = unread.count()
+            if recount != count:
+                cache.delete(key)
+                count = recount
+    return max(count, 0)
+
+
+def _apply(deltas):
+    for user_id, delta in deltas.items():
+        try:
+            if delta > 0:
+                cache.incr(unread_count_key(user_id), delta)
+            elif delta < 0:
+                cache.decr(unread_count_key(user_id), -delta)
+        except ValueError:
+            # Not cached: the next read counts from the database.
+            pass
+
+
+def add_unread(user_ids, delta=1):
+    """Adjust the cached counts of `user_ids` by `delta` each once the transaction commits."""
+    deltas = Counter()
+    for user_id in user_ids:
+        deltas[user_id] += delta
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def reset_unread(user_id, count=0):
+    """Set the user's cached count (mark all read) once the transaction commits."""
+    transaction.on_commit(lambda: cache.set(unread_count_key(user_id), count, _timeout()))
+
+
+def invalidate_unread(user_ids):
+    """Drop cached counts so they are recounted on the next read."""
+    keys = [unread_count_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,12 +1,13 @@
-from recipes.models import Notification, RecipeInteraction, User
+from recipes.models import Notification
 from django.utils import timezone
-from exponent_server_sdk import PushClient, PushMessage, PushServerError
-from django.db import transaction
+from exponent_server_sdk import PushMessage
+from recipes.notification_fanout import DeliverySummary, deliver_to_users
+from recipes.push import send_push_messages
 import logging
 
 logger = logging.getLogger(__name__)
 
-def send_notification(user, title, message, notification_type='system', related_recipe=None, data=None):
+def send_notification(user, title, message, notification_type='system', related_recipe=None, data=None, actor=None):
     """
     Send both in-app and push notification to a user.
     
@@ -17,6 +18,7 @@ def send_notification(user, title, message, notification_type='system', related_
         notification_type: One of ('like', 'save', 'follow', 'system', 'local')
         related_recipe: Optional Recipe object
         data: Optional additional data to send with push notification
+        actor: Optional user whose action caused the notification
     """
     try:
         # Create in-app notification
@@ -26,6 +28,7 @@ def send_notification(user, title, message, notification_type='system', related_
             title=title,
             message=message,
             related_recipe=related_recipe,
+            actor=actor,
             data=data or {}
         )
 
@@ -49,9 +52,10 @@ def send_notification(user, title, message, notification_type='system', related_
                 channel_id="default"
             )
             
-            push_client = PushClient()
-            response = push_client.publish(push_message)
-            logger.info(f"Push notification sent to {user.username}: {response}")
+            # Sent while the request waits (a like, a sign-up): one attempt,
+            # no backoff. Bulk sends go through the background fan-out.
+            result = send_push_messages([push_message], retries=0)
+            logger.info(f"Push notification sent to {user.username}: {result}")
             
             return notification
             
@@ -62,6 +66,12 @@ def send_notification(user, title, message, notification_type='system', related_
 def send_batch_notifications(users, title, message, notification_type='system', related_recipe=None, data=None):
     """
 Send notifications to multiple users efficiently.
+
+    Users are streamed in chunks: each chunk's notifications are bulk
+    created in a short transaction of their own, then its pushes are sent
+    in batches outside it. For everyone, prefer
+    recipes.notification_fanout.broadcast_notification, which does this in
+    the background.
     
     Args:
         users: Queryset or list of User objects
@@ -70,9 +80,11 @@ Send notifications to multiple users efficiently.
         notification_type: Notification type
         related_recipe: Optional Recipe object
         data: Optional additional data
+
+    Returns:
+        DeliverySummary(notified, pushed). On error it is logged and an empty
+        summary returned; chunks already written are kept.
 """
-    notifications = []
-    
     try:
         # Create base notification data
         base_notification_data = {
@@ -84,63 +96,15 @@ Send notifications to multiple users efficiently.
         if data:
             base_notification_data.update(data)
 
-        # Create notifications for each specified user
-        with transaction.atomic():
-            # Bulk create notifications
-            notifications = [
-                Notification.objects.create(
-                    user=user,
-                    title=title,
-                    message=message,
-                    type=notification_type,
-                    related_recipe=related_recipe,
-                    data=base_notification_data
-                ) for user in users
-            ]
-
-            # Send push notifications
-            push_client = PushClient()
-            for user in users:
-                if hasattr(user, 'push_token') and user.push_token:
-                    try:
-                        push_message = PushMessage(
-                            to=user.push_token,
-                            title=title,
-                            body=message,
-                            data=base_notification_data,
-                            sound="notification.wav",
-                            priority="high",
-                            channel_id="default"
-
-                        )
-                        push_client.publish(push_message)
-                    except Exception as e:
-                        logger.error(f"Push notification failed for user {user.id}: {str(e)}")
-                        continue
-
-        return notifications
+        return deliver_to_users(
+            users,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            recipe_id=related_recipe.pk if related_recipe else None,
+            data=base_notification_data,
+        )
 
     except Exception as e:
         logger.error(f"Batch notification error: {str(e)}")
-        return []
-
-def check_recipe_milestone(recipe):
-    """
-    Check and handle recipe milestones for likes/saves
-    Returns tuple: (milestone_reached: bool, milestone_type: str, count: int)
-    """
-    MILESTONES = [10, 100, 500, 1000]
-    
-    likes_count = RecipeInteraction.objects.filter(recipe=recipe, liked=True).count()
-    saves_count = RecipeInteraction.objects.filter(recipe=recipe, saved=True).count()
-    
-    for milestone in MILESTONES:
-        # Check if likes just crossed a milestone
-        if likes_count == milestone:
-            return True, 'likes', milestone
-            
-        # Check if saves just crossed a milestone    
-        if saves_count == milestone:
-            return True, 'saves', milestone
-            
-    return False, None, 0
\ No newline at end of file
+        return DeliverySummary(notified=0, pushed=0)
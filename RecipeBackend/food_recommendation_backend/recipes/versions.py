@@ -0,0 +1,51 @@
+"""
+Database-backed change counters for data each process derives and keeps in
+memory: the bitmap index (recipes/bitmap_index.py), the suggestion index
+(recipes/suggest.py), the pantry word index (recipes/pantry.py) and the
+search result cache (api/result_cache.py), plus the ETag / Last-Modified
+stamps of small lookup tables (api/conditional.py).
+
+A process remembers the version its copy was built from. Writers bump the
+version inside the transaction that changes the underlying rows, so once
+that commits every process (web workers, import_recipes, the shell) reads
+the new version and knows its copy is stale, whatever cache backend is
+configured. Checking costs a primary-key lookup.
+
+While the transaction that bumped it is open the row stays locked, so
+concurrent bumps are serialized: a bump that returns `n` moved the version
+from `n - 1`, which lets a process that holds `n - 1` apply the change
+incrementally instead of rebuilding.
+"""
+import secrets
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DataVersion
+
+
+def get_version(name):
+    """The committed version of `name` (0 if it was never bumped)."""
+    return DataVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+def get_version_stamp(name):
+    """(version, time of the last bump) of `name`; (0, None) if it was never bumped."""
+    return DataVersion.objects.filter(name=name).values_list('version', 'updated_at').first() or (0, None)
+
+
+def bump_version(name):
+    """Move `name` to a new version as part of the current transaction. Returns it."""
+    with transaction.atomic():
+        bumped = DataVersion.objects.filter(name=name)
+        if not bumped.update(version=F('version') + 1, updated_at=timezone.now()):
+            try:
+                with transaction.atomic():
+                    # Start at a random value, so a row that is recreated (say,
+                    # after restoring a backup) can't repeat a version some
+                    # process still holds.
+                    return DataVersion.objects.create(name=name, version=secrets.randbits(48)).version
+            except IntegrityError:
+                bumped.update(version=F('version') + 1, updated_at=timezone.now())
+        return get_version(name)
@@ -0,0 +1,193 @@
+"""
+Write-behind buffering of recipe views.
+
+Recording a view only touches an in-memory dict; a background thread flushes
+the buffer to RecipeInteraction in bulk every RECIPE_VIEW_FLUSH_INTERVAL
+seconds, or sooner once RECIPE_VIEW_FLUSH_SIZE distinct (user, recipe) pairs
+are waiting. Repeat views of the same recipe by the same user inside one
+window are coalesced into a single row update. The buffer is per process.
+
+The flush applies the same rules the detail view used to apply inline:
+  • a new interaction starts with viewed_count=1,
+  • last_viewed is always moved forward,
+  • viewed_count is incremented at most once a week.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import RecipeInteraction
+from .stats import apply_stats_delta
+
+logger = logging.getLogger(__name__)
+
+VIEW_COUNT_PERIOD = timedelta(weeks=1)
+
+# (user, recipe) pairs written per statement batch.
+CHUNK_SIZE = 250
+
+
+def write_views(views):
+    """
+    Persist {(user_id, recipe_id): viewed_at} to RecipeInteraction and the
+    RecipeStats view counters. Returns the number of views that were counted.
+    """
+    keys = list(views)
+    view_deltas = Counter()
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = {key: views[key] for key in keys[start:start + CHUNK_SIZE]}
+        with transaction.atomic():
+            _write_chunk(chunk, view_deltas)
+            for recipe_id, delta in view_deltas.items():
+                apply_stats_delta(recipe_id, views=delta)
+        view_deltas.clear()
+    return len(keys)
+
+
+def _fetch_interactions(keys):
+    return {
+        (interaction.user_id, interaction.recipe_id): interaction
+        for interaction in RecipeInteraction.objects.filter(
+            user_id__in={user_id for user_id, _ in keys},
+            recipe_id__in={recipe_id for _, recipe_id in keys},
+        ).only('id', 'user_id', 'recipe_id', 'viewed_count', 'last_viewed', 'last_viewed_count_updated')
+        if (interaction.user_id, interaction.recipe_id) in keys
+    }
+
+
+def _write_chunk(views, view_deltas):
+    existing = _fetch_interactions(views)
+
+    missing = [key for key in views if key not in existing]
+    if missing:
+        RecipeInteraction.objects.bulk_create([
+            RecipeInteraction(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                viewed_count=1,
+                last_viewed=views[(user_id, recipe_id)],
+                last_viewed_count_updated=views[(user_id, recipe_id)],
+            )
+            for user_id, recipe_id in missing
+        ], ignore_conflicts=True)
+
+        # ignore_conflicts doesn't report which rows went in. A row created
+        # concurrently (e.g. by a like) won't carry our exact timestamp, so
+        # those fall through to the regular update path below.
+        for key, interaction in _fetch_interactions(missing).items():
+            if interaction.last_viewed_count_updated == views[key] and interaction.viewed_count == 1:
+                view_deltas[key[1]] += 1
+            else:
+                existing[key] = interaction
+
+    updated = []
+    for key, interaction in existing.items():
+        viewed_at = views[key]
+        if viewed_at > interaction.last_viewed:
+            interaction.last_viewed = viewed_at
+        if viewed_at - interaction.last_viewed_count_updated >= VIEW_COUNT_PERIOD:
+            interaction.viewed_count += 1
+            interaction.last_viewed_count_updated = viewed_at
+            view_deltas[key[1]] += 1
+        updated.append(interaction)
+
+    RecipeInteraction.objects.bulk_update(
+        updated, ['last_viewed', 'viewed_count', 'last_viewed_count_updated']
+    )
+
+
+class ViewBuffer:
+    """Per-process buffer of recipe views, flushed by a daemon thread."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, recipe_id, viewed_at=None):
+        viewed_at = viewed_at or timezone.now()
+        with self._lock:
+            self._merge((user_id, recipe_id), viewed_at)
+            size = len(self._pending)
+
+        if self.interval <= 0:
+            # Buffering disabled: write straight through.
+            self.flush()
+            return
+
+        self._ensure_worker()
+        if size >= self.max_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of (user, recipe) pairs written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            return write_views(pending)
+        except Exception:
+            # Put the views back so the next flush retries them.
+            with self._lock:
+                for key, viewed_at in pending.items():
+                    self._merge(key, viewed_at)
+            raise
+
+    # Read from settings on use so they can be overridden at runtime (and in tests).
+    @property
+    def interval(self):
+        return getattr(settings, 'RECIPE_VIEW_FLUSH_INTERVAL', 5.0)
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'RECIPE_VIEW_FLUSH_SIZE', 500)
+
+    def _merge(self, key, viewed_at):
+        # Caller holds the lock. Only the latest view per (user, recipe) matters.
+        current = self._pending.get(key)
+        if current is None or viewed_at > current:
+            self._pending[key] = viewed_at
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='recipe-view-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush recipe views: {e}")
+            finally:
+                connection.close()
+
+
+view_buffer = ViewBuffer()
+
+
+def record_recipe_view(user_id, recipe_id):
+    """Queue a view of `recipe_id` by `user_id`. Never touches the database on the caller's thread."""
+    view_buffer.record(user_id, recipe_id)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_buffer.flush()
+    except Exception as e:
+        logger.error(f"Failed to flush recipe views on exit: {e}")